@@ -0,0 +1,109 @@
+"""共通定数・ユーティリティ（Streamlit描画に依存しない関数）"""
+import time
+import pandas as pd
+from datetime import datetime, date, timedelta
+from datetime import time as dt_time
+from urllib.parse import quote
+
+import perf
+
+# コート種類の定義（仕様書で固定）
+COURT_TYPES = ["オムニ", "クレー", "ハード", "インドア", "不明"]
+
+# 設定: 長押しの閾値（ミリ秒）。ここを変えるとアプリ内の長押しの感度を調整できます。
+LONG_PRESS_DELAY_MS = 1200  # 1200ms = 1.2秒
+
+# ステータスごとのカレンダー表示色
+STATUS_COLOR = {
+    "募集中": {"bg":"#90ee90","text":"black"},
+    "締切": {"bg":"#90ee90","text":"black"},
+    "抽選中": {"bg":"#ffd966","text":"black"},
+    "中止": {"bg":"#d3d3d3","text":"black"},
+    "完了": {"bg":"#d3d3d3","text":"black"}
+}
+
+
+def run_with_retry(func, *args, **kwargs):
+    max_retries = 5
+    span_name = f"sheets.{getattr(func, '__name__', 'call')}"
+    for i in range(max_retries):
+        try:
+            with perf.span(span_name):
+                return func(*args, **kwargs)
+        except Exception as e:
+            from gspread.exceptions import APIError
+            if not isinstance(e, APIError):
+                if i == max_retries - 1: raise e
+                with perf.span("sheets.backoff"):
+                    time.sleep(2)
+                continue
+            if i == max_retries - 1: raise e
+            code = e.response.status_code
+            if code == 429 or code >= 500:
+                with perf.span("sheets.backoff"):
+                    time.sleep(2 ** (i + 1))
+            else:
+                raise e
+
+def safe_int(val, default=0):
+    try:
+        if pd.isna(val) or val == "": return default
+        return int(float(val))
+    except:
+        return default
+
+def jst_today():
+    """日本時刻での今日の日付"""
+    return (datetime.utcnow() + timedelta(hours=9)).date()
+
+def to_jst_date(iso_str):
+    try:
+        dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
+        return (dt + timedelta(hours=9)).date()
+    except Exception:
+        if isinstance(iso_str, date): return iso_str
+        return datetime.strptime(str(iso_str)[:10], "%Y-%m-%d").date()
+
+def calendar_event_title(reservation_data):
+    """カレンダーに登録する予定のタイトル: 🎾テニス_[施設名]（コート種類）"""
+    title = f"🎾テニス_{reservation_data['facility']}"
+    ct = reservation_data.get('court_type')
+    if ct and ct != "不明":
+        title += f" ({ct})"
+    return title
+
+def generate_google_calendar_url(reservation_data):
+    """
+    予約データからGoogleカレンダー登録用URLを生成
+
+    Args:
+        reservation_data: 予約情報の辞書
+
+    Returns:
+        str: Googleカレンダー登録用URL
+    """
+    title = calendar_event_title(reservation_data)
+
+    # 日時生成: YYYYMMDDTHHMMSS形式
+    res_date = reservation_data['date']
+    start_hour = int(safe_int(reservation_data.get('start_hour'), 9))
+    start_minute = int(safe_int(reservation_data.get('start_minute'), 0))
+    end_hour = int(safe_int(reservation_data.get('end_hour'), 11))
+    end_minute = int(safe_int(reservation_data.get('end_minute'), 0))
+
+    start_dt = datetime.combine(res_date, dt_time(start_hour, start_minute))
+    end_dt = datetime.combine(res_date, dt_time(end_hour, end_minute))
+
+    start_str = start_dt.strftime("%Y%m%dT%H%M%S")
+    end_str = end_dt.strftime("%Y%m%dT%H%M%S")
+
+    # URL生成
+    base_url = "https://calendar.google.com/calendar/render"
+    params = [
+        "action=TEMPLATE",
+        f"text={quote(title)}",
+        f"dates={start_str}/{end_str}",
+        "ctz=Asia/Tokyo"
+    ]
+
+    return f"{base_url}?{'&'.join(params)}"
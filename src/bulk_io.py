@@ -0,0 +1,228 @@
+"""予約データの一括インポート・エクスポート（CSV / Parquet）"""
+import io
+import csv
+import tempfile
+import numpy as np
+import pandas as pd
+
+from app_common import COURT_TYPES, STATUS_COLOR
+from data_access import (
+    RESERVATION_SCHEMA, load_reservations, save_reservations, append_reservations,
+    parse_reservation_frame, serialize_reservations,
+)
+
+# 読み込み・検証の単位（行）
+IMPORT_CHUNK_ROWS = 500
+# シートへ1回で追記する行数
+IMPORT_BATCH_ROWS = 2000
+# CSV出力の単位（行）
+EXPORT_CHUNK_ROWS = 2000
+
+LIST_COLUMNS = [c for c, kind in RESERVATION_SCHEMA.items() if kind == "list"]
+
+
+# ==========================================
+# 1. インポート
+# ==========================================
+def read_import_chunks(file, file_type, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    アップロードされたファイルを少しずつ読み込む
+
+    Args:
+        file: ファイルオブジェクト
+        file_type: "csv" または "parquet"
+        chunk_rows: 1チャンクの行数
+
+    Yields:
+        DataFrame: 値は読み込んだまま（CSVは文字列）。index はファイル内の行番号（0始まり）
+    """
+    if file_type == "csv":
+        # Excelで保存したCSV（BOM付き）も読めるように utf-8-sig
+        yield from pd.read_csv(file, dtype=str, keep_default_na=False, encoding="utf-8-sig", chunksize=chunk_rows)
+    elif file_type == "parquet":
+        import pyarrow.parquet as pq
+        offset = 0
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_rows):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+    else:
+        raise ValueError(f"unsupported file type: {file_type}")
+
+def _join_list_cells(chunk):
+    """Parquet の list 列を ";" 区切りの文字列に戻す（CSVはそのまま）"""
+    for col in LIST_COLUMNS:
+        if col in chunk.columns and chunk[col].dtype == object:
+            chunk[col] = chunk[col].map(
+                lambda v: ";".join(map(str, v)) if isinstance(v, (list, tuple, np.ndarray)) else v
+            )
+    return chunk
+
+def _start_minutes(df):
+    return df["start_hour"].fillna(0).astype(int) * 60 + df["start_minute"].fillna(0).astype(int)
+
+def validate_chunk(chunk, row_offset=2):
+    """
+    1チャンク分を予約データの形式に変換し、取り込めない行を分ける
+
+    Args:
+        chunk: read_import_chunks() のチャンク
+        row_offset: エラー表示用の行番号のずれ（CSVはヘッダー行があるため2）
+
+    Returns:
+        tuple: (取り込める行の DataFrame, エラー行の DataFrame[行, 理由])
+    """
+    parsed = parse_reservation_frame(_join_list_cells(chunk))
+    start = _start_minutes(parsed)
+    end = parsed["end_hour"].fillna(0).astype(int) * 60 + parsed["end_minute"].fillna(0).astype(int)
+    hours = parsed[["start_hour", "end_hour"]]
+    minutes = parsed[["start_minute", "end_minute"]]
+
+    conditions = [
+        parsed["date"].isna(),
+        parsed["facility"].str.strip() == "",
+        parsed[["start_hour", "start_minute", "end_hour", "end_minute"]].isna().any(axis=1).to_numpy(),
+        # 時は0〜23、分は0〜59
+        ((hours < 0) | (hours > 23)).any(axis=1).to_numpy(dtype=bool, na_value=False)
+        | ((minutes < 0) | (minutes > 59)).any(axis=1).to_numpy(dtype=bool, na_value=False),
+        (end <= start).to_numpy(),
+        ~parsed["status"].isin(list(STATUS_COLOR)).to_numpy(dtype=bool),
+        ~parsed["court_type"].isin(COURT_TYPES).to_numpy(dtype=bool),
+    ]
+    reasons = np.select(
+        conditions,
+        ["日付が不正", "施設名が空", "時刻が不正", "時刻が範囲外", "終了時刻が開始時刻以前", "ステータスが不正", "コート種類が不正"],
+        default="",
+    )
+    invalid = reasons != ""
+    errors = pd.DataFrame({"行": parsed.index[invalid] + row_offset, "理由": reasons[invalid]})
+    return parsed[~invalid], errors
+
+def reservation_keys(df):
+    """重複判定キー（日付, 施設名, 開始時刻[分]）の一覧"""
+    return list(zip(df["date"], df["facility"], _start_minutes(df)))
+
+def import_reservations(file, file_type, chunk_rows=IMPORT_CHUNK_ROWS, batch_rows=IMPORT_BATCH_ROWS, on_progress=None):
+    """
+    予約をファイルから一括で取り込む
+
+    チャンクごとに検証し、既存の予約・ファイル内で（日付, 施設名, 開始時刻）が同じ行は取り込まない。
+    取り込む行は batch_rows 行ずつまとめてシート末尾に追記する。
+    ファイルの id（予約ID）はそのまま使い、空欄や既存の予約・ファイル内と重なる id には新しい予約IDを付ける。
+    途中で失敗しても、同じファイルを取り込み直せば取り込み済みの行は重複として除かれる。
+
+    Args:
+        file: ファイルオブジェクト
+        file_type: "csv" または "parquet"
+        on_progress: 読み込んだ行数を受け取る関数（進捗表示用）
+
+    Returns:
+        dict: imported（取り込んだ件数）, duplicates（重複で除いた件数）, errors（エラー行の DataFrame）
+    """
+    existing = load_reservations()
+    columns = existing.columns if not existing.empty else list(RESERVATION_SCHEMA)
+    has_header = not existing.empty
+    seen = set(reservation_keys(existing))
+    seen_ids = set(existing["id"]) if "id" in existing.columns else set()
+
+    imported = duplicates = read_rows = 0
+    error_frames = []
+    pending = []
+    pending_rows = 0
+
+    def flush():
+        nonlocal has_header, imported, pending, pending_rows
+        if not pending:
+            return
+        batch = pd.concat(pending)
+        if has_header:
+            append_reservations(batch, columns=columns)
+        else:
+            # シートが空のときは最初の1回だけヘッダー付きで書き込む
+            save_reservations(batch.reindex(columns=columns))
+            has_header = True
+        imported += len(batch)
+        pending, pending_rows = [], 0
+
+    row_offset = 2 if file_type == "csv" else 1
+    for chunk in read_import_chunks(file, file_type, chunk_rows):
+        read_rows += len(chunk)
+        valid, errors = validate_chunk(chunk, row_offset)
+        if not errors.empty:
+            error_frames.append(errors)
+
+        keys = reservation_keys(valid)
+        keep = []
+        for key in keys:
+            keep.append(key not in seen)
+            seen.add(key)
+        duplicates += len(keep) - sum(keep)
+        valid = valid[keep]
+        # 予約IDが重なる行は空欄にして、追記時に新しい予約IDを付ける
+        taken = valid["id"].isin(seen_ids) | valid["id"].duplicated()
+        if taken.any():
+            valid = valid.assign(id=valid["id"].where(~taken, ""))
+        seen_ids.update(valid["id"])
+        if not valid.empty:
+            pending.append(valid)
+            pending_rows += len(valid)
+        if pending_rows >= batch_rows:
+            flush()
+        if on_progress:
+            on_progress(read_rows)
+    flush()
+
+    errors = pd.concat(error_frames, ignore_index=True) if error_frames else pd.DataFrame(columns=["行", "理由"])
+    return {"imported": imported, "duplicates": duplicates, "errors": errors}
+
+
+# ==========================================
+# 2. エクスポート
+# ==========================================
+def export_csv_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    予約データをCSVとして少しずつ書き出す（シートと同じ形式。ヘッダーは最初のチャンクのみ）
+
+    Yields:
+        bytes: CSVの一部（UTF-8）
+    """
+    for start in range(0, max(len(df), 1), chunk_rows):
+        values = serialize_reservations(df.iloc[start:start + chunk_rows])
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(values if start == 0 else values[1:])
+        yield buf.getvalue().encode("utf-8")
+
+def export_csv(df):
+    """
+    CSV（Excelで開けるようBOM付きUTF-8）
+
+    チャンクごとに一時ファイルへ書き出し、先頭に戻したファイルを返す（全体を1つの bytes に連結しない）。
+    st.download_button はファイルを1回読み込むだけなので、メモリに載る全体はその1つだけになる。
+
+    Returns:
+        file: 読み込み用のバイナリファイル（閉じると削除される）
+    """
+    out = tempfile.TemporaryFile()
+    out.write(b"\xef\xbb\xbf")
+    for chunk in export_csv_chunks(df):
+        out.write(chunk)
+    out.seek(0)
+    return out
+
+def export_parquet(df):
+    """
+    Parquet（列ごとの型を保つ。日付は date、時刻・定員は int、参加者系は文字列のリスト）
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    out = df.copy()
+    for col in LIST_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].map(lambda v: list(v) if isinstance(v, (list, tuple)) else [])
+    for col, kind in RESERVATION_SCHEMA.items():
+        if kind in ("int", "capacity") and col in out.columns:
+            out[col] = pd.to_numeric(out[col], errors="coerce").astype("Int64")
+    buf = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(out, preserve_index=False), buf)
+    return buf.getvalue()
@@ -0,0 +1,113 @@
+"""予約の一括変更（管理者用。条件に合う予約のステータス・定員・コート種類をまとめて書き換える）
+
+抽選結果が出たあとに「抽選中」をまとめて「募集中」「中止」にしたり、雨天で施設の予定をまとめて中止にしたりする。
+対象の絞り込みと変更はどちらも列ごとの配列演算で行い、変わった行のセルだけを1回の書き込みで保存する。
+定員は登録・編集ポップアップと同じく参加者数より少なくできないので、そうなる予約は変更しない（確認の表に出す）。
+"""
+import numpy as np
+import pandas as pd
+
+from data_access import load_reservations, load_sheet_revisions, update_reservation_rows
+from participation_log import reservation_ids
+from signup import OPEN_STATUS, capacity_transitions, capacity_values, participant_counts, promote_waitlist
+
+# 一括変更できる列
+BULK_COLUMNS = ["status", "capacity", "court_type"]
+
+
+def select_reservations(df, statuses=None, facilities=None, date_from=None, date_to=None):
+    """
+    条件に合う予約（df と同じ長さの bool 配列）
+
+    Args:
+        df: 予約データ
+        statuses: ステータスのリスト（空・None なら絞り込まない）
+        facilities: 施設名のリスト（空・None なら絞り込まない）
+        date_from: この日以降（None なら絞り込まない）
+        date_to: この日以前（None なら絞り込まない）
+
+    Returns:
+        numpy.ndarray: 対象の予約なら True
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if statuses:
+        mask &= df["status"].isin(statuses).to_numpy(dtype=bool)
+    if facilities:
+        mask &= df["facility"].isin(facilities).to_numpy(dtype=bool)
+    if date_from is not None or date_to is not None:
+        dates = df["date"]
+        in_range = dates.notna()
+        if date_from is not None:
+            in_range &= dates >= date_from
+        if date_to is not None:
+            in_range &= dates <= date_to
+        mask &= in_range.fillna(False).to_numpy(dtype=bool)
+    return mask
+
+def _differs(old, new):
+    """2つの列の値が違う行（欠損どうしは同じとみなす）"""
+    return old.to_numpy(dtype=object, na_value=None) != new.to_numpy(dtype=object, na_value=None)
+
+def plan_bulk_update(df, mask, changes):
+    """
+    一括変更を予約データに当てはめた結果を求める（df は変更しない）
+
+    定員を変えた予約は、参加者数が定員に達していれば「募集中」→「締切」、下回れば「締切」→「募集中」にする。
+    ステータスを「募集中」にした予約も、定員に達していれば「締切」にする（登録・編集ポップアップと同じ規則）。
+    新しい定員が参加者数より少なくなる予約は、どの列も変更しない（編集ポップアップでも設定できない値のため）。
+
+    Args:
+        df: 予約データ
+        mask: 対象の予約（select_reservations()）
+        changes: 列名 → 新しい値（status / capacity / court_type。定員を「指定なし」にするときは None）
+
+    Returns:
+        tuple: (変更後の予約データ, 値が変わる予約（bool 配列）, 書き換える列のリスト,
+                定員が参加者数より少なくなるため変更しない予約（bool 配列）)
+    """
+    changes = {col: value for col, value in changes.items() if col in BULK_COLUMNS}
+    skipped = np.zeros(len(df), dtype=bool)
+    if changes.get("capacity") is not None:
+        skipped = mask & (participant_counts(df) > changes["capacity"])
+        mask = mask & ~skipped
+    new_df = df.copy(deep=False)
+    for col, value in changes.items():
+        new_df.loc[mask, col] = pd.NA if value is None else value
+
+    if ("status" in changes or "capacity" in changes) and changes.get("status", OPEN_STATUS) == OPEN_STATUS:
+        target = new_df[mask]
+        status = target["status"].to_numpy(dtype=object)
+        new_status = capacity_transitions(participant_counts(target), capacity_values(target), status)
+        if (new_status != status).any():
+            new_df.loc[mask, "status"] = new_status
+
+    columns = [col for col in BULK_COLUMNS if col in changes or (col == "status" and "capacity" in changes)]
+    changed = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        changed |= _differs(df[col], new_df[col])
+    return new_df, changed & mask, columns, skipped
+
+def submit_bulk_update(filters, changes):
+    """
+    一括変更を保存する（保存の直前に予約データを取り直して、対象を選び直す）
+
+    Args:
+        filters: select_reservations() の引数（statuses / facilities / date_from / date_to）
+        changes: plan_bulk_update() の changes
+
+    Returns:
+        int: 変更した予約の件数（保存までに他のサーバーで削除された予約・定員が参加者数より少なくなる予約は除く）
+    """
+    # 他のサーバーの保存を反映した内容で対象を選ぶよう、リビジョンを確認し直してから読み込む
+    # （書き込む行は update_reservation_rows() が予約IDで探す）
+    load_sheet_revisions.clear()
+    current_df = load_reservations()
+    mask = select_reservations(current_df, **filters)
+    new_df, changed, columns, _ = plan_bulk_update(current_df, mask, changes)
+    if not changed.any():
+        return 0
+    saved = update_reservation_rows(new_df, changed, columns)
+    if "capacity" in changes:
+        # 定員を増やして空いた席にキャンセル待ちを繰り上げる（保存後に行が増減していても同じ予約になるよう予約IDで渡す）
+        promote_waitlist(reservation_ids(current_df)[changed].tolist())
+    return saved
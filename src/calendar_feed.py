@@ -0,0 +1,339 @@
+"""予約の iCalendar（.ics）フィード
+
+全員分と参加者ごとのフィードを static/calendar/ に書き出す。
+server.enableStaticServing を有効にすると /app/static/calendar/<ファイル名> で配信され、
+ETag / Last-Modified はファイルの内容・更新時刻から Streamlit のサーバーが付ける。
+内容が変わらない限りファイルを書き換えないので、カレンダーアプリの定期取得は 304 で済む。
+書き出しは利用者の再実行ではなく、シート監視スレッド（data_access.add_watcher_task()）で行う。
+予定の UID は予約ID から作る。内容が変わった予定は SEQUENCE を増やし、DTSTAMP を変わった時刻にする
+（予定ごとの版は data/calendar/events.json に保存する）。
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import functools
+import streamlit as st
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+
+import perf
+from app_common import calendar_event_title, jst_today
+from data_access import load_reservations, reservations_generation, add_watcher_task
+from participation_log import reservation_ids
+
+logger = logging.getLogger(__name__)
+
+FEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "calendar")
+FEED_URL_PATH = "app/static/calendar"
+# 予定ごとの版（UID → [内容のハッシュ, SEQUENCE, DTSTAMP, 予約日]）。配信しないよう static の外に置く
+FEED_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "calendar", "events.json")
+# フィードに含める過去の予約（日数）。購読側のカレンダーから直近の予定が消えないようにする
+FEED_PAST_DAYS = 30
+ALL_MEMBERS = "全員"
+# ステータス → iCalendar の STATUS
+ICS_STATUS = {"中止": "CANCELLED", "抽選中": "TENTATIVE"}
+
+
+# ==========================================
+# 1. iCalendar の生成
+# ==========================================
+def _escape_text(value):
+    return (
+        str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("<br>", "\\n").replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+def _unescape_text(value):
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+def _fold(line):
+    """1行75オクテットを超える行を折り返す（RFC 5545 3.1。UTF-8の文字の途中では切らない）"""
+    if len(line.encode("utf-8")) <= 75:
+        return line
+    parts, current, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > (75 if not parts else 74):
+            parts.append(current)
+            current, size = "", 0
+        current += ch
+        size += n
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+def _utc_stamp(day, minutes):
+    """JSTの日付・0時からの分 → UTCの YYYYMMDDTHHMMSSZ"""
+    dt = datetime.combine(day, datetime.min.time()) + timedelta(minutes=minutes - 9 * 60)
+    return dt.strftime("%Y%m%dT%H%M%SZ")
+
+def event_uid(rid):
+    """予約の UID（予約IDから作る。同じ日時・施設の予約が複数あっても別の予定になる）"""
+    return hashlib.sha1(str(rid).encode("utf-8")).hexdigest()[:20] + "@tennis-plan"
+
+@functools.lru_cache(maxsize=4096)
+def _event_body(uid, day, start_min, end_min, facility, court_type, status, participants, consider, message):
+    """
+    1件分の VEVENT の、DTSTAMP・SEQUENCE 以外の行（変わっていない予約は作り直さない）
+
+    Returns:
+        tuple: (行をつないだ文字列, 内容のハッシュ)
+    """
+    description = [f"ステータス: {status}"]
+    if participants:
+        description.append("参加: " + ", ".join(participants))
+    if consider:
+        description.append("保留: " + ", ".join(consider))
+    if message:
+        description.append(message)
+    lines = [
+        f"UID:{uid}",
+        f"DTSTART:{_utc_stamp(day, start_min)}",
+        f"DTEND:{_utc_stamp(day, end_min)}",
+        f"SUMMARY:{_escape_text(calendar_event_title({'facility': facility, 'court_type': court_type}))}",
+        f"LOCATION:{_escape_text(facility)}",
+        f"DESCRIPTION:{_escape_text(chr(10).join(description))}",
+        f"STATUS:{ICS_STATUS.get(status, 'CONFIRMED')}",
+    ]
+    body = "\r\n".join(_fold(line) for line in lines)
+    return body, hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+def _event_block(body, sequence, stamp):
+    """1件分の VEVENT"""
+    return f"BEGIN:VEVENT\r\n{body}\r\nSEQUENCE:{sequence}\r\nDTSTAMP:{stamp}\r\nEND:VEVENT"
+
+@st.cache_resource(show_spinner=False)
+def _version_store():
+    """予定ごとの版（プロセスで共有。最初に使うときに FEED_STATE_PATH から読む）"""
+    return {"lock": threading.Lock(), "events": None}
+
+def _read_versions():
+    try:
+        with open(FEED_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_versions(events):
+    try:
+        os.makedirs(os.path.dirname(FEED_STATE_PATH), exist_ok=True)
+        tmp = f"{FEED_STATE_PATH}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(events, f)
+        os.replace(tmp, FEED_STATE_PATH)
+    except OSError as e:
+        logger.warning("calendar feed state write failed: %s", e)
+
+def event_versions(events, today):
+    """
+    予定ごとの SEQUENCE と DTSTAMP
+
+    初めて見た予定は SEQUENCE 0、内容が前回と変わった予定は SEQUENCE を1つ増やし、
+    DTSTAMP はどちらもそれを見つけた時刻にする（内容が同じ間は変えないので、フィードも変わらない）。
+    フィードの期間（FEED_PAST_DAYS）より前の予定の版は忘れる。
+
+    Args:
+        events: UID → (内容のハッシュ, 予約日)
+        today: 今日の日付
+
+    Returns:
+        dict: UID → (SEQUENCE, DTSTAMP)
+    """
+    store = _version_store()
+    with store["lock"]:
+        if store["events"] is None:
+            store["events"] = _read_versions()
+        known = store["events"]
+        now = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        changed = False
+        for uid, (digest, day) in events.items():
+            entry = known.get(uid)
+            if entry is not None and entry[0] == digest:
+                continue
+            known[uid] = [digest, 0 if entry is None else entry[1] + 1, now, day.isoformat()]
+            changed = True
+        cutoff = (today - timedelta(days=FEED_PAST_DAYS)).isoformat()
+        for uid in [uid for uid, entry in known.items() if entry[3] < cutoff]:
+            del known[uid]
+            changed = True
+        if changed:
+            _write_versions(known)
+        return {uid: (known[uid][1], known[uid][2]) for uid in events}
+
+def feed_events(df, today):
+    """
+    フィードに含める予約の VEVENT
+
+    Returns:
+        Series: 予約の行番号 → VEVENT の文字列（日付・開始時刻順）
+    """
+    df = df[df["date"].notna() & (df["date"] >= today - timedelta(days=FEED_PAST_DAYS))]
+    if df.empty:
+        return pd.Series(dtype=object)
+
+    def minutes(hour_col, minute_col, default_hour):
+        hours = pd.to_numeric(df[hour_col], errors="coerce").fillna(default_hour)
+        return (hours * 60 + pd.to_numeric(df[minute_col], errors="coerce").fillna(0)).astype(int)
+
+    # 時刻が空欄の予約は Googleカレンダー登録と同じく 9:00-11:00 とする
+    starts, ends = minutes("start_hour", "start_minute", 9), minutes("end_hour", "end_minute", 11)
+    uids = [event_uid(rid) for rid in reservation_ids(df)]
+    bodies = [
+        _event_body(
+            uid, day, start, max(end, start), facility, court_type, status,
+            tuple(participants) if isinstance(participants, list) else (),
+            tuple(consider) if isinstance(consider, list) else (),
+            message if isinstance(message, str) else "",
+        )
+        for uid, day, start, end, facility, court_type, status, participants, consider, message in zip(
+            uids, df["date"], starts, ends, df["facility"], df["court_type"], df["status"],
+            df["participants"], df["consider"], df["message"],
+        )
+    ]
+    versions = event_versions({uid: (digest, day) for uid, (_, digest), day in zip(uids, bodies, df["date"])}, today)
+    blocks = [_event_block(body, *versions[uid]) for uid, (body, _) in zip(uids, bodies)]
+    return pd.Series(blocks, index=df.index).loc[pd.DataFrame({"d": df["date"], "s": starts}).sort_values(["d", "s"]).index]
+
+def build_ics(events, name):
+    """
+    VEVENT をまとめて1つの iCalendar にする
+
+    Args:
+        events: VEVENT の文字列のリスト
+        name: カレンダー名
+
+    Returns:
+        bytes: .ics ファイルの内容（UTF-8）
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//tennis_plan//reservations//JA",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        _fold(f"X-WR-CALNAME:{_escape_text(name)}"),
+        "X-WR-TIMEZONE:Asia/Tokyo",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT1H",
+        "X-PUBLISHED-TTL:PT1H",
+        *events,
+        "END:VCALENDAR",
+    ]
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+def member_event_index(df):
+    """
+    参加者（保留を含む）ごとの予約の行番号
+
+    Returns:
+        dict: 名前 → 行番号の Index
+    """
+    names = pd.concat([df["participants"].explode(), df["consider"].explode()])
+    names = names[names.notna() & (names.astype(str).str.strip() != "")].astype(str)
+    return {name: rows.index.unique() for name, rows in names.groupby(names)}
+
+def build_member_ics(df, member=None, today=None):
+    """
+    1つのフィード（member=None は全員分）
+
+    Returns:
+        bytes: .ics ファイルの内容
+    """
+    events = feed_events(df, today or jst_today())
+    if member is not None:
+        rows = member_event_index(df.loc[events.index]).get(member, [])
+        events = events[events.index.isin(rows)]
+    return build_ics(list(events), _calendar_name(member))
+
+def _calendar_name(member):
+    return "テニス予約" if member is None else f"テニス予約（{member}）"
+
+
+# ==========================================
+# 2. 配信用ファイルの書き出し
+# ==========================================
+def feed_filename(member=None):
+    """フィードのファイル名（名前はURLに使えるようハッシュにする）"""
+    if member is None:
+        return "all.ics"
+    return "m-" + hashlib.sha1(member.encode("utf-8")).hexdigest()[:16] + ".ics"
+
+def feed_url(member=None):
+    """フィードの配信URL（静的ファイル配信が無効なら None）"""
+    if not st.get_option("server.enableStaticServing"):
+        return None
+    base = (st.context.url or "").split("?")[0].rstrip("/")
+    return f"{base}/{FEED_URL_PATH}/{feed_filename(member)}"
+
+def _write_if_changed(path, content):
+    """内容が変わったときだけ書き換える（更新時刻 = Last-Modified を保つ）。書き換えたらTrue"""
+    try:
+        with open(path, "rb") as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+    return True
+
+def _feed_calendar_name(path):
+    """書き出し済みのフィードのカレンダー名（X-WR-CALNAME。読めなければ None）"""
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+    for line in text.replace("\r\n ", "").split("\r\n"):
+        if line.startswith("X-WR-CALNAME:"):
+            return _unescape_text(line[len("X-WR-CALNAME:"):])
+    return None
+
+@st.cache_resource(show_spinner=False)
+def _feed_store():
+    """最後に書き出した予約データの世代（プロセスで共有）"""
+    return {"lock": threading.Lock(), "generation": None, "day": None}
+
+def sync_calendar_feeds():
+    """
+    予約データの世代か日付が変わっていれば、全員分と参加者ごとのフィードを書き出す
+
+    シート監視スレッドから呼ばれる（start_feed_sync() で登録する）。
+
+    Returns:
+        int: 書き換えたファイル数
+    """
+    store = _feed_store()
+    generation, today = reservations_generation(), jst_today()
+    if store["generation"] == generation and store["day"] == today:
+        return 0
+    with store["lock"]:
+        if store["generation"] == generation and store["day"] == today:
+            return 0
+        with perf.span("calendar_feed.sync"):
+            try:
+                df = load_reservations()
+                events = feed_events(df, today)
+                feeds = {None: list(events)}
+                for member, rows in member_event_index(df.loc[events.index]).items():
+                    feeds[member] = list(events[events.index.isin(rows)])
+                os.makedirs(FEED_DIR, exist_ok=True)
+                files = {feed_filename(member): build_ics(blocks, _calendar_name(member)) for member, blocks in feeds.items()}
+                # 予定が無くなった参加者のフィードは空にする（購読側から予定を消すため。カレンダー名はそのまま）
+                for filename in os.listdir(FEED_DIR):
+                    if filename.endswith(".ics") and filename not in files:
+                        name = _feed_calendar_name(os.path.join(FEED_DIR, filename))
+                        files[filename] = build_ics([], name or _calendar_name(None))
+                written = sum(_write_if_changed(os.path.join(FEED_DIR, f), content) for f, content in files.items())
+            except Exception as e:
+                logger.warning("calendar feed sync failed: %s", e)
+                return 0
+        store["generation"], store["day"] = generation, today
+        return written
+
+def start_feed_sync():
+    """フィードの書き出しをシート監視スレッドに登録する（start_sheet_watcher() と一緒に呼ぶ）"""
+    add_watcher_task(sync_calendar_feeds)
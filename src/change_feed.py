@@ -0,0 +1,63 @@
+"""予約データの変更通知（同じサーバープロセス内の全セッションで共有する pub/sub）
+
+予約を保存したセッションと、シートの更新を監視するスレッドが publish() し、
+各セッションは自分が最後に反映したリビジョンと current_revision() を比べて再描画を判断する。
+このプロセスでの保存は、変更した予約の予約ID（ids）を通知に含める。予約データのキャッシュは保存した側が
+保存した分だけを反映して作り直しておく（data_access._snapshot_store()）ので、受け取った側は再実行するだけでよい。
+"""
+import time
+import threading
+from collections import deque
+
+# 保持する変更履歴の件数（これより古いリビジョンからの差分は「不明」として扱う）
+HISTORY_SIZE = 100
+
+_lock = threading.Lock()
+_revision = 0
+_history = deque(maxlen=HISTORY_SIZE)
+# 最後に把握したシート側のリビジョン（meta シートの値）
+_sheet_revision = None
+
+
+def publish(source, sheet_revision=None, ids=None):
+    """
+    予約データの変更を通知する
+
+    Args:
+        source: 変更元（保存したセッションのキー。シート監視スレッドは "sheet"）
+        sheet_revision: 変更後のシート側リビジョン（分かる場合）
+        ids: 変更した予約の予約ID（分からない・全件の場合はNone）
+
+    Returns:
+        int: 通知後のリビジョン
+    """
+    global _revision, _sheet_revision
+    with _lock:
+        _revision += 1
+        _history.append({"revision": _revision, "source": source, "ts": time.time(), "ids": ids})
+        if sheet_revision is not None:
+            _sheet_revision = sheet_revision
+        return _revision
+
+def current_revision():
+    with _lock:
+        return _revision
+
+def known_sheet_revision():
+    """このプロセスが最後に書き込んだ／検知したシート側リビジョン（未把握ならNone）"""
+    with _lock:
+        return _sheet_revision
+
+def changes_since(revision):
+    """
+    指定リビジョンより後の変更一覧
+
+    Returns:
+        list[dict]: revision / source / ts / ids。履歴から溢れていて分からなければNone
+    """
+    with _lock:
+        if revision >= _revision:
+            return []
+        if not _history or _history[0]["revision"] > revision + 1:
+            return None
+        return [c for c in _history if c["revision"] > revision]
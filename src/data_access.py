@@ -0,0 +1,1554 @@
+"""Google Sheets の読み書き・キャッシュ（予約 / 参加表明ログ / 施設 / 抽選期間 / メンバー名簿）"""
+import os
+import time
+import re
+import uuid
+import pickle
+import logging
+import threading
+import streamlit as st
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from datetime import datetime, date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import perf
+import history
+import journal
+import change_feed
+from app_common import run_with_retry, jst_today
+from member_index import MEMBERS_SHEET, MEMBER_COLUMNS, MemberIndex, parse_member_rows, names_from_history
+from search_index import ReservationSearchIndex, changed_name_rows
+from slot_index import build_slot_index
+from participation_log import (
+    PARTICIPATIONS_SHEET, LOG_COLUMNS, REMOVED, encode_capacity, STATUS_COLUMNS, parse_log_rows, apply_entries, reservation_ids, apply_rosters,
+    fill_reservation_ids, new_reservation_id,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# 1. Google Sheets 認証
+# ==========================================
+def gsheet_id():
+    return st.secrets.get("google", {}).get("GSHEET_ID")
+
+def is_admin():
+    """
+    管理者として開いているか
+
+    URLに ?admin=<Secretsの[app] ADMIN_KEY> を付けて開くと、そのセッションは管理者扱いになる。
+    """
+    if st.session_state.get('is_admin'):
+        return True
+    admin_key = st.secrets.get("app", {}).get("ADMIN_KEY")
+    if admin_key and st.query_params.get("admin") == admin_key:
+        st.session_state['is_admin'] = True
+        return True
+    return False
+
+# ベンチマーク・負荷試験用: Google Sheets の代わりに使うスプレッドシート（MemorySpreadsheet）
+_spreadsheet_override = None
+
+def use_spreadsheet(spreadsheet):
+    """
+    Google Sheets の代わりに使うスプレッドシートを設定する
+
+    Args:
+        spreadsheet: worksheet(name) を持つオブジェクト（memory_sheet.MemorySpreadsheet）。Noneで解除
+    """
+    global _spreadsheet_override
+    _spreadsheet_override = spreadsheet
+
+def get_worksheet(sheet_name, sheet_id=None):
+    """
+    シート名からワークシートを取得する（use_spreadsheet() 設定時はそちらを使う）
+
+    Args:
+        sheet_name: シート名
+        sheet_id: スプレッドシートID（省略時はSecretsから。st.secrets を読めないバックグラウンドスレッドでは指定する）
+    """
+    if _spreadsheet_override is not None:
+        return _spreadsheet_override.worksheet(sheet_name)
+    return get_gsheet(sheet_id or gsheet_id(), sheet_name)
+
+@st.cache_resource(show_spinner=False)
+def _auth_executor():
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="gsheet-auth")
+
+def _open_spreadsheet(sheet_id, service_account_info):
+    import gspread
+    from google.oauth2.service_account import Credentials
+    scope = ["https://www.googleapis.com/auth/spreadsheets"]
+    creds = Credentials.from_service_account_info(service_account_info, scopes=scope)
+    client = gspread.authorize(creds)
+    return client.open_by_key(sheet_id)
+
+@st.cache_resource(show_spinner=False)
+def start_gsheet_auth(sheet_id):
+    """
+    Google Sheets の認証をバックグラウンドで開始する
+
+    認証完了を待たずに画面描画を進めるため、Futureを返す。
+
+    Returns:
+        Future: 完了すると Spreadsheet を返す
+    """
+    service_account_info = dict(st.secrets["google"])
+    return _auth_executor().submit(_open_spreadsheet, sheet_id, service_account_info)
+
+def is_gsheet_ready():
+    """認証が完了し、シートにアクセスできる状態ならTrue"""
+    if _spreadsheet_override is not None:
+        return True
+    future = start_gsheet_auth(gsheet_id())
+    return future.done() and future.exception() is None
+
+@st.cache_resource(show_spinner=False)
+def get_gsheet(sheet_id, sheet_name):
+    future = start_gsheet_auth(sheet_id)
+    try:
+        with perf.span("sheets.auth_wait"):
+            spreadsheet = future.result()
+    except Exception:
+        # 失敗した認証結果をキャッシュに残さない（次回アクセス時に再試行）
+        start_gsheet_auth.clear()
+        raise
+    return spreadsheet.worksheet(sheet_name)
+
+# ==========================================
+# 2. ローカルスナップショット（起動直後の先行描画用）
+# ==========================================
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", ".cache", "reservations_snapshot.pkl")
+
+def write_reservations_snapshot(df):
+    if _spreadsheet_override is not None:
+        return  # 本番シート以外のデータでスナップショットを上書きしない
+    try:
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok=True)
+        tmp_path = SNAPSHOT_PATH + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(df, f)
+        os.replace(tmp_path, SNAPSHOT_PATH)
+    except Exception as e:
+        logger.warning("snapshot write failed: %s", e)
+
+def read_reservations_snapshot():
+    try:
+        with open(SNAPSHOT_PATH, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+# ==========================================
+# 3. データ読み書き
+# ==========================================
+
+# meta シートのリビジョンを確認する間隔（秒）。リビジョン未記録のときは全件をこの間隔で再取得する
+RESERVATIONS_TTL_SEC = 15
+# リビジョンが変わらなくても全件を取り直す間隔（秒）。シートを直接編集した分もこの間隔で反映される
+RESERVATIONS_MAX_AGE_SEC = 600
+
+def load_reservations():
+    """
+    予約データを読み込む
+
+    先に meta シートのリビジョン（数セル）だけを確認し、変わっていなければ
+    全件を取り直さずにキャッシュを使い続ける。
+
+    データは世代ごとに1つのスナップショットを全セッションで共有し、呼び出しごとには
+    列データを複製しない浅いコピーを返す（pandas の Copy-on-Write により、返した DataFrame を
+    変更しても変更した列だけが複製され、スナップショットや他のセッションには影響しない。
+    Copy-on-Write が常に有効な pandas 3 が前提のため、requirements.txt で pandas>=3 を指定している）。
+    participants などのリスト列の要素（list）は共有されるため、要素を直接変更せず新しいリストを代入すること。
+
+    participants / consider / absent / waitlist は予約シートの値に参加表明ログ（participations シート）を適用したもの。
+
+    Returns:
+        DataFrame: 予約データ
+    """
+    return _materialized_reservations(reservations_generation()).copy(deep=False)
+
+def reservations_generation():
+    """
+    予約データの世代（この値が変わらない間は load_reservations() が同じ内容を返す）
+
+    meta シートのリビジョンが読めない場合は RESERVATIONS_TTL_SEC ごとに変わる。
+    参加表明ログに追記されたときも変わる（予約シートは取り直さない）。
+    """
+    revision, log_rows = load_sheet_revisions()
+    now = time.time()
+    log_rows = max(log_rows or 0, _participations_store()["written"] or 0)
+    if revision is None:
+        return ("ttl", int(now // RESERVATIONS_TTL_SEC), log_rows)
+    return (revision, int(now // RESERVATIONS_MAX_AGE_SEC), log_rows)
+
+def _clear_reservations_cache():
+    load_sheet_revisions.clear()
+    _reservations_snapshot.clear()
+    _materialized_reservations.clear()
+    _search_store.clear()
+    _slot_index.clear()
+
+load_reservations.clear = _clear_reservations_cache
+
+@perf.cache_counter("reservations_revision")
+@st.cache_data(ttl=RESERVATIONS_TTL_SEC)
+def load_sheet_revisions():
+    """
+    meta シートの予約リビジョンと参加表明ログの件数
+
+    Returns:
+        tuple: (予約リビジョン, ログの件数)。未記録・読めない場合はそれぞれNone
+    """
+    perf.mark_cache_miss()
+    try:
+        return read_sheet_revisions(get_worksheet(META_SHEET))
+    except Exception as e:
+        logger.info("reservations revision unavailable: %s", e)
+        return None, None
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _materialized_reservations(generation):
+    """予約シートの全件（予約リビジョンごとに取得）に参加表明ログを適用したもの"""
+    return apply_participation_log(_reservations_snapshot(generation[:2]))
+
+@perf.cache_counter("load_reservations")
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _reservations_snapshot(generation):
+    """
+    予約シートを全件取得する（generation が変わったときだけ実行される）
+
+    st.cache_data と違い、結果を呼び出しごとに pickle から復元しない（全セッションで同じオブジェクトを共有する）。
+    文字列・日付の列は Arrow 形式で持つ。
+    """
+    perf.mark_cache_miss()
+    store = _snapshot_store()
+    with store["lock"]:
+        seed, store["seed"] = store["seed"], None
+    if seed is not None and seed[0] == generation[0]:
+        # このプロセスで保存した直後: 保存前の全件に保存した分を反映したものを使う（シートを取り直さない）
+        with perf.span("reservations.patch"):
+            df = seed[1]()
+    else:
+        worksheet = get_worksheet("reservations")
+        # 型変換は RESERVATION_SCHEMA で行うので、数値化なしの生の値（文字列）で取得する
+        values = run_with_retry(worksheet.get_all_values)
+        df = parse_reservation_values(values)
+    with store["lock"]:
+        store["last"] = (generation[0], df)
+    write_reservations_snapshot(df)
+    return df
+
+@st.cache_resource(show_spinner=False)
+def _snapshot_store():
+    """
+    予約シートの全件の受け渡し（プロセスで共有）
+
+    last: 最後に取得した（予約リビジョン, 全件）。保存の前に控えておき、保存した分を反映する元にする
+    seed: 保存した側が作った（保存後の予約リビジョン, 全件を返す関数）。
+          _reservations_snapshot() はそのリビジョンを読み込むときに1回だけ、シートを取り直さずにこれを使う
+    """
+    return {"lock": threading.Lock(), "last": None, "seed": None}
+
+def _patch_snapshot(base, appended=None, updates=None):
+    """
+    予約シートの全件に、追記した行・書き換えたセルを反映した DataFrame（base は変更しない）
+
+    Args:
+        base: 予約シートの全件（parse_reservation_values() の結果）
+        appended: 追記した行（1行目がヘッダーの2次元リスト）
+        updates: 予約ID → {列名: シートに書いた値}
+    """
+    df = base.copy(deep=False)
+    if updates:
+        positions = pd.Series(np.arange(len(df)), index=reservation_ids(df).to_numpy())
+        positions = positions[~positions.index.duplicated()]
+        cells = {}
+        for rid, values in updates.items():
+            if rid in positions.index:
+                for col, value in values.items():
+                    cells.setdefault(col, []).append((int(positions[rid]), value))
+        for col, items in cells.items():
+            if col not in df.columns:
+                continue
+            rows = [row for row, _ in items]
+            raw = pd.Series([value for _, value in items], dtype=object)
+            kind = RESERVATION_SCHEMA.get(col)
+            parsed = (_COLUMN_PARSERS[kind](raw) if kind else raw).tolist()
+            column = df[col].copy()
+            for row, value in zip(rows, parsed):
+                column.iat[row] = value
+            df[col] = column
+    if appended is not None and len(appended) > 1:
+        new_df = parse_reservation_values(appended)
+        columns = list(df.columns) + [c for c in new_df.columns if c not in df.columns]
+        df = pd.concat([df.reindex(columns=columns), new_df.reindex(columns=columns)], ignore_index=True)
+    return df
+
+# 予約シートの列定義（列名 → 種別）。読み込み時の型変換はこの定義に従って列ごとに1回で行う
+#   date: date型（date32[pyarrow]、不正値は <NA>）
+#   int: 整数（Int64、空欄は <NA>）
+#   capacity: 定員（Int64、空欄・「なし」「指定なし」は <NA>）
+#   list: ";" 区切りのニックネーム → list
+#   text: 文字列（空欄は ""）
+#   court_type: 文字列（空欄は "不明"）
+# id は予約ID（登録・取り込み時に new_reservation_id() で付ける。参加表明ログ・変更履歴はこのIDで予約を特定する）
+RESERVATION_SCHEMA = {
+    "date": "date",
+    "facility": "text",
+    "court_type": "court_type",
+    "status": "text",
+    "start_hour": "int",
+    "start_minute": "int",
+    "end_hour": "int",
+    "end_minute": "int",
+    "capacity": "capacity",
+    "participants": "list",
+    "absent": "list",
+    "consider": "list",
+    "waitlist": "list",
+    "message": "text",
+    "id": "text",
+}
+
+def _parse_text_column(s):
+    return s.fillna("").astype(str)
+
+def _parse_int_column(s):
+    # "9" / 9 / 9.0 を 9 にする（小数は切り捨て、数値でなければ <NA>）
+    return np.trunc(pd.to_numeric(s, errors="coerce")).astype("Int64")
+
+def _parse_list_column(s):
+    text = _parse_text_column(s)
+    lists = text.str.split(";").astype(object)
+    empty = (text == "").to_numpy()
+    if empty.any():
+        lists[empty] = pd.Series([[] for _ in range(int(empty.sum()))], index=lists.index[empty], dtype=object)
+    return lists
+
+_COLUMN_PARSERS = {
+    "date": lambda s: pd.to_datetime(s, errors="coerce").astype("date32[pyarrow]"),
+    "text": _parse_text_column,
+    "court_type": lambda s: _parse_text_column(s).replace("", "不明"),
+    "int": _parse_int_column,
+    "capacity": lambda s: _parse_int_column(s.mask(s.isin(["なし", "指定なし"]))),
+    "list": _parse_list_column,
+}
+
+def parse_reservation_values(values):
+    """
+    get_all_values() の結果を予約データ（DataFrame）に変換する
+
+    RESERVATION_SCHEMA に従い、セル単位の関数呼び出しではなく列単位の演算で変換する。
+
+    Args:
+        values: 1行目がヘッダーの2次元リスト
+
+    Returns:
+        DataFrame: date は date型、時刻・capacity は Int64（空欄は <NA>）、参加者系はリスト。
+                   id が空欄の行（id 列が無かったころの予約）は fill_reservation_ids() で埋める
+    """
+    header, rows = (values[0], values[1:]) if values else ([], [])
+    df = parse_reservation_frame(pd.DataFrame(rows, columns=header, dtype=object))
+    df["id"] = fill_reservation_ids(df)
+    return df
+
+def parse_reservation_frame(df):
+    """
+    文字列のままの予約データ（1列1カラム）を RESERVATION_SCHEMA の型に変換する
+
+    Args:
+        df: シートやCSVから読んだままの DataFrame
+
+    Returns:
+        DataFrame: parse_reservation_values() と同じ形式（index は df のまま）
+    """
+    n = len(df)
+
+    # 列の並びはシートの順（足りない列は末尾に追加）。定義にない列はそのまま残す
+    columns = list(df.columns) + [c for c in RESERVATION_SCHEMA if c not in df.columns]
+    parsed = {}
+    for col in columns:
+        source = df[col] if col in df.columns else pd.Series([""] * n, index=df.index, dtype=object)
+        kind = RESERVATION_SCHEMA.get(col)
+        parsed[col] = _COLUMN_PARSERS[kind](source) if kind else source
+    return pd.DataFrame(parsed, index=df.index)
+
+def _with_reservation_ids(df):
+    """id が空欄の行（新しく登録・取り込みする予約）に予約IDを付けた DataFrame"""
+    ids = df["id"].fillna("").astype(str) if "id" in df.columns else pd.Series("", index=df.index, dtype=object)
+    missing = (ids == "").to_numpy()
+    if "id" in df.columns and not missing.any():
+        return df
+    df = df.copy(deep=False)
+    df["id"] = ids.where(~missing, [new_reservation_id() if m else "" for m in missing]).astype(object)
+    return df
+
+def save_reservations(df):
+    df = _with_reservation_ids(df)
+    with perf.span("save.serialize"):
+        values = serialize_reservations(df)
+
+    # 書き直すのは、保存から書き直しまでの間に他のサーバーが予約を保存していない場合だけ（8. 参照）
+    written = replace_sheet("reservations", values, base_revision=load_sheet_revisions()[0])
+    if written is values:
+        # 後から届いた保存にまとめられた場合は、その保存の側で記録する
+        _record_history(df, values, "save", full=True)
+    load_reservations.clear()
+    # シートは書き込んだ内容そのものなので、次の読み込みはシートを取り直さずにこれを使う
+    _notify_reservations_saved(len(written) - 1, patch=lambda base: parse_reservation_values(written))
+
+def append_reservations(new_rows, columns=None):
+    """
+    予約をまとめて追加する（シート末尾への追記1回。既存の行は書き換えない）
+
+    Args:
+        new_rows: 予約の辞書のリスト、または予約データと同じ形式の DataFrame
+        columns: シートの列の並び（省略時は現在の予約データから取得する。
+                 指定する場合はシートにヘッダー行があること）
+    """
+    if len(new_rows) == 0:
+        return
+    row_count = None
+    if columns is None:
+        current_df = load_reservations()
+        if current_df.empty:
+            # ヘッダー行がまだ無い可能性があるため全体を書き込む
+            save_reservations(pd.DataFrame(new_rows))
+            return
+        columns = current_df.columns
+        row_count = len(current_df) + len(new_rows)
+
+    base = _snapshot_store()["last"]
+    worksheet = get_worksheet("reservations")
+    # 値はシートのヘッダーの並びで書く（id など、シートにまだ無い列はヘッダーの末尾に足す）
+    header = _ensure_sheet_columns(worksheet, list(columns))
+    new_df = _with_reservation_ids(pd.DataFrame(new_rows)).reindex(columns=header)
+    with perf.span("save.serialize"):
+        values = serialize_reservations(new_df)
+
+    run_with_retry(worksheet.append_rows, values[1:])
+    _record_history(new_df, values, "append")
+    load_reservations.clear()
+    _notify_reservations_saved(
+        row_count, base=base, patch=lambda frame: _patch_snapshot(frame, appended=values), ids=list(new_df["id"]),
+    )
+
+def _ensure_sheet_columns(worksheet, columns):
+    """
+    シートのヘッダー行に columns の列がすべてあるようにする（無い列は末尾に足す）
+
+    Returns:
+        list: 足した後のヘッダー行
+    """
+    from gspread.utils import rowcol_to_a1
+    header = (run_with_retry(worksheet.get, "1:1") or [[]])[0]
+    missing = [col for col in columns if col not in header]
+    if missing:
+        run_with_retry(worksheet.update, [missing], rowcol_to_a1(1, len(header) + 1))
+        header = header + missing
+    return header
+
+def update_reservation_rows(df, mask, columns):
+    """
+    予約データの一部の行・列だけを保存する（セルの書き換え1回。ほかの行・列はそのまま）
+
+    書き込む行は予約IDでシートから探す（読み込んだ後に他のサーバーが行を追加・削除していても、同じ予約に書き込む）。
+
+    Args:
+        df: 変更後の予約データ
+        mask: 保存する行（df と同じ長さの bool 配列）
+        columns: 保存する列のリスト
+
+    Returns:
+        int: 保存した予約の件数（保存までに削除された予約は数えない）
+    """
+    positions = np.flatnonzero(mask)
+    if len(positions) == 0 or not columns:
+        return 0
+    base = _snapshot_store()["last"]
+    with perf.span("save.serialize"):
+        values = serialize_reservations(df.iloc[positions])
+    header = values[0]
+    updates = {
+        rid: {col: row[header.index(col)] for col in columns}
+        for rid, row in zip(reservation_ids(df).iloc[positions], values[1:])
+    }
+    saved = update_reservation_cells(updates)
+    _record_history(df, values, "bulk_update", mask=mask)
+    load_reservations.clear()
+    _notify_reservations_saved(
+        len(df), base=base, patch=lambda frame: _patch_snapshot(frame, updates=updates), ids=list(updates),
+    )
+    return saved
+
+def _notify_reservations_saved(row_count, base=None, patch=None, ids=None):
+    """
+    保存したことを他のセッション・サーバーへ通知する
+
+    patch があれば、保存後の予約シートの全件を次の読み込みでシートを取り直さずに作れるようにする
+    （_snapshot_store() の seed）。一部だけを保存した場合は、保存前に控えた全件（base）から後に
+    他の保存が無かったとき（meta シートのリビジョンが base のままのとき）だけ使う。
+
+    Args:
+        row_count: 保存後の件数（不明ならNone）
+        base: 保存の前に控えた _snapshot_store()["last"]（全件を書き込んだ場合は不要）
+        patch: 全件を受け取り、保存した分を反映した全件を返す関数
+        ids: 変更した予約の予約ID（変更通知に含める。不明・全件ならNone）
+    """
+    store = _snapshot_store()
+    sheet_revision = None
+    # 同じプロセスの保存どうしで、リビジョンの確認と書き込みの間に割り込まれないようにする
+    with store["lock"]:
+        try:
+            usable = patch is not None and (
+                base is None and ids is None
+                or base is not None and read_sheet_revisions(get_worksheet(META_SHEET))[0] == base[0]
+            )
+            sheet_revision = write_reservations_revision(row_count)
+        except Exception as e:
+            logger.warning("meta revision write failed: %s", e)
+            usable = False
+        if usable and sheet_revision is not None:
+            frame = base[1] if base is not None else None
+            store["seed"] = (sheet_revision, lambda: patch(frame))
+    change_feed.publish(session_key(), sheet_revision=sheet_revision, ids=ids)
+
+def _record_history(df, values, source, full=False, mask=None):
+    """
+    保存した内容を変更履歴に記録する（記録に失敗しても保存は続ける）
+
+    Args:
+        df: 保存した予約データ
+        values: serialize_reservations() の結果（1行目がヘッダー。mask 指定時はその行だけ）
+        source: 変更元
+        full: True なら全件（無い予約は消えたものとする）、False なら一部の行
+        mask: 記録する行（df と同じ長さの bool 配列。省略時はすべて）
+    """
+    if _spreadsheet_override is not None:
+        return
+    try:
+        # 予約キーは予約ID（行の並びが変わっても同じ予約は同じキー）
+        keys = reservation_ids(df).tolist()
+        if mask is not None:
+            keys = [key for key, hit in zip(keys, mask) if hit]
+        rows = dict(zip(keys, values[1:]))
+        with perf.span("history.record"):
+            (history.record_state if full else history.record_rows)(values[0], rows, source)
+    except Exception as e:
+        logger.warning("history record failed: %s", e)
+
+def restore_reservation(key, header, row):
+    """
+    1つの予約を変更履歴の版に戻す（他の予約はそのまま）
+
+    参加者リストは参加表明ログが上書きするため、戻した内容と同じになるようログにも追記する。
+
+    Args:
+        key: 予約キー（予約ID）
+        header: その版のヘッダー行
+        row: その版の行（None ならその予約を削除する）
+    """
+    df = load_reservations()
+    positions = np.flatnonzero((reservation_ids(df) == key).to_numpy(dtype=bool)).tolist()
+    if row is None:
+        if not positions:
+            return
+        restored = df.iloc[:0]
+        new_df = df.drop(index=df.index[positions[0]])
+    else:
+        restored = parse_reservation_values([header, row]).reindex(columns=df.columns)
+        # id 列が無かったころの版も、戻した後は同じ予約IDのままにする
+        restored["id"] = key
+        pos = positions[0] if positions else len(df)
+        new_df = pd.concat([df.iloc[:pos], restored, df.iloc[pos + 1:]], ignore_index=True)
+    save_reservations(new_df.reset_index(drop=True))
+
+    # 戻した参加者リストに合わせて、ログの参加状況を書き直す（リストの並びも戻るよう、リストの順に追記する）
+    def roster(frame):
+        return {nick: status for status, col in STATUS_COLUMNS.items()
+                for names in frame[col] for nick in (names if isinstance(names, list) else [])}
+    current, target = roster(df.iloc[positions[:1]]), roster(restored)
+    append_participations(
+        [(key, nick, REMOVED) for nick in current if nick not in target]
+        + [(key, nick, status) for nick, status in target.items()]
+    )
+
+def _encode_cell(v):
+    """1セルをシート書き込み用の文字列にする（None/NaN/NaT は空文字）"""
+    if isinstance(v, str): return v
+    if isinstance(v, (list, tuple)): return ";".join(map(str, v))
+    if v is None or v is pd.NaT or v is pd.NA or (isinstance(v, float) and v != v): return ""
+    if isinstance(v, (date, datetime)): return v.isoformat()
+    return str(v)
+
+def _encode_capacity(x):
+    """定員（None → 空文字、数値 → 整数文字列）"""
+    if x is None or x is pd.NA or x == "" or (isinstance(x, float) and x != x):
+        return ""
+    try:
+        return str(int(x))
+    except (ValueError, TypeError):
+        return ""
+
+def _encode_column(values):
+    """1列分を文字列化する（よく出る型は関数呼び出しなしで処理する）"""
+    return [
+        v if type(v) is str
+        else str(v) if type(v) is int
+        else ";".join(v) if type(v) is list
+        else v.isoformat() if type(v) is date
+        else _encode_cell(v)
+        for v in values
+    ]
+
+def _encode_arrow_date_column(series):
+    """date32[pyarrow] の列を Arrow のまま文字列化する（1件ずつ date オブジェクトを作らない）"""
+    return pc.fill_null(pc.cast(pa.array(series), pa.string()), "").to_pylist()
+
+def serialize_reservations(df):
+    """
+    予約データをシート書き込み用の2次元リスト（ヘッダー行付き）に変換する
+
+    DataFrameのコピーや中間表を作らず、列ごとに文字列化してから行に組み替える。
+
+    Returns:
+        list[list[str]]: 1行目がカラム名
+    """
+    encoded_columns = []
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.ArrowDtype) and pa.types.is_date(series.dtype.pyarrow_dtype):
+            encoded_columns.append(_encode_arrow_date_column(series))
+            continue
+        values = series.tolist()
+        if col == "capacity":
+            encoded_columns.append([_encode_capacity(v) for v in values])
+        else:
+            encoded_columns.append(_encode_column(values))
+
+    values = [[str(c) for c in df.columns]]
+    values += [list(row) for row in zip(*encoded_columns)]
+    return values
+
+
+# ==========================================
+# 4. 施設・抽選リマインダー・メンバー名簿
+# ==========================================
+# 施設・抽選期間・名簿データを読み直す間隔（秒）。変更が少ないため、描画とは別のスレッドで読み直して差し替える
+REFERENCE_REFRESH_SEC = 1800
+
+def _fetch_lottery_periods(sheet_id=None):
+    lottery_sheet = get_worksheet("lottery_periods", sheet_id)
+    records = run_with_retry(lottery_sheet.get_all_records)
+    return pd.DataFrame(records)
+
+def _fetch_facilities(sheet_id=None):
+    facilities_sheet = get_worksheet("facilities", sheet_id)
+    records = run_with_retry(facilities_sheet.get_all_records)
+    return facilities_to_dict(pd.DataFrame(records))
+
+def _fetch_members(sheet_id=None):
+    # 名簿がまだ無ければ空のシートを作る（空の名簿は load_member_index() が予約データから作る）
+    worksheet = get_or_create_worksheet(MEMBERS_SHEET, cols=len(MEMBER_COLUMNS), sheet_id=sheet_id)
+    values = run_with_retry(worksheet.get_all_values)
+    return MemberIndex(parse_member_rows(values[1:]))
+
+def facilities_to_dict(df):
+    """
+    facilitiesシートの内容を施設情報の辞書にする
+
+    Returns:
+        dict: {施設名: {"url": URL, "address": 住所}}
+    """
+    facilities_dict = {}
+    for _, row in df.iterrows():
+        name = row.get("name", "")
+        if name:
+            facilities_dict[name] = {
+                "url": row.get("url", ""),
+                "address": row.get("address", "")
+            }
+    return facilities_dict
+
+# データ名 → (読み込み関数, 未取得時の値)
+REFERENCE_LOADERS = {
+    "lottery_periods": (_fetch_lottery_periods, pd.DataFrame),
+    "facilities": (_fetch_facilities, dict),
+    "members": (_fetch_members, MemberIndex),
+}
+
+@st.cache_resource(show_spinner=False)
+def _reference_store():
+    """
+    施設・抽選期間・名簿データの置き場（プロセス内の全セッションで共有）
+
+    values は読み直しのたびに新しい辞書へ丸ごと差し替えるので、読む側はロック不要。
+    """
+    return {"values": {}, "refresher_running": False}
+
+def _set_reference_value(name, value):
+    store = _reference_store()
+    store["values"] = {**store["values"], name: value}
+
+def refresh_reference_data(names=None, sheet_id=None):
+    """
+    施設・抽選期間データを読み直して差し替える（読み込みに失敗したデータは前回の値のまま）
+
+    Args:
+        names: 読み直すデータ名のリスト（省略時はすべて）
+        sheet_id: スプレッドシートID（バックグラウンドスレッドから呼ぶときに指定）
+
+    Returns:
+        list[str]: 内容が変わったデータ名
+    """
+    changed = []
+    for name in names or REFERENCE_LOADERS:
+        fetch, _ = REFERENCE_LOADERS[name]
+        try:
+            value = fetch(sheet_id)
+        except Exception as e:
+            logger.warning("%s refresh failed: %s", name, e)
+            continue
+        old = _reference_store()["values"].get(name)
+        _set_reference_value(name, value)
+        if old is None:
+            changed.append(name)
+        elif not (old.equals(value) if isinstance(old, pd.DataFrame) else old == value):
+            changed.append(name)
+    return changed
+
+@st.cache_resource(show_spinner=False)
+def start_reference_refresher(sheet_id):
+    """
+    施設・抽選期間データをバックグラウンドで読み込み、定期的に読み直すスレッドを開始する（プロセスに1つ）
+
+    最初の読み込みが終わったとき、および内容が変わったときは change_feed に通知し、
+    表示中のセッションを再描画させる。
+
+    Returns:
+        threading.Event: set() するとスレッドが止まる
+    """
+    store = _reference_store()
+    store["refresher_running"] = True
+    stop = threading.Event()
+
+    def refresh_loop():
+        while True:
+            if refresh_reference_data(sheet_id=sheet_id):
+                change_feed.publish("reference")
+            if stop.wait(REFERENCE_REFRESH_SEC):
+                return
+
+    threading.Thread(target=refresh_loop, name="reference-refresher", daemon=True).start()
+    return stop
+
+def _reference_value(name):
+    """
+    読み込み済みの施設・抽選期間データを返す
+
+    バックグラウンドで読み込み中なら待たずに空の値を返す（読み込み完了後に再描画される）。
+    バックグラウンド読み込みを開始していない場合（ベンチマーク等）はその場で読み込む。
+    """
+    store = _reference_store()
+    if name not in store["values"]:
+        perf.mark_cache_miss()
+        if store["refresher_running"]:
+            return REFERENCE_LOADERS[name][1]()
+        refresh_reference_data([name])
+    return store["values"].get(name, REFERENCE_LOADERS[name][1]())
+
+@perf.cache_counter("load_lottery_data_cached")
+def load_lottery_data_cached():
+    return _reference_value("lottery_periods")
+
+@perf.cache_counter("load_facilities_data")
+def load_facilities_data():
+    """
+    facilitiesシートの施設情報（バックグラウンドで読み込み済みのもの）
+
+    Returns:
+        dict: {施設名: {"url": URL, "address": 住所}}
+    """
+    return _reference_value("facilities")
+
+def add_facility_if_not_exists(facility_name):
+    """
+    施設名がfacilitiesシートに存在しない場合、追加する
+    
+    Args:
+        facility_name: 施設名
+    """
+    if not facility_name:
+        return
+    
+    try:
+        facilities_sheet = get_worksheet("facilities")
+        records = run_with_retry(facilities_sheet.get_all_records)
+        df = pd.DataFrame(records)
+        
+        # 既存の施設名をチェック
+        if "name" in df.columns and facility_name in df["name"].values:
+            return  # 既に存在する
+        
+        # 新規追加
+        new_row = {"name": facility_name, "url": "", "address": ""}
+        new_df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+        
+        # 保存
+        values = [new_df.columns.values.tolist()] + new_df.values.tolist()
+        written = replace_sheet("facilities", values, ensure_row=[facility_name, "", ""])
+        
+        # 書き込んだ内容で施設情報を差し替える（読み直しは不要。同時に追加された施設も含む）
+        _set_reference_value("facilities", facilities_to_dict(pd.DataFrame(written[1:], columns=written[0])))
+    except Exception as e:
+        # エラーが発生しても予約登録は続行
+        pass
+
+# 参加表明の名前の選択肢に一度に出す数（それ以上は先頭の文字で絞り込む）
+MEMBER_OPTIONS_LIMIT = 100
+
+@perf.cache_counter("load_member_index")
+def load_member_index():
+    """
+    メンバー名簿の前方一致インデックス（バックグラウンドで読み込み済みのもの）
+
+    members シートが空なら、予約データに出てくる名前で名簿を作ってシートに保存する（初回のみ）。
+    読み込みが終わっていない間は、保存せずに予約データから作った名簿を返す。
+
+    Returns:
+        MemberIndex
+    """
+    index = _reference_value("members")
+    if len(index) > 0:
+        return index
+    index = MemberIndex((name, []) for name in names_from_history(load_reservations()))
+    if "members" in _reference_store()["values"] and len(index) > 0:
+        values = [MEMBER_COLUMNS] + [[name, ""] for name, _ in index.members()]
+        try:
+            run_with_retry(get_worksheet(MEMBERS_SHEET).update, values)
+        except Exception as e:
+            logger.warning("members seed failed: %s", e)
+        _set_reference_value("members", index)
+    return index
+
+def add_member(name):
+    """
+    名簿に無い名前を members シートの末尾に追記し、インデックスにも追加する（シートは読み直さない）
+
+    Args:
+        name: 入力された名前
+
+    Returns:
+        str: 名簿の名前（名簿の名前・別名と表記ゆれの範囲で一致すれば、その名前）
+    """
+    name = name.strip()
+    index = load_member_index()
+    known = index.canonical(name)
+    if known:
+        return known
+    try:
+        worksheet = get_or_create_worksheet(MEMBERS_SHEET, cols=len(MEMBER_COLUMNS))
+        rows = [[name, ""]]
+        if not run_with_retry(worksheet.get, "A1:B1"):
+            rows.insert(0, MEMBER_COLUMNS)
+        run_with_retry(worksheet.append_rows, rows)
+    except Exception as e:
+        # 名簿に保存できなくても参加表明は続ける（次に読み直すまではこのプロセスの名簿にだけ載る）
+        logger.warning("member append failed: %s", e)
+    index.add(name)
+    return name
+
+def check_and_show_reminders():
+    df = load_lottery_data_cached()
+    if df.empty: return []
+
+    today = jst_today()
+    
+    messages_to_show = []
+
+    for _, row in df.iterrows():
+        enabled_val = str(row.get("enabled", "")).lower()
+        if enabled_val not in ["true", "1", "yes", "有効"]: continue
+
+        freq = row.get("frequency", "")
+        msg = row.get("messages", "")
+        if not msg: continue
+
+        is_match = False
+        try:
+            if freq == "monthly":
+                s_day = int(row.get("start_day", 0))
+                e_day = int(row.get("end_day", 32))
+                if s_day <= today.day <= e_day: is_match = True
+            elif freq == "weekly":
+                if today.strftime("%a") in str(row.get("weekdays", "")): is_match = True
+            elif freq == "yearly":
+                s_month = int(row.get("start_month", 0))
+                s_day = int(row.get("start_day", 0))
+                e_month = int(row.get("end_month", 0))
+                e_day = int(row.get("end_day", 0))
+                if s_month > 0:
+                    start_date = date(today.year, s_month, s_day)
+                    end_date = date(today.year, e_month, e_day)
+                    if start_date > end_date: 
+                        if today >= start_date or today <= end_date: is_match = True
+                    else:
+                        if start_date <= today <= end_date: is_match = True
+        except: continue
+
+        if is_match: messages_to_show.append(msg)
+
+    return messages_to_show
+
+
+# ==========================================
+# 5. 描画用データ・検索・自動完了
+# ==========================================
+def decide_snapshot_render():
+    """
+    今回の実行をスナップショットで先行描画するかを決める
+
+    認証がまだ終わっておらず、スナップショットがある場合にTrue。
+    （描画後に認証完了を待ってから再実行し、最新データに差し替える）
+    """
+    use_snapshot = (not is_gsheet_ready()) and os.path.exists(SNAPSHOT_PATH)
+    st.session_state['rendered_from_snapshot'] = use_snapshot
+    return use_snapshot
+
+def load_reservations_for_view():
+    """
+    各画面の描画用に予約データを取得する
+
+    認証がまだ終わっていない起動直後（decide_snapshot_render() がTrueの実行）は、
+    前回のスナップショットで先に描画する。
+    """
+    if st.session_state.get('rendered_from_snapshot'):
+        snapshot = read_reservations_snapshot()
+        if snapshot is not None:
+            return snapshot
+    try:
+        return load_reservations()
+    except Exception as e:
+        st.error(f"Google Sheetへの接続に失敗しました: {e}")
+        st.stop()
+
+def load_slot_index():
+    """
+    施設・日付ごとの時間帯インデックス（slot_index.build_slot_index()。重複予約の確認・空き時間の提案に使う）
+
+    予約シートの世代ごとに1回だけ作り、全セッションで共有する（参加表明ログの追記では時間帯が変わらないので作り直さない）。
+    行番号は load_reservations() と同じ。
+    """
+    return _slot_index(reservations_generation()[:2])
+
+@perf.cache_counter("slot_index")
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _slot_index(generation):
+    perf.mark_cache_miss()
+    return build_slot_index(_reservations_snapshot(generation))
+
+# 検索結果に表示する件数
+SEARCH_RESULT_LIMIT = 200
+
+@st.cache_resource(show_spinner=False)
+def _search_store():
+    """
+    予約の検索インデックス（プロセスで共有）
+
+    generation: インデックスを作った予約シートの世代（変わったら作り直す）
+    view: 最後に反映した予約データ（参加表明ログを適用したもの）
+    """
+    return {"lock": threading.Lock(), "generation": None, "view": None, "index": None}
+
+@perf.cache_counter("search_index")
+def load_search_index():
+    """
+    予約の検索インデックス
+
+    予約シートを取り直したときだけ全件から作り、参加表明ログの追記分は参加者が変わった行だけを反映する。
+
+    Returns:
+        ReservationSearchIndex
+    """
+    generation = reservations_generation()
+    view = _materialized_reservations(generation)
+    store = _search_store()
+    with store["lock"]:
+        if store["view"] is view:
+            return store["index"]
+        perf.mark_cache_miss()
+        if store["generation"] == generation[:2] and store["view"] is not None and len(store["view"]) == len(view):
+            with perf.span("search.update"):
+                store["index"].update(store["view"], view, changed_name_rows(store["view"], view))
+        else:
+            with perf.span("search.build"):
+                store["index"] = ReservationSearchIndex(view)
+        store.update(generation=generation[:2], view=view)
+        return store["index"]
+
+def search_reservations(query, limit=SEARCH_RESULT_LIMIT):
+    """
+    施設名・コート種類・メモ・参加者から予約を検索する
+
+    Returns:
+        list: 予約データの行ラベル（一致度の高い順）
+    """
+    return load_search_index().search(query, limit=limit)
+
+def auto_complete_yesterday_events():
+    """前日分のイベントをステータス「完了」に変更する。
+
+    - 同日に既に処理済みなら何もしない（セッションフラグで抑制）
+    - 処理時は最新データを読み直して、昨日の未完了イベントのみを更新する（競合緩和）
+    """
+    today_jst = jst_today()
+    yesterday = today_jst - timedelta(days=1)
+
+    # 同日に既に処理済みなら何もしない
+    if st.session_state.get('auto_completed_for_date') == str(yesterday):
+        return
+
+    # 最新データを読み込み
+    latest_df = load_reservations()
+    if latest_df.empty:
+        st.session_state['auto_completed_for_date'] = str(yesterday)
+        return
+
+    # dateが昨日かつstatusが完了/中止でない行を検出
+    mask = (latest_df['date'] == yesterday) & (~latest_df['status'].isin(['完了', '中止']))
+    cnt = int(mask.sum())
+    if cnt > 0:
+        latest_df.loc[mask, 'status'] = '完了'
+        save_reservations(latest_df)
+        # 通知は不要のため表示しない
+
+    # 処理済み日をセッションに保管
+    st.session_state['auto_completed_for_date'] = str(yesterday)
+
+
+# ==========================================
+# 6. 変更通知（他セッション・他サーバーへの反映）
+# ==========================================
+# 予約シートのリビジョンを記録するシート（key / value の2列）
+#   1〜3行目: ヘッダー・reservations_revision・reservations_rows（予約を保存するたびに書き換える）
+#   4行目: participations_rows（参加表明ログの件数。ログに追記するたびに書き換える）
+META_SHEET = "meta"
+# meta シートを確認する間隔（秒）
+SHEET_POLL_INTERVAL_SEC = 10
+
+def session_key():
+    """変更通知の送り主を見分けるための、セッションごとのキー"""
+    if 'session_key' not in st.session_state:
+        st.session_state['session_key'] = uuid.uuid4().hex
+    return st.session_state['session_key']
+
+def get_or_create_worksheet(sheet_name, rows=10, cols=2, sheet_id=None):
+    """シートを取得する（無ければ作成する。sheet_id は get_worksheet() と同じ）"""
+    from gspread.exceptions import WorksheetNotFound
+    try:
+        return get_worksheet(sheet_name, sheet_id)
+    except WorksheetNotFound:
+        spreadsheet = _spreadsheet_override or start_gsheet_auth(sheet_id or gsheet_id()).result()
+        return run_with_retry(spreadsheet.add_worksheet, title=sheet_name, rows=rows, cols=cols)
+
+def write_reservations_revision(row_count, sheet_id=None):
+    """
+    予約シートを更新したことを meta シートに記録する
+
+    Args:
+        row_count: 保存後の予約の件数（不明ならNone）
+        sheet_id: スプレッドシートID（バックグラウンドスレッドから呼ぶときに指定）
+
+    Returns:
+        int: 書き込んだリビジョン（ミリ秒単位の時刻。同じプロセス内では必ず増える）
+    """
+    revision = max(int(time.time() * 1000), (change_feed.known_sheet_revision() or 0) + 1)
+    meta_sheet = get_or_create_worksheet(META_SHEET, sheet_id=sheet_id)
+    run_with_retry(meta_sheet.update, [
+        ["key", "value"],
+        ["reservations_revision", str(revision)],
+        ["reservations_rows", "" if row_count is None else str(row_count)],
+    ])
+    return revision
+
+def write_participations_rows(log_rows):
+    """参加表明ログの件数を meta シートに記録する（予約リビジョンの行は書き換えない）"""
+    meta_sheet = get_or_create_worksheet(META_SHEET)
+    run_with_retry(meta_sheet.update, [["participations_rows", str(log_rows)]], "A4")
+
+def read_sheet_revisions(meta_sheet):
+    """
+    meta シートから予約シートのリビジョンと参加表明ログの件数を読む
+
+    Returns:
+        tuple: (予約リビジョン, ログの件数)。未記録ならそれぞれNone
+    """
+    values = run_with_retry(meta_sheet.get_all_values)
+    meta = {row[0]: row[1] for row in values[1:] if len(row) >= 2}
+
+    def to_int(key):
+        try:
+            return int(meta.get(key, ""))
+        except ValueError:
+            return None
+    return to_int("reservations_revision"), to_int("participations_rows")
+
+@st.cache_resource(show_spinner=False)
+def start_sheet_watcher():
+    """
+    meta シートのリビジョンを定期的に確認するスレッドを開始する（プロセスに1つ）
+
+    別のサーバープロセスが予約を保存するとリビジョンが変わるので、
+    予約データのキャッシュを破棄して change_feed に通知する。確認のたびに add_watcher_task() の関数も実行する。
+    参加表明ログの件数だけが変わった場合は meta シートのキャッシュだけを破棄する（ログは次の読み込みで末尾だけ読む）。
+    シートを直接編集した場合はリビジョンが変わらないため、RESERVATIONS_MAX_AGE_SEC ごとの全件取得で反映される。
+
+    Returns:
+        threading.Event: set() するとスレッドが止まる（開始できなければNone）
+    """
+    try:
+        meta_sheet = get_or_create_worksheet(META_SHEET)
+    except Exception as e:
+        logger.warning("sheet watcher not started: %s", e)
+        return None
+
+    stop = threading.Event()
+    participations = _participations_store()
+
+    def poll():
+        try:
+            last, last_log_rows = read_sheet_revisions(meta_sheet)
+        except Exception:
+            last, last_log_rows = None, None
+        _run_watcher_tasks()
+        while not stop.wait(SHEET_POLL_INTERVAL_SEC):
+            try:
+                revision, log_rows = read_sheet_revisions(meta_sheet)
+            except Exception as e:
+                logger.warning("sheet watcher read failed: %s", e)
+                continue
+            # 自プロセスで保存・追記した分は保存時に通知済み
+            if revision != last and revision != change_feed.known_sheet_revision():
+                load_reservations.clear()
+                change_feed.publish("sheet", sheet_revision=revision)
+            elif log_rows != last_log_rows and log_rows != participations["written"]:
+                load_sheet_revisions.clear()
+                change_feed.publish("sheet")
+            last, last_log_rows = revision, log_rows
+            _run_watcher_tasks()
+
+    threading.Thread(target=poll, name="sheet-watcher", daemon=True).start()
+    return stop
+
+@st.cache_resource(show_spinner=False)
+def _watcher_tasks():
+    """シート監視スレッドが確認のたびに実行する関数（プロセスで共有。"モジュール名.関数名" → 関数）"""
+    return {}
+
+def add_watcher_task(func):
+    """
+    シート監視スレッドが meta シートを確認するたびに（開始時と SHEET_POLL_INTERVAL_SEC ごとに）実行する関数を登録する
+
+    予約データから作るファイルの書き出しなど、利用者の再実行の中で行いたくない処理に使う。
+    同じ関数は1回だけ登録する（モジュールを読み直した場合は新しい方に置き換える）。
+    """
+    _watcher_tasks()[f"{func.__module__}.{func.__qualname__}"] = func
+
+def _run_watcher_tasks():
+    for name, func in list(_watcher_tasks().items()):
+        try:
+            func()
+        except Exception as e:
+            logger.warning("watcher task %s failed: %s", name, e)
+
+
+# ==========================================
+# 7. 参加表明ログ（participations シート）
+# ==========================================
+@st.cache_resource(show_spinner=False)
+def _participations_store():
+    """
+    読み込み済みの参加表明ログ（プロセスで共有）
+
+    rows: 読み込んだログの行数（ヘッダーを除く。次はこの続きから読む）
+    rosters: 予約ID → [(名前, status, 定員)]（ログの順）
+    written: このプロセスが最後に追記したあとのログの件数
+    base / ids / view: 最後にログを適用した予約シートの全件・その予約ID・適用結果
+    header: このプロセスでヘッダー行（LOG_COLUMNS）を確認済みなら True
+    """
+    return {
+        "lock": threading.Lock(), "source": None, "rows": 0, "rosters": {}, "written": None,
+        "base": None, "ids": None, "view": None, "header": False,
+    }
+
+def _read_participation_tail(rows_read):
+    """participations シートの rows_read 件目より後の行（シートが無ければ空）"""
+    from gspread.exceptions import WorksheetNotFound
+    try:
+        worksheet = get_worksheet(PARTICIPATIONS_SHEET)
+    except WorksheetNotFound:
+        return []
+    # 1行目はヘッダー
+    return list(run_with_retry(worksheet.get, f"A{rows_read + 2}:E"))
+
+def apply_participation_log(base):
+    """
+    予約シートの全件に参加表明ログを適用する
+
+    ログは前回読んだ続きの行だけを読み、参加状況が変わった予約の行だけを組み立て直す
+    （予約シートを取り直したときは、読み込み済みのログを全件に適用し直す）。
+
+    Args:
+        base: 予約シートの全件（変更しない）
+
+    Returns:
+        DataFrame: ログを適用した予約データ（ログが無ければ base のまま）
+    """
+    store = _participations_store()
+    with store["lock"]:
+        # 別のスプレッドシートに切り替えたら読み直す
+        source = id(_spreadsheet_override) if _spreadsheet_override is not None else gsheet_id()
+        if store["source"] != source:
+            store.update(source=source, rows=0, rosters={}, written=None, base=None, ids=None, view=None, header=False)
+        try:
+            with perf.span("participations.tail"):
+                tail = _read_participation_tail(store["rows"])
+        except Exception as e:
+            logger.warning("participations read failed: %s", e)
+            tail = []
+        store["rows"] += len(tail)
+        touched = apply_entries(store["rosters"], parse_log_rows(tail))
+        if not store["rosters"]:
+            return base
+
+        if store["base"] is base and store["view"] is not None:
+            view = apply_rosters(store["view"], store["ids"], store["rosters"], only=touched)
+        else:
+            store["ids"] = reservation_ids(base)
+            view = apply_rosters(base, store["ids"], store["rosters"])
+        store["base"], store["view"] = base, view
+        return view
+
+def _appended_rows(response):
+    """append_rows() の応答から、追記した最後の行の行番号を取り出す（分からなければNone）"""
+    try:
+        updated_range = response["updates"]["updatedRange"]
+        return int(re.search(r"(\d+)$", updated_range).group(1))
+    except (TypeError, KeyError, AttributeError, ValueError):
+        return None
+
+def append_participations(entries, status_updates=None):
+    """
+    参加表明をログに追記する（予約シートは書き換えない）
+
+    複数の予約への参加表明も、ログへの追記と予約シートのステータスの書き換えをそれぞれ1回で行う。
+
+    Args:
+        entries: (予約ID, 名前, status) または (予約ID, 名前, status, 定員) のリスト。
+                 status は 参加 / 保留 / 欠席 / キャンセル待ち / 削除
+                 （追記した順に適用するので、キャンセル待ちの繰り上げは席を空けた表明の後に並べる）。
+                 定員は判定に使った予約の定員（ログを適用するとき、この定員を超える「参加」はキャンセル待ちにする）
+        status_updates: 定員による自動ステータス変更があれば {予約ID: 新しいステータス}
+    """
+    if not entries:
+        return
+    store = _participations_store()
+    stamp = (datetime.utcnow() + timedelta(hours=9)).strftime("%Y-%m-%d %H:%M:%S")
+    values = [
+        [rid, nick, status, stamp, encode_capacity(capacity[0] if capacity else None)]
+        for rid, nick, status, *capacity in entries
+    ]
+    worksheet = get_or_create_worksheet(PARTICIPATIONS_SHEET, cols=len(LOG_COLUMNS))
+    if not store["header"]:
+        # ヘッダーを書く（capacity 列が無かったころのシートは列を足す）
+        _ensure_sheet_columns(worksheet, LOG_COLUMNS)
+        store["header"] = True
+    last_row = _appended_rows(run_with_retry(worksheet.append_rows, values))
+    log_rows = last_row - 1 if last_row else max(store["rows"], store["written"] or 0) + len(entries)
+    store["written"] = max(store["written"] or 0, log_rows)
+    try:
+        write_participations_rows(store["written"])
+    except Exception as e:
+        logger.warning("meta participations write failed: %s", e)
+
+    if status_updates:
+        base = _snapshot_store()["last"]
+        updates = {rid: {"status": status} for rid, status in status_updates.items()}
+        update_reservation_cells(updates)
+        load_reservations.clear()
+        _notify_reservations_saved(
+            None, base=base, patch=lambda frame: _patch_snapshot(frame, updates=updates), ids=list(updates),
+        )
+    else:
+        load_sheet_revisions.clear()
+        change_feed.publish(session_key())
+
+    # 変更履歴には参加状況を反映した後の行を記録する（ログの続きを読むだけで、予約シートは読み直さない）
+    if _spreadsheet_override is None:
+        df = load_reservations()
+        touched = reservation_ids(df).isin({rid for rid, _, _ in entries}).to_numpy()
+        _record_history(df, serialize_reservations(df[touched]), "participation", mask=touched)
+
+def _sheet_reservation_ids(worksheet, header):
+    """
+    予約シートの各行の予約ID（シートの並び。id が空欄の行は読み込み時と同じく fill_reservation_ids() で埋める）
+
+    id 列と date 列だけを読み、空欄の行があるときだけ開始時刻・施設名の列も読む。
+
+    Returns:
+        list: 2行目からの予約ID
+    """
+    from gspread.utils import rowcol_to_a1
+
+    def column(name):
+        if name not in header:
+            return []
+        letter = rowcol_to_a1(1, header.index(name) + 1)[:-1]
+        return [row[0] if row else "" for row in run_with_retry(worksheet.get, f"{letter}2:{letter}")]
+
+    ids, days = column("id"), column("date")
+    n = max(len(ids), len(days))
+    ids += [""] * (n - len(ids))
+    if all(ids):
+        return ids
+    key_columns = {"id": ids, "date": days}
+    for name in ("start_hour", "start_minute", "facility"):
+        key_columns[name] = column(name)
+    # 予約IDに使う列だけを RESERVATION_SCHEMA の型に変換する
+    frame = pd.DataFrame({
+        name: _COLUMN_PARSERS[RESERVATION_SCHEMA[name]](pd.Series(values + [""] * (n - len(values)), dtype=object))
+        for name, values in key_columns.items()
+    })
+    return fill_reservation_ids(frame).tolist()
+
+def update_reservation_cells(updates):
+    """
+    予約シートの指定したセルだけを書き換える（複数の行もまとめて1回で書き込む）
+
+    書き込む行は書き込みの直前に予約IDで探す。見つからない予約（他のサーバーで削除された予約）は書き込まない。
+
+    Args:
+        updates: 予約ID → {列名: 値}
+
+    Returns:
+        int: 書き込んだ予約の件数
+    """
+    from gspread.utils import rowcol_to_a1
+    worksheet = get_worksheet("reservations")
+    header = run_with_retry(worksheet.get, "1:1")[0]
+    sheet_rows = {rid: row for row, rid in enumerate(_sheet_reservation_ids(worksheet, header), start=2)}
+    missing = [rid for rid in updates if rid not in sheet_rows]
+    if missing:
+        logger.warning("reservations not found, skipped: %s", missing)
+    data = [
+        {"range": rowcol_to_a1(sheet_rows[rid], header.index(col) + 1), "values": [_encode_column([value])]}
+        for rid, values in updates.items() if rid in sheet_rows
+        for col, value in values.items() if col in header
+    ]
+    if data:
+        run_with_retry(worksheet.batch_update, data)
+    return len(updates) - len(missing)
+
+
+# ==========================================
+# 8. 書き込みジャーナル（シートの丸ごと書き換えの復旧）
+# ==========================================
+JOURNAL_REPLACE = "replace_sheet"
+# 未完了の書き込みを確認する間隔（秒）。書き込みに失敗したときはすぐに確認する
+JOURNAL_RETRY_SEC = 30
+_journal_wakeup = threading.Event()
+# 書き込み中のエントリID（バックグラウンドで書き直さない）
+_journal_in_flight = set()
+# シートごとの書き込み待ち（シート名 → {"queue": 待っている書き換え, "busy": 書き込み中なら True}）
+_sheet_writers = {}
+_sheet_writers_lock = threading.Lock()
+
+def replace_sheet(sheet_name, values, base_revision=None, ensure_row=None):
+    """
+    シートを丸ごと書き換える（clear → update）
+
+    書き換える前に内容をジャーナルに記録し、終わったら完了を記録する。
+    途中で失敗した場合は例外をそのまま送出し、バックグラウンドで書き直す（flush_journal）。
+    同じシートへの書き込み中に届いた書き換えは待たせておき、書き込みが終わったら
+    待っている分を最も新しい内容の1回の書き込みにまとめる（ensure_row はすべて残す）。
+    どの呼び出しも、自分の内容（またはそれより新しい内容）を書き込み終わってから戻る。
+
+    Args:
+        sheet_name: シート名
+        values: 1行目がヘッダーの2次元リスト
+        base_revision: 書き換える前の予約リビジョン（予約シートのみ）
+        ensure_row: 書き換えの目的の行（施設の追加など。1列目で存在を確認する）
+
+    Returns:
+        list: 実際に書き込んだ内容（後から届いた書き換えにまとめた場合はそちらの内容）
+    """
+    entry_id = None
+    if _spreadsheet_override is None:
+        payload = {"values": values, "base_revision": base_revision, "ensure_row": ensure_row}
+        entry_id = journal.record(JOURNAL_REPLACE, sheet_name, payload)
+        _journal_in_flight.add(entry_id)
+    request = {
+        "values": values, "ensure_row": ensure_row, "entry_id": entry_id,
+        "done": threading.Event(), "lead": False, "written": None, "error": None,
+    }
+    with _sheet_writers_lock:
+        writer = _sheet_writers.setdefault(sheet_name, {"queue": [], "busy": False})
+        writer["queue"].append(request)
+        request["lead"] = not writer["busy"]
+        writer["busy"] = True
+    while not request["lead"]:
+        request["done"].wait()
+        request["done"].clear()
+        if request["written"] is not None or request["error"] is not None:
+            break
+    else:
+        _write_queued(sheet_name, writer)
+    if request["error"] is not None:
+        raise request["error"]
+    return request["written"]
+
+def _write_queued(sheet_name, writer):
+    """
+    待っている書き換えをまとめて1回で書き込み、次に待っている書き換えがあればその呼び出しに書き込みを任せる
+    """
+    with _sheet_writers_lock:
+        batch, writer["queue"] = writer["queue"], []
+    values = batch[-1]["values"]
+    names = {row[0] for row in values[1:] if row}
+    missing = [r["ensure_row"] for r in batch if r["ensure_row"] and r["ensure_row"][0] not in names]
+    if missing:
+        values = values + missing
+    try:
+        with perf.span("sheets.replace"):
+            worksheet = get_worksheet(sheet_name)
+            run_with_retry(worksheet.clear)
+            run_with_retry(worksheet.update, values)
+    except Exception as e:
+        _journal_wakeup.set()
+        for r in batch:
+            r["error"] = e
+    else:
+        for i, r in enumerate(batch):
+            r["written"] = values
+            if r["entry_id"] is not None:
+                journal.ack(r["entry_id"], "done" if i == len(batch) - 1 else "merged")
+    finally:
+        for r in batch:
+            _journal_in_flight.discard(r["entry_id"])
+            r["done"].set()
+        with _sheet_writers_lock:
+            if writer["queue"]:
+                writer["queue"][0]["lead"] = True
+                writer["queue"][0]["done"].set()
+            else:
+                writer["busy"] = False
+
+def _replay_replace(sheet_name, entries, sheet_id):
+    """
+    同じシートへの未完了の書き換えを、まとめて1回だけ書き直す
+
+    - シートが空（clear の後で止まった）: 最も新しい内容を書き込む（施設は行数が最も多い内容に、各エントリの ensure_row を足す）
+    - 予約シート: 書き換える前から予約リビジョンが変わっていなければ、最も新しい内容で書き換える
+    - それ以外: ensure_row が無ければ末尾に追記し、書き換えはしない（後から保存された内容を上書きしない）
+
+    Returns:
+        str: done（書き込んだ）/ skipped（書き込まなかった）
+    """
+    worksheet = get_worksheet(sheet_name, sheet_id)
+    current = run_with_retry(worksheet.get_all_values)
+    latest = entries[-1]["payload"]
+    ensure_rows = [e["payload"]["ensure_row"] for e in entries if e["payload"].get("ensure_row")]
+
+    if not current:
+        if ensure_rows:
+            values = max((e["payload"]["values"] for e in entries), key=len)
+            names = {row[0] for row in values[1:] if row}
+            values = values + [row for row in ensure_rows if row[0] not in names]
+        else:
+            values = latest["values"]
+        run_with_retry(worksheet.update, values)
+        return "done"
+
+    if sheet_name == "reservations" and latest.get("base_revision") is not None:
+        revision, _ = read_sheet_revisions(get_worksheet(META_SHEET, sheet_id))
+        if revision == entries[0]["payload"]["base_revision"]:
+            run_with_retry(worksheet.clear)
+            run_with_retry(worksheet.update, latest["values"])
+            return "done"
+
+    names = {row[0] for row in current[1:] if row}
+    missing = [row for row in ensure_rows if row[0] not in names]
+    if missing:
+        run_with_retry(worksheet.append_rows, missing)
+        return "done"
+    return "skipped"
+
+def flush_journal(sheet_id=None):
+    """
+    ジャーナルの未完了の書き込みをシートごとにまとめて書き直す
+
+    Args:
+        sheet_id: スプレッドシートID（バックグラウンドスレッドから呼ぶときに指定）
+
+    Returns:
+        int: 書き直したシートの数
+    """
+    groups = {}
+    for entry in journal.pending():
+        if entry["kind"] == JOURNAL_REPLACE and entry["id"] not in _journal_in_flight:
+            groups.setdefault(entry["key"], []).append(entry)
+
+    written = 0
+    for sheet_name, entries in groups.items():
+        try:
+            with perf.span("journal.replay"):
+                result = _replay_replace(sheet_name, entries, sheet_id)
+        except Exception as e:
+            logger.warning("journal replay failed (%s): %s", sheet_name, e)
+            continue
+        if result != "done":
+            logger.warning("journal: skipped %d stale write(s) to %s", len(entries), sheet_name)
+        for entry in entries[:-1]:
+            journal.ack(entry["id"], "merged")
+        journal.ack(entries[-1]["id"], result)
+        if result != "done":
+            continue
+        written += 1
+        if sheet_name == "reservations":
+            load_reservations.clear()
+            try:
+                change_feed.publish("journal", sheet_revision=write_reservations_revision(None, sheet_id=sheet_id))
+            except Exception as e:
+                logger.warning("meta revision write failed: %s", e)
+                change_feed.publish("journal")
+        elif sheet_name in REFERENCE_LOADERS and refresh_reference_data([sheet_name], sheet_id=sheet_id):
+            change_feed.publish("reference")
+    return written
+
+@st.cache_resource(show_spinner=False)
+def start_journal_flusher(sheet_id):
+    """
+    ジャーナルの未完了の書き込みを書き直すスレッドを開始する（プロセスに1つ）
+
+    起動直後に1回（前回のプロセスが書き込み途中で止まった分の復旧）、以後は JOURNAL_RETRY_SEC ごと、
+    または書き込みに失敗したときに確認する。その間に溜まった同じシートへの書き込みは1回にまとめる。
+
+    Returns:
+        threading.Event: set() するとスレッドが止まる
+    """
+    stop = threading.Event()
+
+    def flush_loop():
+        while not stop.is_set():
+            _journal_wakeup.clear()
+            if journal.pending():
+                flush_journal(sheet_id)
+            _journal_wakeup.wait(JOURNAL_RETRY_SEC)
+
+    threading.Thread(target=flush_loop, name="journal-flusher", daemon=True).start()
+    return stop
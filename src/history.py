@@ -0,0 +1,259 @@
+"""予約データの変更履歴（定期的な全件スナップショット + 保存ごとの行単位の差分）
+
+data/history/ に保存する。
+  snapshot-<ミリ秒>.json.gz: その時点の全件（ヘッダーと、予約キー → シートの1行）
+  deltas-<ミリ秒>.jsonl: 同じ時刻のスナップショット以後の差分（1保存1行。変わった行と消えた予約キーだけ。
+                         1行目はスナップショットを取った保存自体の差分で、snapshot=True）
+ある時点の内容は、その時点以前で最も新しいスナップショットに、その後の差分を順に適用して作る（シートは読み直さない）。
+予約キーは予約ID（予約シートの id 列。participation_log.reservation_ids()）。
+
+1つのサーバープロセスが data/ を使う前提（journal.py と同じ）。
+"""
+import os
+import re
+import gzip
+import json
+import time
+import threading
+
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "history")
+# 差分がこの件数に達したら、次の保存で全件のスナップショットを取り直す
+SNAPSHOT_EVERY = 50
+# 残すスナップショット（とその後の差分）の数
+KEEP_SNAPSHOTS = 20
+
+_lock = threading.Lock()
+# 最新の内容（header / rows: 予約キー → 行 / snapshot_ts / deltas: スナップショット以後の差分の数 / last_ts: 最後に記録した時刻）
+_state = None
+
+
+# ==========================================
+# 1. ファイル
+# ==========================================
+def _snapshot_times():
+    """保存されているスナップショットの時刻（ミリ秒、古い順）"""
+    try:
+        names = os.listdir(HISTORY_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(int(m.group(1)) for m in map(re.compile(r"snapshot-(\d+)\.json\.gz$").match, names) if m)
+
+def _snapshot_path(ts):
+    return os.path.join(HISTORY_DIR, f"snapshot-{ts}.json.gz")
+
+def _deltas_path(ts):
+    return os.path.join(HISTORY_DIR, f"deltas-{ts}.jsonl")
+
+def _read_snapshot(ts):
+    with gzip.open(_snapshot_path(ts), "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def _read_deltas(ts):
+    """スナップショット ts の後の差分（書き込み途中で落ちた最後の行は読み飛ばす）"""
+    deltas = []
+    try:
+        with open(_deltas_path(ts), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    deltas.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return deltas
+
+def _write_snapshot(ts, header, rows):
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    tmp = _snapshot_path(ts) + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump({"ts": ts, "header": header, "rows": rows}, f, ensure_ascii=False)
+    os.replace(tmp, _snapshot_path(ts))
+    # 古いスナップショットと差分を消す
+    for old in _snapshot_times()[:-KEEP_SNAPSHOTS]:
+        for path in (_snapshot_path(old), _deltas_path(old)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def _append_delta(snapshot_ts, delta):
+    with open(_deltas_path(snapshot_ts), "a", encoding="utf-8") as f:
+        f.write(json.dumps(delta, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def _apply_delta(header, rows, delta):
+    """差分を適用する（rows はその場で更新する）"""
+    for key in delta.get("delete", []):
+        rows.pop(key, None)
+    rows.update(delta.get("upsert", {}))
+    return delta.get("header", header)
+
+def _load_state():
+    """最新の内容（初回はファイルから組み立てる）"""
+    global _state
+    if _state is None:
+        times = _snapshot_times()
+        if times:
+            snapshot = _read_snapshot(times[-1])
+            header, rows = snapshot["header"], snapshot["rows"]
+            deltas = _read_deltas(times[-1])
+            for delta in deltas:
+                header = _apply_delta(header, rows, delta)
+            _state = {
+                "header": header, "rows": rows, "snapshot_ts": times[-1],
+                "deltas": sum(not d.get("snapshot") for d in deltas),
+                "last_ts": max([times[-1]] + [d["ts"] for d in deltas]),
+            }
+        else:
+            _state = {"header": None, "rows": None, "snapshot_ts": None, "deltas": 0, "last_ts": 0}
+    return _state
+
+
+# ==========================================
+# 2. 記録
+# ==========================================
+def _now_ms(state):
+    # 同じミリ秒に2回保存しても時刻の順序が崩れないようにする
+    return max(int(time.time() * 1000), state["last_ts"] + 1)
+
+def _diff(state, header, rows, full):
+    """前回の内容からの差分（full=False なら rows に無い行は変わっていないものとする）"""
+    old = state["rows"] or {}
+    delta = {
+        "ts": _now_ms(state),
+        "upsert": {key: row for key, row in rows.items() if old.get(key) != row},
+        "delete": [key for key in old if key not in rows] if full else [],
+    }
+    if header != state["header"]:
+        delta["header"] = header
+    return delta
+
+def record_state(header, rows, source=""):
+    """
+    保存した全件を記録する（前回の内容との差分だけを書き込む）
+
+    Args:
+        header: シートのヘッダー行
+        rows: 予約キー → シートの1行（文字列のリスト）
+        source: 変更元（画面に表示するだけ）
+
+    Returns:
+        int: 変わった行の数
+    """
+    with _lock:
+        state = _load_state()
+        delta = _diff(state, header, rows, full=True)
+        delta["source"] = source
+        if state["rows"] is None or state["deltas"] >= SNAPSHOT_EVERY:
+            changed = len(delta["upsert"]) + len(delta["delete"])
+            if state["rows"] is None:
+                # 最初のスナップショットは全行が差分になるため、行は書かず件数だけ残す
+                delta.update(upsert={}, changed=changed)
+            delta["snapshot"] = True
+            _write_snapshot(delta["ts"], header, rows)
+            _append_delta(delta["ts"], delta)
+            state.update(header=header, rows=dict(rows), snapshot_ts=delta["ts"], deltas=0, last_ts=delta["ts"])
+            return changed
+        return _commit(state, delta)
+
+def record_rows(header, rows, source=""):
+    """
+    一部の行の変更を記録する（追記・参加表明など。rows に無い行は変わっていないものとする）
+
+    Returns:
+        int: 変わった行の数
+    """
+    with _lock:
+        state = _load_state()
+        if state["rows"] is None:
+            return 0  # 全件を一度も記録していなければ、次の全件保存で記録する
+        delta = _diff(state, header, rows, full=False)
+        delta["source"] = source
+        return _commit(state, delta)
+
+def _commit(state, delta):
+    changed = len(delta["upsert"]) + len(delta["delete"])
+    if changed == 0 and "header" not in delta:
+        return 0
+    _append_delta(state["snapshot_ts"], delta)
+    state["header"] = _apply_delta(state["header"], state["rows"], delta)
+    state["deltas"] += 1
+    state["last_ts"] = delta["ts"]
+    return changed
+
+
+# ==========================================
+# 3. 参照
+# ==========================================
+def state_at(ts):
+    """
+    ある時点の全件
+
+    Args:
+        ts: 時刻（ミリ秒）
+
+    Returns:
+        tuple: (ヘッダー, 予約キー → 行)。その時点の履歴が無ければ (None, None)
+    """
+    with _lock:
+        times = [t for t in _snapshot_times() if t <= ts]
+        if not times:
+            return None, None
+        snapshot = _read_snapshot(times[-1])
+        header, rows = snapshot["header"], snapshot["rows"]
+        for delta in _read_deltas(times[-1]):
+            if delta["ts"] > ts:
+                break
+            header = _apply_delta(header, rows, delta)
+        return header, rows
+
+def timeline():
+    """
+    記録した変更の一覧（新しい順）
+
+    Returns:
+        list[dict]: ts / source / changed（変わった行の数）/ snapshot（全件のスナップショットも取った保存なら True）
+    """
+    with _lock:
+        entries = []
+        for snapshot_ts in _snapshot_times():
+            for delta in _read_deltas(snapshot_ts):
+                entries.append({
+                    "ts": delta["ts"], "source": delta.get("source", ""),
+                    "changed": delta.get("changed", len(delta.get("upsert", {})) + len(delta.get("delete", []))),
+                    "snapshot": bool(delta.get("snapshot")),
+                })
+        return entries[::-1]
+
+def versions(key):
+    """
+    1つの予約の変更の履歴（古い順。消えた時点は行が None）
+
+    スナップショットを取った保存の差分も記録しているため、読むスナップショットは最も古いものだけ。
+
+    Returns:
+        list[tuple]: (時刻, ヘッダー, 行)
+    """
+    with _lock:
+        times = _snapshot_times()
+        if not times:
+            return []
+        snapshot = _read_snapshot(times[0])
+        header, row = snapshot["header"], snapshot["rows"].get(key)
+        result = [(times[0], header, row)]
+        for snapshot_ts in times:
+            for delta in _read_deltas(snapshot_ts):
+                header = delta.get("header", header)
+                if key in delta.get("upsert", {}):
+                    row = delta["upsert"][key]
+                elif key in delta.get("delete", []):
+                    row = None
+                else:
+                    continue
+                result.append((delta["ts"], header, row))
+        result = [v for i, v in enumerate(result) if i == 0 or v[2] != result[i - 1][2]]
+        # 最初に現れるまでの「無し」は除く
+        while result and result[0][2] is None:
+            result.pop(0)
+        return result
@@ -0,0 +1,99 @@
+"""シートへの書き込みのジャーナル（先行書き込みログ）
+
+シートを clear → update で丸ごと書き換える前に、書き込む内容を data/journal/journal.jsonl に記録し、
+書き込みが終わったら完了（ack）を記録する。プロセスが落ちたり API が失敗したりして
+完了の記録が無いエントリは、data_access のバックグラウンドスレッドが書き直す。
+
+1行1レコードの JSON で、追記のたびに fsync する。書き込み途中で落ちた最後の行は読み飛ばす。
+1つのサーバープロセスが data/ を使う前提（複数のプロセスで同じファイルを共有しない）。
+"""
+import os
+import json
+import time
+import uuid
+import threading
+
+JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "journal", "journal.jsonl")
+
+_lock = threading.Lock()
+# 完了していないエントリ（ID → レコード）。初回アクセス時にファイルから読む
+_pending = None
+
+
+def _load():
+    global _pending
+    if _pending is not None:
+        return _pending
+    pending = {}
+    try:
+        with open(JOURNAL_PATH, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("op") == "record":
+                    pending[record["id"]] = record
+                elif record.get("op") == "ack":
+                    pending.pop(record.get("id"), None)
+    except FileNotFoundError:
+        pass
+    _pending = pending
+    return pending
+
+def _append(record):
+    os.makedirs(os.path.dirname(JOURNAL_PATH), exist_ok=True)
+    with open(JOURNAL_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def record(kind, key, payload):
+    """
+    書き込む前に、書き込む内容を記録する
+
+    Args:
+        kind: 書き込みの種類（data_access が書き直すときの処理を選ぶ）
+        key: 書き込み先（シート名）
+        payload: 書き直しに必要な内容（JSON にできる値）
+
+    Returns:
+        str: エントリID（ack() に渡す）
+    """
+    entry = {"op": "record", "id": uuid.uuid4().hex, "ts": time.time(), "kind": kind, "key": key, "payload": payload}
+    with _lock:
+        _append(entry)
+        _load()[entry["id"]] = entry
+    return entry["id"]
+
+def ack(entry_id, result="done"):
+    """
+    書き込みが終わった（または不要になった）ことを記録する
+
+    完了していないエントリが無くなったらファイルを空にする（ジャーナルが大きくならないように）。
+
+    Args:
+        entry_id: record() の戻り値
+        result: 記録する結果（done: 書き込んだ / merged: 後のエントリにまとめた / skipped: 書き直さなかった）
+    """
+    with _lock:
+        pending = _load()
+        if pending.pop(entry_id, None) is None:
+            return
+        if pending:
+            _append({"op": "ack", "id": entry_id, "ts": time.time(), "result": result})
+        else:
+            try:
+                os.remove(JOURNAL_PATH)
+            except FileNotFoundError:
+                pass
+
+def pending():
+    """
+    完了していないエントリ（記録した順）
+
+    Returns:
+        list[dict]: id / ts / kind / key / payload
+    """
+    with _lock:
+        return list(_load().values())
@@ -0,0 +1,146 @@
+"""メンバー名簿（members シート）と名前の前方一致インデックス（参加表明の名前選択用）
+
+members シートは1人1行で、name（表示する名前）と aliases（";" 区切りの別名。打ち間違いや旧表記）を持つ。
+名前・別名は表記を揃えて（全角/半角・大文字/小文字・カタカナ/ひらがなを区別せず）トライに登録し、
+入力した先頭の文字から候補の名前を引く。シートの読み書きは data_access、ここでは名簿の解釈と検索だけを行う。
+"""
+import threading
+import unicodedata
+from collections import Counter
+
+MEMBERS_SHEET = "members"
+MEMBER_COLUMNS = ["name", "aliases"]
+# カタカナ → ひらがな（ァ〜ヶ。ヴ・ヵ・ヶ は対応するひらがなへ）
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def normalize_name(name):
+    """検索用に表記を揃える（NFKC・小文字化・カタカナをひらがなに・前後の空白を除く）"""
+    return unicodedata.normalize("NFKC", str(name)).casefold().translate(_KATAKANA_TO_HIRAGANA).strip()
+
+def parse_member_rows(rows):
+    """
+    members シートの行（ヘッダーを除く）を名簿にする
+
+    Returns:
+        list[tuple]: (名前, 別名のリスト)。名前が空の行は除く
+    """
+    members = []
+    for row in rows:
+        name = str(row[0]).strip() if row else ""
+        if not name:
+            continue
+        aliases = [a.strip() for a in str(row[1]).split(";") if a.strip()] if len(row) > 1 else []
+        members.append((name, aliases))
+    return members
+
+def names_from_history(df):
+    """
+    予約データの参加者・保留・欠席に出てくる名前（名簿が無いときの初期値。多く出てくる順）
+
+    Returns:
+        list[str]
+    """
+    counts = Counter()
+    for col in ["participants", "consider", "absent"]:
+        if col not in df.columns:
+            continue
+        for names in df[col]:
+            if isinstance(names, list):
+                counts.update(n.strip() for n in names if n and n.strip())
+            elif isinstance(names, str) and names.strip():
+                counts.update(n.strip() for n in names.split(";") if n.strip())
+    return [name for name, _ in counts.most_common()]
+
+
+class _Node:
+    __slots__ = ("children", "names")
+
+    def __init__(self):
+        self.children = {}
+        # この接頭辞で始まる名前・別名を持つメンバーの名前
+        self.names = set()
+
+
+class MemberIndex:
+    """
+    名前・別名の前方一致インデックス（トライ）
+
+    名簿はプロセス内の全セッションで共有し、新しい名前は add() でその場に追加する
+    （追加と検索はロックで排他する）。
+
+    Args:
+        members: (名前, 別名のリスト) のリスト
+    """
+    def __init__(self, members=()):
+        self._root = _Node()
+        self._members = {}   # 名前 → 別名のリスト（登録順）
+        self._canonical = {}  # 表記を揃えた名前・別名 → 名前
+        self._lock = threading.Lock()
+        for name, aliases in members:
+            self._add(name, aliases)
+
+    def __len__(self):
+        return len(self._members)
+
+    def __eq__(self, other):
+        return isinstance(other, MemberIndex) and self.members() == other.members()
+
+    def _add(self, name, aliases):
+        if name in self._members:
+            new_aliases = [a for a in aliases if a not in self._members[name]]
+            self._members[name].extend(new_aliases)
+        else:
+            self._members[name] = list(aliases)
+            new_aliases = [name] + list(aliases)
+        for key in map(normalize_name, new_aliases):
+            if not key:
+                continue
+            self._canonical.setdefault(key, name)
+            node = self._root
+            node.names.add(name)
+            for ch in key:
+                node = node.children.setdefault(ch, _Node())
+                node.names.add(name)
+
+    def add(self, name, aliases=()):
+        """
+        名前を追加する（登録済みの名前なら別名だけを追加する）
+
+        Returns:
+            bool: 新しい名前を追加したら True
+        """
+        with self._lock:
+            is_new = name not in self._members
+            self._add(name, aliases)
+            return is_new
+
+    def canonical(self, name):
+        """名前・別名（表記ゆれを含む）に当たるメンバーの名前（該当なしは None）"""
+        with self._lock:
+            return self._canonical.get(normalize_name(name))
+
+    def lookup(self, prefix="", limit=None):
+        """
+        名前・別名が prefix で始まるメンバーの名前（表記を揃えた名前の順）
+
+        Args:
+            prefix: 入力した先頭の文字（空なら全員）
+            limit: 返す件数の上限
+
+        Returns:
+            list[str]
+        """
+        with self._lock:
+            node = self._root
+            for ch in normalize_name(prefix):
+                node = node.children.get(ch)
+                if node is None:
+                    return []
+            names = sorted(node.names, key=lambda n: (normalize_name(n), n))
+        return names[:limit] if limit is not None else names
+
+    def members(self):
+        """名簿（(名前, 別名のリスト) のリスト。登録順）"""
+        with self._lock:
+            return [(name, list(aliases)) for name, aliases in self._members.items()]
@@ -0,0 +1,406 @@
+"""メンバーごとの参加実績テーブル（月別・コート種別の集計）
+
+予約データから「メンバー × 年月 × コート種類」の集計表を作り、サーバープロセス内で保持する。
+  * 先月より前の月は member_stats シートに保存した集計（アーカイブ）を使う。月ごとに予約のチェックサムも保存し、
+    取り込み・一括変更・履歴からの復元などでその月の予約が変わったときだけ、その月を計算し直す
+  * 先月以降の月は予約データから計算し、参加表明の保存時は変更した予約の分だけ差し替える
+  * 保留→参加 の切り替えは予約データに残らないため、切り替えのたびに member_stats シートへ1行追記する
+"""
+import logging
+import threading
+import streamlit as st
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import perf
+import change_feed
+from app_common import run_with_retry, jst_today
+from data_access import load_reservations, reservations_generation, get_or_create_worksheet, replace_sheet
+
+logger = logging.getLogger(__name__)
+
+STATS_SHEET = "member_stats"
+# 集計のキー
+KEY_COLUMNS = ["member", "year_month", "court_type"]
+# 集計値
+#   attended: 参加した回数（完了した予約の参加者）
+#   hours: 参加した時間
+#   signed_up: 参加表明の回数（中止を除く）
+#   considered: 保留のままの回数（中止を除く）
+#   converted: 保留→参加 に切り替えた回数
+#   no_shows: 欠席の回数（完了した予約の absent）
+COUNT_COLUMNS = ["attended", "hours", "signed_up", "considered", "converted", "no_shows"]
+STATS_COLUMNS = KEY_COLUMNS + COUNT_COLUMNS
+# member_stats シートの行の種類（archive: 締めた月の集計 / conversion: 保留→参加 1回分 /
+# month: アーカイブした月の予約のチェックサム（year_month と checksum だけを使う））
+SHEET_COLUMNS = ["kind"] + STATS_COLUMNS + ["checksum"]
+# チェックサムに使う予約の列（集計に使う列）
+CHECKSUM_INT_COLUMNS = ["start_hour", "start_minute", "end_hour", "end_minute"]
+CHECKSUM_TEXT_COLUMNS = ["court_type", "status"]
+CHECKSUM_LIST_COLUMNS = ["participants", "consider", "absent"]
+
+
+# ==========================================
+# 1. 集計
+# ==========================================
+def empty_stats():
+    table = pd.DataFrame(columns=STATS_COLUMNS)
+    return table.astype({c: ("float64" if c == "hours" else "int64") for c in COUNT_COLUMNS})
+
+def aggregate_stats(frames):
+    """
+    集計表を足し合わせる（同じキーの行は合計し、すべて0の行は除く）
+
+    Args:
+        frames: 集計表のリスト（None は無視する）
+
+    Returns:
+        DataFrame: STATS_COLUMNS
+    """
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return empty_stats()
+    table = pd.concat(frames, ignore_index=True).groupby(KEY_COLUMNS, as_index=False)[COUNT_COLUMNS].sum()
+    table["hours"] = table["hours"].round(2)
+    return table[(table[COUNT_COLUMNS] != 0).any(axis=1)].reset_index(drop=True)
+
+def reservation_contributions(df):
+    """
+    予約データからメンバーごとの集計表を作る（参加者・保留・欠席の各リストを展開して一括集計）
+
+    Args:
+        df: 予約データ（一部の行だけでもよい）
+
+    Returns:
+        DataFrame: STATS_COLUMNS
+    """
+    df = df[df["date"].notna()]
+    if df.empty:
+        return empty_stats()
+
+    def minutes(hour_col, minute_col):
+        return pd.to_numeric(df[hour_col], errors="coerce").fillna(0) * 60 + pd.to_numeric(df[minute_col], errors="coerce").fillna(0)
+
+    base = pd.DataFrame({
+        "year_month": pd.to_datetime(df["date"]).dt.strftime("%Y/%m"),
+        "court_type": df["court_type"].replace("", "不明").fillna("不明"),
+        "status": df["status"],
+        "hours": (minutes("end_hour", "end_minute") - minutes("start_hour", "start_minute")).clip(lower=0) / 60,
+    }, index=df.index)
+
+    records = []
+    for col in ("participants", "consider", "absent"):
+        names = df[col].explode()
+        names = names[names.notna() & (names.astype(str).str.strip() != "")]
+        records.append(base.loc[names.index].assign(member=names.astype(str).to_numpy(), role=col))
+    rec = pd.concat(records, ignore_index=True)
+    if rec.empty:
+        return empty_stats()
+
+    done = (rec["status"] == "完了").to_numpy()
+    active = (rec["status"] != "中止").to_numpy()
+    joined = (rec["role"] == "participants").to_numpy()
+    table = pd.DataFrame({
+        "member": rec["member"],
+        "year_month": rec["year_month"],
+        "court_type": rec["court_type"],
+        "attended": (joined & done).astype(int),
+        "hours": np.where(joined & done, rec["hours"], 0.0),
+        "signed_up": (joined & active).astype(int),
+        "considered": ((rec["role"] == "consider").to_numpy() & active).astype(int),
+        "converted": 0,
+        "no_shows": ((rec["role"] == "absent").to_numpy() & done).astype(int),
+    })
+    return aggregate_stats([table])
+
+def apply_reservation_change(table, old_rows, new_rows):
+    """
+    予約の変更分だけ集計表を更新する（変更前の分を引いて、変更後の分を足す）
+
+    Args:
+        table: 集計表
+        old_rows: 変更前の予約（DataFrame）
+        new_rows: 変更後の予約（DataFrame）
+
+    Returns:
+        DataFrame: 更新後の集計表
+    """
+    removed = reservation_contributions(old_rows)
+    removed[COUNT_COLUMNS] = -removed[COUNT_COLUMNS]
+    return aggregate_stats([table, removed, reservation_contributions(new_rows)])
+
+def month_checksums(df):
+    """
+    年月ごとの予約のチェックサム（集計に使う列だけから作る。行の並びには依存しない）
+
+    Args:
+        df: 予約データ（日付が空の行は除く）
+
+    Returns:
+        dict: "YYYY/MM" → チェックサム（文字列）
+    """
+    df = df[df["date"].notna()]
+    if df.empty:
+        return {}
+    days = df["date"].astype(pd.ArrowDtype(pa.int32())).to_numpy(dtype=np.int64)
+    frame = pd.DataFrame({"date": days})
+    for col in CHECKSUM_INT_COLUMNS:
+        frame[col] = pd.to_numeric(df[col], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    for col in CHECKSUM_TEXT_COLUMNS:
+        frame[col] = df[col].fillna("").to_numpy(dtype=object)
+    for col in CHECKSUM_LIST_COLUMNS:
+        frame[col] = [";".join(v) if isinstance(v, list) else "" for v in df[col].tolist()]
+    hashes = pd.Series(pd.util.hash_pandas_object(frame, index=False).to_numpy())
+    months = pd.DatetimeIndex(days.astype("datetime64[D]")).strftime("%Y/%m")
+    # 行ごとのハッシュの和（2^64 で折り返す）なので、行の並びが変わっても同じ値になる
+    return {month: str(total) for month, total in hashes.groupby(months).sum().items()}
+
+def live_cutoff(today):
+    """予約データから計算し直す最初の月（先月の1日）。これより前の月はアーカイブを使う"""
+    return (pd.Period(today, freq="M") - 1).start_time.date()
+
+
+# ==========================================
+# 2. 集計表の保持・アーカイブ
+# ==========================================
+@st.cache_resource(show_spinner=False)
+def _stats_store():
+    """
+    サーバープロセス内で共有する集計表
+
+    archive: シートに保存した締めた月の集計 / conversions: シートに追記した 保留→参加
+    checksums: アーカイブした月の予約のチェックサム（checked はアーカイブと照合した予約シートの世代）
+    live: 先月以降の予約から計算した集計（generation は計算に使った予約データの世代）
+    table: 上の3つを足し合わせたもの
+    """
+    return {
+        "lock": threading.Lock(),
+        "archive": None, "conversions": None, "checksums": None, "cutoff": None, "checked": None,
+        "live": None, "generation": None, "table": None,
+    }
+
+def _read_stats_sheet():
+    """
+    member_stats シートを読み込む
+
+    Returns:
+        tuple: (archive, conversions) の集計表と、月ごとのチェックサム（dict）。読めない場合は None
+    """
+    try:
+        values = run_with_retry(get_or_create_worksheet(STATS_SHEET, cols=len(SHEET_COLUMNS)).get_all_values)
+    except Exception as e:
+        logger.warning("member stats sheet unavailable: %s", e)
+        return None
+    if not values:
+        # 追記できるよう先にヘッダー行を書いておく
+        try:
+            run_with_retry(get_or_create_worksheet(STATS_SHEET).update, [SHEET_COLUMNS])
+        except Exception as e:
+            logger.warning("member stats header write failed: %s", e)
+            return None
+    if len(values) < 2:
+        return empty_stats(), empty_stats(), {}
+    sheet = pd.DataFrame(values[1:], columns=values[0]).reindex(columns=SHEET_COLUMNS, fill_value="")
+    kinds = sheet.pop("kind")
+    months = sheet[kinds == "month"]
+    checksums = dict(zip(months["year_month"], months["checksum"]))
+    for col in COUNT_COLUMNS:
+        sheet[col] = pd.to_numeric(sheet[col], errors="coerce").fillna(0)
+    sheet = sheet[STATS_COLUMNS]
+    return aggregate_stats([sheet[kinds == "archive"]]), aggregate_stats([sheet[kinds == "conversion"]]), checksums
+
+def _stats_rows(kind, table):
+    return [[kind] + [v if isinstance(v, str) else f"{v:g}" for v in row] + [""] for row in table[STATS_COLUMNS].itertuples(index=False)]
+
+def _checksum_rows(checksums):
+    return [["month", "", month, ""] + [""] * len(COUNT_COLUMNS) + [checksum] for month, checksum in sorted(checksums.items())]
+
+def _archive_closed_months(store, df_res, cutoff):
+    """
+    cutoff より前の月のアーカイブを予約データに合わせ、変わっていれば member_stats シートを書き換える
+
+    まだアーカイブしていない月と、保存したチェックサムと予約が合わない月（取り込み・一括変更・復元などで
+    締めた後に予約が変わった月）を予約データから集計し直す。集計し直す月の 保留→参加 の回数は
+    予約データに残らないため、アーカイブの値を引き継ぐ。その月の 保留→参加 の行はアーカイブの行にまとめる。
+    """
+    cutoff_ym = cutoff.strftime("%Y/%m")
+    closed = df_res[df_res["date"].notna() & (df_res["date"] < cutoff)]
+    with perf.span("member_stats.checksum"):
+        checksums = month_checksums(closed)
+    archive = store["archive"]
+    stale = {m for m in set(checksums) | set(store["checksums"]) if store["checksums"].get(m) != checksums.get(m)}
+    stale |= set(archive["year_month"]) - set(checksums)
+    conversions = store["conversions"]
+    closing = conversions[conversions["year_month"] < cutoff_ym]
+    if not stale and closing.empty:
+        return
+
+    redo = archive["year_month"].isin(stale)
+    kept_conversions = archive[redo].assign(**{c: 0 for c in COUNT_COLUMNS if c != "converted"})
+    recomputed = reservation_contributions(closed[pd.to_datetime(closed["date"]).dt.strftime("%Y/%m").isin(stale)])
+    archive = aggregate_stats([archive[~redo], kept_conversions, recomputed, closing])
+    remaining = conversions[conversions["year_month"] >= cutoff_ym]
+    values = (
+        [SHEET_COLUMNS] + _stats_rows("archive", archive) + _stats_rows("conversion", remaining)
+        + _checksum_rows(checksums)
+    )
+    get_or_create_worksheet(STATS_SHEET, cols=len(SHEET_COLUMNS))
+    # 丸ごとの書き換えはジャーナルに記録し、途中で失敗してもバックグラウンドで書き直す
+    replace_sheet(STATS_SHEET, values)
+    store["archive"], store["conversions"], store["checksums"] = archive, remaining, checksums
+
+def load_member_stats():
+    """
+    メンバーごとの集計表（月別・コート種別）
+
+    予約データの世代が変わっていなければ、保持している集計表をそのまま返す。
+
+    Returns:
+        DataFrame: STATS_COLUMNS
+    """
+    store = _stats_store()
+    df_res = load_reservations()
+    generation = reservations_generation()
+    with store["lock"]:
+        cutoff = live_cutoff(jst_today())
+        if store["archive"] is None:
+            sheet = _read_stats_sheet()
+            if sheet is None:
+                # シートが読めないときはアーカイブを使わず全期間を計算する（書き込みもしない）
+                return reservation_contributions(df_res)
+            store["archive"], store["conversions"], store["checksums"] = sheet
+        # 月が替わったとき・予約シートを取り直したときに、アーカイブが予約データと合っているかを確かめる
+        # （参加表明ログの追記だけでは取り直さない。過去の予約への参加表明は record_participation() が確認させる）
+        if store["cutoff"] != cutoff or store["checked"] != generation[:2]:
+            with perf.span("member_stats.archive"):
+                try:
+                    _archive_closed_months(store, df_res, cutoff)
+                except Exception as e:
+                    logger.warning("member stats archive failed: %s", e)
+                    return reservation_contributions(df_res)
+            if store["cutoff"] != cutoff:
+                store["cutoff"], store["live"] = cutoff, None
+            store["checked"], store["table"] = generation[:2], None
+        if store["live"] is None or store["generation"] != generation:
+            with perf.span("member_stats.live"):
+                store["live"] = reservation_contributions(df_res[df_res["date"].notna() & (df_res["date"] >= cutoff)])
+            store["generation"] = generation
+            store["table"] = None
+        if store["table"] is None:
+            store["table"] = aggregate_stats([store["archive"], store["conversions"], store["live"]])
+        return store["table"]
+
+def record_participation(old_rows, new_rows, member, generation, feed_revision):
+    """
+    参加表明の保存後に集計表を更新する
+
+    保存前の集計表が最新で、かつ保存までに他の変更が無かった場合だけ変更分を差し替える
+    （それ以外は次に load_member_stats() を呼んだときに計算し直す）。
+    保留→参加 の切り替えは member_stats シートに追記する。
+
+    Args:
+        old_rows: 変更前の予約（DataFrame。まとめての参加表明では複数行）
+        new_rows: 変更後の予約（DataFrame。old_rows と同じ行）
+        member: 参加表明した名前
+        generation: 保存前の reservations_generation()
+        feed_revision: 保存前の change_feed.current_revision()
+    """
+    store = _stats_store()
+    converted = [
+        isinstance(old_consider, list) and member in old_consider and member in new_participants
+        for old_consider, new_participants in zip(old_rows["consider"], new_rows["participants"])
+    ]
+    with store["lock"]:
+        cutoff = store["cutoff"]
+        if (
+            store["live"] is not None and store["generation"] == generation
+            and change_feed.current_revision() == feed_revision + 1
+            and len(old_rows) > 0 and old_rows["date"].min() >= cutoff
+        ):
+            store["live"] = apply_reservation_change(store["live"], old_rows, new_rows)
+            store["generation"] = reservations_generation()
+            store["table"] = None
+        elif cutoff is not None and len(old_rows) > 0 and old_rows["date"].min() < cutoff:
+            # アーカイブした月の予約が変わったので、次の読み込みでアーカイブを確かめ直す
+            store["checked"] = None
+        if any(converted) and store["conversions"] is not None:
+            row = pd.DataFrame([{
+                "member": member,
+                "year_month": pd.Timestamp(day).strftime("%Y/%m"),
+                "court_type": court_type or "不明",
+                "attended": 0, "hours": 0.0, "signed_up": 0, "considered": 0, "converted": 1, "no_shows": 0,
+            } for day, court_type in zip(new_rows["date"][converted], new_rows["court_type"][converted])])
+            try:
+                worksheet = get_or_create_worksheet(STATS_SHEET, cols=len(SHEET_COLUMNS))
+                run_with_retry(worksheet.append_rows, _stats_rows("conversion", row))
+            except Exception as e:
+                logger.warning("member stats conversion write failed: %s", e)
+                return
+            store["conversions"] = aggregate_stats([store["conversions"], row])
+            store["table"] = None
+
+
+# ==========================================
+# 3. ランキング・メンバー別
+# ==========================================
+def member_streaks(table, today):
+    """
+    連続して参加した月数
+
+    Returns:
+        DataFrame: member, current_streak（今月または先月まで続いている月数）, longest_streak
+    """
+    attended = table[table["attended"] > 0]
+    if attended.empty:
+        return pd.DataFrame(columns=["member", "current_streak", "longest_streak"])
+    months = attended[["member", "year_month"]].drop_duplicates()
+    period = pd.PeriodIndex(months["year_month"].str.replace("/", "-"), freq="M")
+    months = months.assign(month_no=period.year * 12 + period.month).sort_values(["member", "month_no"])
+    # 前の月と連続していなければ新しい連続の始まり
+    gap = months.groupby("member")["month_no"].diff() != 1
+    months["run"] = gap.cumsum()
+    runs = months.groupby(["member", "run"]).agg(length=("month_no", "size"), last=("month_no", "max")).reset_index()
+    this_month = today.year * 12 + today.month
+    latest = runs.sort_values("last").groupby("member").tail(1)
+    current = latest.assign(current_streak=np.where(latest["last"] >= this_month - 1, latest["length"], 0))
+    longest = runs.groupby("member", as_index=False)["length"].max().rename(columns={"length": "longest_streak"})
+    return longest.merge(current[["member", "current_streak"]], on="member")[["member", "current_streak", "longest_streak"]]
+
+def member_leaderboard(table, today, start_ym=None, end_ym=None):
+    """
+    メンバー別の参加ランキング（参加回数の多い順）
+
+    Args:
+        start_ym, end_ym: 集計する年月（"YYYY/MM"、省略時は全期間）
+
+    Returns:
+        DataFrame: member, attended, hours, signed_up, considered, converted, no_shows,
+                   conversion_rate（保留→参加 の割合）, current_streak, longest_streak
+    """
+    if start_ym:
+        table = table[table["year_month"] >= start_ym]
+    if end_ym:
+        table = table[table["year_month"] <= end_ym]
+    totals = table.groupby("member", as_index=False)[COUNT_COLUMNS].sum()
+    decided = totals["converted"] + totals["considered"]
+    totals["conversion_rate"] = (totals["converted"] / decided.where(decided > 0)).round(2)
+    totals = totals.merge(member_streaks(table, today), on="member", how="left")
+    totals[["current_streak", "longest_streak"]] = totals[["current_streak", "longest_streak"]].fillna(0).astype(int)
+    return totals.sort_values(["attended", "hours"], ascending=False, kind="stable").reset_index(drop=True)
+
+def member_monthly(table, member, start_ym=None, end_ym=None):
+    """
+    1人分の月別・コート種別の参加回数／時間（summarize_practice() と同じ列）
+
+    Returns:
+        DataFrame: year_month, court_type, events_count, total_hours
+    """
+    rows = table[(table["member"] == member) & (table["attended"] > 0)]
+    if start_ym:
+        rows = rows[rows["year_month"] >= start_ym]
+    if end_ym:
+        rows = rows[rows["year_month"] <= end_ym]
+    return rows.rename(columns={"attended": "events_count", "hours": "total_hours"})[
+        ["year_month", "court_type", "events_count", "total_hours"]
+    ].sort_values("year_month").reset_index(drop=True)
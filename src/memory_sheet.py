@@ -0,0 +1,159 @@
+"""Google Sheets のメモリ上の代替（ベンチマーク・負荷試験用）
+
+gspread の Worksheet / Spreadsheet のうち、アプリが使うメソッドだけを同じ呼び出し方で実装する。
+API呼び出し回数は calls に記録する。
+"""
+import re
+import threading
+from collections import Counter
+
+from gspread.exceptions import WorksheetNotFound
+
+
+def _numericise(value):
+    """get_all_records() と同様に、数値に見える文字列を int / float に変換する"""
+    if value == "" or not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+def _col_to_index(letters):
+    """"A" → 1, "AB" → 28"""
+    col = 0
+    for ch in letters:
+        col = col * 26 + (ord(ch) - ord("A") + 1)
+    return col
+
+def _cell_to_rowcol(cell):
+    """"B3" → (3, 2)（1始まり）"""
+    m = re.fullmatch(r"([A-Z]+)(\d+)", cell)
+    if not m:
+        raise ValueError(f"invalid cell: {cell}")
+    return int(m.group(2)), _col_to_index(m.group(1))
+
+def _parse_range(range_name):
+    """"A5:D" / "A1:D1" / "1:1" → (開始行, 開始列, 終了行, 終了列)（1始まり。省略された端はNone）"""
+    bounds = []
+    for part in range_name.split(":"):
+        m = re.fullmatch(r"([A-Z]*)(\d*)", part)
+        if not m or not part:
+            raise ValueError(f"invalid range: {range_name}")
+        bounds.append((int(m.group(2)) if m.group(2) else None, _col_to_index(m.group(1)) if m.group(1) else None))
+    (start_row, start_col), (end_row, end_col) = bounds[0], bounds[-1]
+    return start_row or 1, start_col or 1, end_row, end_col
+
+
+class MemoryWorksheet:
+    def __init__(self, title, values=None, calls=None, lock=None):
+        self.title = title
+        self._values = [[str(v) for v in row] for row in (values or [])]
+        self.calls = calls if calls is not None else Counter()
+        self._lock = lock or threading.Lock()
+
+    @property
+    def row_count(self):
+        return len(self._values)
+
+    def get_all_values(self):
+        self.calls["get_all_values"] += 1
+        with self._lock:
+            return [list(row) for row in self._values]
+
+    def get_all_records(self):
+        self.calls["get_all_records"] += 1
+        with self._lock:
+            if not self._values:
+                return []
+            header = self._values[0]
+            records = []
+            for row in self._values[1:]:
+                padded = row + [""] * (len(header) - len(row))
+                records.append({h: _numericise(v) for h, v in zip(header, padded)})
+            return records
+
+    def get(self, range_name):
+        """範囲の値（gspread と同様に、末尾の空セル・空行は返さない）"""
+        self.calls["get"] += 1
+        start_row, start_col, end_row, end_col = _parse_range(range_name)
+        with self._lock:
+            rows = self._values[start_row - 1:end_row]
+            values = [row[start_col - 1:end_col] for row in rows]
+        for row in values:
+            while row and row[-1] == "":
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def clear(self):
+        self.calls["clear"] += 1
+        with self._lock:
+            self._values = []
+
+    def update(self, values, range_name=None, **kwargs):
+        """range_name の左上セル（省略時A1）から values を書き込む"""
+        self.calls["update"] += 1
+        with self._lock:
+            self._write(values, range_name or "A1")
+
+    def batch_update(self, data, **kwargs):
+        """[{"range": "A2", "values": [[...]]}, ...] をまとめて書き込む（API呼び出し1回）"""
+        self.calls["batch_update"] += 1
+        with self._lock:
+            for item in data:
+                self._write(item["values"], item["range"])
+
+    def append_rows(self, values, **kwargs):
+        self.calls["append_rows"] += 1
+        with self._lock:
+            first = len(self._values) + 1
+            for row in values:
+                self._values.append([str(v) for v in row])
+            return {"updates": {"updatedRange": f"{self.title}!A{first}:A{len(self._values)}"}}
+
+    def _write(self, values, range_name):
+        start_row, start_col = _cell_to_rowcol(range_name.split(":")[0])
+        for r_off, row in enumerate(values):
+            r = start_row - 1 + r_off
+            while len(self._values) <= r:
+                self._values.append([])
+            target = self._values[r]
+            for c_off, v in enumerate(row):
+                c = start_col - 1 + c_off
+                while len(target) <= c:
+                    target.append("")
+                target[c] = "" if v is None else str(v)
+
+
+class MemorySpreadsheet:
+    """
+    シート名 → MemoryWorksheet の集合
+
+    Args:
+        sheets: {シート名: 2次元リスト（1行目がヘッダー）}
+    """
+    def __init__(self, sheets=None):
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._sheets = {}
+        for name, values in (sheets or {}).items():
+            self._sheets[name] = MemoryWorksheet(name, values, self.calls, self._lock)
+
+    def worksheet(self, name):
+        if name not in self._sheets:
+            raise WorksheetNotFound(name)
+        return self._sheets[name]
+
+    def worksheets(self):
+        return list(self._sheets.values())
+
+    def add_worksheet(self, title, rows=100, cols=26, **kwargs):
+        self.calls["add_worksheet"] += 1
+        ws = MemoryWorksheet(title, [], self.calls, self._lock)
+        self._sheets[title] = ws
+        return ws
@@ -0,0 +1,198 @@
+"""参加表明ログ（participations シート）と参加者リストの組み立て
+
+参加表明は予約の行を書き換えず、participations シートに1件1行で追記する
+（reservation_id, nickname, status, timestamp, capacity）。reservation_id は予約シートの id 列（予約ID）、
+capacity は追記したときの予約の定員（定員なし・列が無かったころの行は空欄）。
+予約データの participants / consider / absent / waitlist は、予約シートの値にログを古い順に適用したもの。
+キャンセル待ち（waitlist）の並びは、ログに追記した順（申し込んだ順）になる。
+「参加」は、追記したときの定員に達していればキャンセル待ちにする
+（別々のサーバーで同時に最後の席へ参加表明しても、先に追記された方だけが参加になる）。
+後から定員を変えても、それより前の参加表明は判定し直さない。
+シートの読み書きは data_access、ここではログの解釈だけを行う。
+"""
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+PARTICIPATIONS_SHEET = "participations"
+LOG_COLUMNS = ["reservation_id", "nickname", "status", "timestamp", "capacity"]
+# ログの status → 参加者リストの列（"削除" はどの列にも入れない）
+STATUS_COLUMNS = {"参加": "participants", "保留": "consider", "欠席": "absent", "キャンセル待ち": "waitlist"}
+REMOVED = "削除"
+WAITLISTED = "キャンセル待ち"
+ROSTER_COLUMNS = ["participants", "consider", "absent", "waitlist"]
+# 0時からの分 → "HH:MM"（予約IDの時刻部分）
+_HHMM = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)], dtype=object)
+
+
+# ==========================================
+# 1. 予約ID
+# ==========================================
+def new_reservation_id():
+    """新しく登録・取り込みする予約の予約ID（id 列に保存する）"""
+    return uuid.uuid4().hex
+
+def reservation_id(day, start_hour, start_minute, facility):
+    """
+    日付・開始時刻・施設名から作る予約ID（id 列が無かったころの予約ID。一括インポートの重複判定と同じ組み合わせ）
+
+    Returns:
+        str: 例 "2025-04-01 09:00 大蔵運動場"
+    """
+    return f"{day:%Y-%m-%d} {int(start_hour or 0):02d}:{int(start_minute or 0):02d} {facility}"
+
+def slot_ids(df):
+    """
+    各行の日付・開始時刻・施設名から作る予約ID（日付が不正な行は空文字）
+
+    Returns:
+        Series: index は df と同じ
+    """
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    if isinstance(df["date"].dtype, pd.ArrowDtype):
+        # date32[pyarrow] は Arrow のまま文字列にする（YYYY-MM-DD）
+        days = df["date"].astype(pd.ArrowDtype(pa.string())).astype(object)
+    else:
+        days = pd.to_datetime(df["date"], errors="coerce").dt.strftime("%Y-%m-%d")
+    minutes = (df["start_hour"].fillna(0).astype(int) * 60 + df["start_minute"].fillna(0).astype(int)).clip(0, 24 * 60 - 1)
+    times = pd.Series(_HHMM[minutes.to_numpy()], index=df.index)
+    ids = days + " " + times + " " + df["facility"].astype(str).astype(object)
+    return ids.where(days.notna(), "").astype(object)
+
+def fill_reservation_ids(df):
+    """
+    id 列の空欄を埋めた予約ID
+
+    空欄の行（id 列が無かったころの予約）は slot_ids() の値を使う（それまでのログ・変更履歴と同じID）。
+    同じ予約IDの行が複数あれば、2件目から "#2" などを付けて区別する（同じ日時・施設の予約が複数ある場合など）。
+
+    Returns:
+        Series: index は df と同じ（日付が不正で id も無い行は空文字）
+    """
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    ids = df["id"].fillna("").astype(str).astype(object) if "id" in df.columns else pd.Series("", index=df.index, dtype=object)
+    ids = ids.where(ids != "", slot_ids(df))
+    counts = ids.groupby(ids).cumcount()
+    duplicate = (counts > 0) & (ids != "")
+    return ids.where(~duplicate, ids + "#" + (counts + 1).astype(str))
+
+def reservation_ids(df):
+    """
+    予約データの各行の予約ID（id 列。読み込み時に fill_reservation_ids() で埋めてある）
+
+    Returns:
+        Series: index は df と同じ
+    """
+    if "id" in df.columns:
+        return df["id"].astype(object)
+    return fill_reservation_ids(df)
+
+
+# ==========================================
+# 2. ログの適用
+# ==========================================
+def parse_log_rows(rows):
+    """
+    participations シートの行（ヘッダーを除く）をログのエントリにする
+
+    Returns:
+        list[tuple]: (reservation_id, nickname, status, timestamp, capacity)。
+                     capacity は追記したときの定員（int。空欄なら None）。列が足りない・status が不明な行は除く
+    """
+    entries = []
+    for row in rows:
+        if len(row) < 3:
+            continue
+        rid, nick, status = str(row[0]), str(row[1]).strip(), str(row[2])
+        if not rid or not nick or (status not in STATUS_COLUMNS and status != REMOVED):
+            continue
+        entries.append((rid, nick, status, str(row[3]) if len(row) > 3 else "", _parse_capacity(row[4] if len(row) > 4 else "")))
+    return entries
+
+def _parse_capacity(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def encode_capacity(capacity):
+    """ログの capacity 列に書く値（定員なしは空欄）"""
+    return "" if capacity is None or pd.isna(capacity) else str(int(capacity))
+
+def apply_entries(rosters, entries):
+    """
+    ログのエントリを予約ごとの参加状況に反映する
+
+    Args:
+        rosters: 予約ID → [(名前, status, 定員)]（その場で更新する。ログの順）
+        entries: parse_log_rows() の結果（古い順）
+
+    Returns:
+        set: 参加状況が変わった予約ID
+    """
+    touched = set()
+    for rid, nick, status, _, capacity in entries:
+        rosters.setdefault(rid, []).append((nick, status, capacity))
+        touched.add(rid)
+    return touched
+
+def merge_roster(base, roster):
+    """
+    予約シートの参加者リストにログの参加状況を重ねる
+
+    ログに出てくる名前を一度すべての列から外し、ログの順に表明をたどって、そのつど該当の列の末尾に入れ直す
+    （画面から参加表明したときと同じ並び）。ログ適用済みの値で保存した予約に再度適用しても結果は変わらない。
+    「参加」は、その時点で参加者がその行を追記したときの定員に達していればキャンセル待ちの末尾に入れる
+    （席を空けた表明の後の繰り上げは席に入る。定員を記録していない行は制限しない）。
+
+    Args:
+        base: {"participants": list, "consider": list, "absent": list, "waitlist": list}
+        roster: [(名前, status, 定員)]（ログの順。定員は追記したときの値で、None なら制限しない）
+
+    Returns:
+        dict: base と同じ形（新しいリスト）
+    """
+    names = {nick for nick, _, _ in roster}
+    lists = {col: [n for n in (base.get(col) or []) if n not in names] for col in ROSTER_COLUMNS}
+    placed = {}
+    for nick, status, capacity in roster:
+        if nick in placed:
+            lists[placed.pop(nick)].remove(nick)
+        if status not in STATUS_COLUMNS:
+            continue
+        col = STATUS_COLUMNS[status]
+        if col == "participants" and capacity is not None and len(lists["participants"]) >= capacity:
+            col = "waitlist"
+        lists[col].append(nick)
+        placed[nick] = col
+    return lists
+
+def apply_rosters(df, ids, rosters, only=None):
+    """
+    予約データの参加者リストをログの参加状況で置き換えた DataFrame
+
+    Args:
+        df: 予約データ（変更しない）
+        ids: reservation_ids(df)
+        rosters: 予約ID → [(名前, status, 定員)]（apply_entries()）
+        only: 置き換える予約IDの集合（省略時はログのある予約すべて）
+
+    Returns:
+        DataFrame: 置き換えた行の参加者リスト列だけを複製した浅いコピー
+    """
+    targets = set(rosters) if only is None else set(only) & set(rosters)
+    rows = ids.index[ids.isin(targets)] if targets else ids.index[:0]
+    df = df.copy(deep=False)
+    if len(rows) == 0:
+        return df
+    columns = {col: df[col].copy() for col in ROSTER_COLUMNS}
+    for row, rid in zip(rows, ids.loc[rows]):
+        base = {col: columns[col].at[row] if isinstance(columns[col].at[row], list) else [] for col in ROSTER_COLUMNS}
+        for col, values in merge_roster(base, rosters[rid]).items():
+            columns[col].at[row] = values
+    for col, values in columns.items():
+        df[col] = values
+    return df
@@ -0,0 +1,209 @@
+"""再実行ごとの処理時間計測（スパン計測・キャッシュヒット率・JSONLログ出力）"""
+import os
+import json
+import atexit
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+
+PERF_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "perf", "perf_log.jsonl")
+# ログファイルがこのサイズを超えたら .1 にローテーションする
+PERF_LOG_MAX_BYTES = 5 * 1024 * 1024
+# ログはメモリに溜めておき、書き込みスレッドがこの間隔（秒）でまとめてファイルに追記する
+PERF_LOG_FLUSH_SEC = 2.0
+# 溜まった件数がこれを超えたら、間隔を待たずに書き込む
+PERF_LOG_FLUSH_RECORDS = 200
+
+_local = threading.local()
+
+# プロセス全体（全セッション合計）のキャッシュヒット数
+_cache_totals = {}
+_cache_totals_lock = threading.Lock()
+
+# 書き込み待ちのログ（_log_lock で保護）。ファイルへの書き込み・ローテーションは _file_lock の中だけで行う
+_pending = []
+_log_lock = threading.Lock()
+_file_lock = threading.Lock()
+_flush_requested = threading.Event()
+_writer = None
+
+# end_run() の結果を受け取る関数（負荷試験などで、再実行ごとの結果をログファイルを介さずに集める）
+_listeners = []
+
+
+def _current_run():
+    return getattr(_local, "run", None)
+
+def begin_run():
+    """1回の再実行の計測を開始する（スクリプト先頭で呼ぶ）"""
+    _local.run = {
+        "started_at": time.perf_counter(),
+        "spans": [],
+        "cache": {},
+    }
+
+@contextmanager
+def span(name):
+    """
+    処理時間を計測する
+
+    begin_run() していないスレッド（バックグラウンド処理やベンチマーク）では何も記録しない。
+    """
+    run = _current_run()
+    if run is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run["spans"].append({
+            "name": name,
+            "offset_ms": round((start - run["started_at"]) * 1000, 2),
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+
+def cache_counter(name):
+    """
+    キャッシュ関数のヒット/ミスを数えるデコレータ（st.cache_data の場合はその外側に付ける）
+
+    キャッシュされる関数本体で mark_cache_miss() を呼ぶと、その呼び出しはミスとして数える。
+    """
+    def decorator(cached_func):
+        @functools.wraps(cached_func)
+        def wrapper(*args, **kwargs):
+            stack = getattr(_local, "cache_stack", None)
+            if stack is None:
+                stack = _local.cache_stack = []
+            stack.append({"name": name, "miss": False})
+            try:
+                with span(f"cache.{name}"):
+                    return cached_func(*args, **kwargs)
+            finally:
+                frame = stack.pop()
+                _count_cache(name, "miss" if frame["miss"] else "hit")
+        if hasattr(cached_func, "clear"):
+            wrapper.clear = cached_func.clear
+        return wrapper
+    return decorator
+
+def mark_cache_miss():
+    """キャッシュされる関数本体の中で呼ぶ（本体が実行された＝キャッシュミス）"""
+    stack = getattr(_local, "cache_stack", None)
+    if stack:
+        stack[-1]["miss"] = True
+
+def _count_cache(name, kind):
+    with _cache_totals_lock:
+        totals = _cache_totals.setdefault(name, {"hit": 0, "miss": 0})
+        totals[kind] += 1
+    run = _current_run()
+    if run is not None:
+        counts = run["cache"].setdefault(name, {"hit": 0, "miss": 0})
+        counts[kind] += 1
+
+def cache_totals():
+    """プロセス起動後のキャッシュヒット/ミス数（全セッション合計）"""
+    with _cache_totals_lock:
+        return {k: dict(v) for k, v in _cache_totals.items()}
+
+def end_run(**fields):
+    """
+    計測を終了し、結果をJSONLログに追記する
+
+    Args:
+        fields: ログに追加する項目（kind, view_mode など）
+
+    Returns:
+        dict: 今回の計測結果（計測していなければNone）
+    """
+    run = _current_run()
+    if run is None:
+        return None
+    _local.run = None
+    record = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "total_ms": round((time.perf_counter() - run["started_at"]) * 1000, 2),
+        **fields,
+        "spans": run["spans"],
+        "cache": run["cache"],
+    }
+    write_log(record)
+    for listener in list(_listeners):
+        listener(record)
+    return record
+
+def add_listener(func):
+    """
+    end_run() の結果を受け取る関数を登録する
+
+    Args:
+        func: 結果（dict）を引数に呼ばれる関数。スクリプトを実行したスレッドで呼ばれる
+    """
+    _listeners.append(func)
+
+def remove_listener(func):
+    if func in _listeners:
+        _listeners.remove(func)
+
+def write_log(record):
+    """
+    ログを書き込み待ちに追加する（再実行の中ではファイルに書かない）
+
+    ファイルへの追記は書き込みスレッド（_writer_loop()）が PERF_LOG_FLUSH_SEC ごとにまとめて行う。
+    """
+    global _writer
+    with _log_lock:
+        _pending.append(record)
+        full = len(_pending) >= PERF_LOG_FLUSH_RECORDS
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="perf-log-writer", daemon=True)
+            _writer.start()
+    if full:
+        _flush_requested.set()
+
+def _writer_loop():
+    while True:
+        _flush_requested.wait(PERF_LOG_FLUSH_SEC)
+        _flush_requested.clear()
+        flush_log()
+
+def flush_log():
+    """書き込み待ちのログをファイルに追記する（サイズを超えていれば先に .1 にローテーションする）"""
+    with _file_lock:
+        with _log_lock:
+            records = _pending[:]
+            _pending.clear()
+        if not records:
+            return
+        try:
+            os.makedirs(os.path.dirname(PERF_LOG_PATH), exist_ok=True)
+            if os.path.exists(PERF_LOG_PATH) and os.path.getsize(PERF_LOG_PATH) > PERF_LOG_MAX_BYTES:
+                os.replace(PERF_LOG_PATH, PERF_LOG_PATH + ".1")
+            with open(PERF_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        except OSError:
+            pass
+
+# 終了時に書き込み待ちのログを残す
+atexit.register(flush_log)
+
+def read_log_bytes():
+    """エクスポート用にJSONLログを読み込む（書き込み待ちの分を先に書き込む。無ければ空）"""
+    flush_log()
+    try:
+        with open(PERF_LOG_PATH, "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
+
+def summarize_spans(spans):
+    """同名スパンを合計した一覧（処理時間の大きい順）"""
+    summary = {}
+    for s in spans:
+        item = summary.setdefault(s["name"], {"name": s["name"], "count": 0, "total_ms": 0.0})
+        item["count"] += 1
+        item["total_ms"] = round(item["total_ms"] + s["ms"], 2)
+    return sorted(summary.values(), key=lambda x: x["total_ms"], reverse=True)
@@ -0,0 +1,51 @@
+"""繰り返し予約（毎週・隔週・毎月）の日付展開"""
+import pandas as pd
+from datetime import timedelta
+
+# 繰り返しの種類（登録画面の選択肢）
+RECURRENCE_OPTIONS = ["なし", "毎週", "隔週", "毎月（同じ日）", "毎月（同じ曜日）"]
+# 1回の登録で作成できる件数の上限
+MAX_OCCURRENCES = 60
+
+
+def expand_recurrence(first_date, until, rule, exceptions=()):
+    """
+    繰り返しの規則から予約日を列挙する
+
+    Args:
+        first_date: 初回の日付
+        until: 繰り返しの終了日（この日を含む）
+        rule: RECURRENCE_OPTIONS のいずれか
+        exceptions: 除外する日付
+
+    Returns:
+        list[date]: 予約日（昇順、最大 MAX_OCCURRENCES 件）
+    """
+    if rule == "なし" or until < first_date:
+        dates = [first_date]
+    elif rule in ("毎週", "隔週"):
+        step = timedelta(weeks=1 if rule == "毎週" else 2)
+        count = (until - first_date) // step + 1
+        dates = [first_date + step * i for i in range(min(count, MAX_OCCURRENCES))]
+    elif rule == "毎月（同じ日）":
+        dates = []
+        for month in pd.period_range(first_date, until, freq="M"):
+            # 31日などその月に無い日はスキップ
+            if first_date.day <= month.days_in_month:
+                dates.append(month.start_time.date().replace(day=first_date.day))
+    elif rule == "毎月（同じ曜日）":
+        # 「第N○曜日」を毎月同じにする（第5週が無い月はスキップ）
+        nth = (first_date.day - 1) // 7
+        weekday = first_date.weekday()
+        dates = []
+        for month in pd.period_range(first_date, until, freq="M"):
+            first_of_month = month.start_time.date()
+            day = 1 + (weekday - first_of_month.weekday()) % 7 + nth * 7
+            if day <= month.days_in_month:
+                dates.append(first_of_month.replace(day=day))
+    else:
+        raise ValueError(f"unknown recurrence rule: {rule}")
+
+    excluded = set(exceptions)
+    dates = [d for d in dates if first_date <= d <= max(until, first_date) and d not in excluded]
+    return dates[:MAX_OCCURRENCES]
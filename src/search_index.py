@@ -0,0 +1,189 @@
+"""予約の全文検索（施設名・コート種類・メモ・参加者の転置インデックス）
+
+文字列は表記を揃えてから（member_index.normalize_name）、英数字・かな・漢字の連続を
+1文字と2文字の n-gram に分けて索引にする（日本語は単語の区切りが無いため）。
+索引は列ごとに「異なる値」の単位で作る。施設名・コート種類・名前は種類が少ないので、
+予約の行数が増えても n-gram に分ける回数は値の種類数で済む。
+"""
+import math
+import operator
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+from member_index import normalize_name
+
+# 検索する列と重み（同じ語が複数の列に一致したときは重みの大きい列を採る）
+SEARCH_FIELDS = {"facility": 3.0, "participants": 2.0, "court_type": 1.5, "message": 1.0}
+# 参加者として検索する列（参加・保留）
+NAME_COLUMNS = ["participants", "consider"]
+_RUN = re.compile(r"\w+")
+_same_object = np.frompyfunc(operator.is_, 2, 1)
+
+
+def _runs(text):
+    return _RUN.findall(normalize_name(str(text).replace("<br>", " ")))
+
+def tokenize(text):
+    """索引に登録するトークン（1文字と2文字の n-gram）"""
+    tokens = set()
+    for run in _runs(text):
+        tokens.update(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def query_tokens(query):
+    """検索語のトークン（2文字以上の連続は2文字の n-gram、1文字だけならその1文字）"""
+    tokens = set()
+    for run in _runs(query):
+        if len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def _group_positions(codes, positions, n_values):
+    """値の番号ごとの行位置（codes と positions は同じ長さ）"""
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(n_values + 1))
+    positions = positions[order]
+    return [positions[bounds[i]:bounds[i + 1]] for i in range(n_values)]
+
+def _names(row_lists):
+    """参加・保留のリスト（list 以外は空）から名前の集合"""
+    return {n for names in row_lists if isinstance(names, list) for n in names if n}
+
+def changed_name_rows(old, new):
+    """
+    参加者リストが変わった行の位置
+
+    参加表明ログの適用（participation_log.apply_rosters）は変わった行のリストだけを差し替えるので、
+    同じ list オブジェクトかどうかで比べる。
+    """
+    changed = np.zeros(len(new), dtype=bool)
+    for col in NAME_COLUMNS:
+        if col in old.columns and col in new.columns:
+            changed |= ~_same_object(old[col].to_numpy(), new[col].to_numpy()).astype(bool)
+    return np.flatnonzero(changed).tolist()
+
+
+class ReservationSearchIndex:
+    """
+    予約データの転置インデックス
+
+    トークン → (列, 値の番号) の一覧と、値の番号 → 行位置 を持つ。
+    施設名・コート種類・メモは予約シートを取り直すまで変わらないので行位置を配列で、
+    参加者は参加表明のたびに変わるので名前ごとの行位置を集合で持ち、update() で変わった行だけを書き換える。
+
+    Args:
+        df: 予約データ（参加表明ログを適用したもの）
+    """
+    def __init__(self, df):
+        self._lock = threading.Lock()
+        self._labels = df.index
+        self._size = len(df)
+        # 一致度が同じなら新しい予約を先にする
+        days = pd.to_datetime(df["date"], errors="coerce").to_numpy()
+        self._days = np.where(np.isnat(days), 0, days.astype("int64"))
+        self._postings = {}  # トークン → [(列, 値の番号), ...]
+        self._values = {}    # 列 → 値のリスト
+        self._rows = {}      # 列 → 値の番号ごとの行位置（参加者は名前 → 行位置の集合）
+        positions = np.arange(self._size)
+        for field in SEARCH_FIELDS:
+            if field == "participants":
+                continue
+            if field not in df.columns:
+                self._values[field], self._rows[field] = [], []
+                continue
+            codes, uniques = pd.factorize(df[field].fillna("").astype(str))
+            self._values[field] = list(uniques)
+            self._rows[field] = _group_positions(codes, positions, len(uniques))
+            for vid, value in enumerate(uniques):
+                self._post(field, vid, value)
+
+        self._values["participants"] = []
+        self._rows["participants"] = []
+        self._name_ids = {}
+        lists = [df[col] for col in NAME_COLUMNS if col in df.columns]
+        if lists:
+            exploded = pd.concat([s.reset_index(drop=True) for s in lists]).explode()
+            exploded = exploded[exploded.notna() & (exploded.astype(str) != "")].astype(str)
+            codes, uniques = pd.factorize(exploded)
+            groups = _group_positions(codes, exploded.index.to_numpy(), len(uniques))
+            for name, rows in zip(uniques, groups):
+                self._name_id(name).update(rows.tolist())
+
+    def __len__(self):
+        return self._size
+
+    def _post(self, field, vid, value):
+        for token in tokenize(value):
+            self._postings.setdefault(token, []).append((field, vid))
+
+    def _name_id(self, name):
+        """名前の行位置の集合（初めての名前は索引に追加する）"""
+        vid = self._name_ids.get(name)
+        if vid is None:
+            vid = self._name_ids[name] = len(self._values["participants"])
+            self._values["participants"].append(name)
+            self._rows["participants"].append(set())
+            self._post("participants", vid, name)
+        return self._rows["participants"][vid]
+
+    def update(self, old, new, rows):
+        """
+        参加者リストが変わった行だけを索引に反映する
+
+        Args:
+            old: 前回反映した予約データ
+            new: 新しい予約データ（行の並びは old と同じ）
+            rows: 変わった行の位置（changed_name_rows()）
+        """
+        with self._lock:
+            for pos in rows:
+                before = _names(old[col].iat[pos] for col in NAME_COLUMNS if col in old.columns)
+                after = _names(new[col].iat[pos] for col in NAME_COLUMNS if col in new.columns)
+                for name in before - after:
+                    self._name_id(name).discard(pos)
+                for name in after - before:
+                    self._name_id(name).add(pos)
+
+    def _field_rows(self, field, vid):
+        rows = self._rows[field][vid]
+        return np.fromiter(rows, dtype=np.int64, count=len(rows)) if isinstance(rows, set) else rows
+
+    def search(self, query, limit=None):
+        """
+        検索語のすべてのトークンを含む予約（一致度の高い順。同じなら日付の新しい順）
+
+        一致度は、トークンごとに一致した列の重み × 珍しさ（含む予約が少ないほど大きい）の合計。
+
+        Args:
+            query: 検索語（空白区切りの複数語はすべてを含むものに絞る）
+            limit: 返す件数の上限
+
+        Returns:
+            list: 予約データの行ラベル
+        """
+        tokens = query_tokens(query)
+        if not tokens or self._size == 0:
+            return []
+        with self._lock:
+            score = np.zeros(self._size)
+            candidates = None
+            for token in tokens:
+                best = np.zeros(self._size)
+                for field, vid in self._postings.get(token, ()):
+                    rows = self._field_rows(field, vid)
+                    best[rows] = np.maximum(best[rows], SEARCH_FIELDS[field])
+                hit = best > 0
+                hits = int(hit.sum())
+                if hits == 0:
+                    return []
+                score += best * math.log(1 + self._size / hits)
+                candidates = hit if candidates is None else candidates & hit
+        found = np.flatnonzero(candidates)
+        order = np.lexsort((-self._days[found], -score[found]))
+        found = found[order[:limit] if limit is not None else order]
+        return list(self._labels[found])
@@ -0,0 +1,202 @@
+"""参加表明の適用（参加者リストの更新・キャンセル待ちの繰り上げ・「締切」⇔「募集中」の自動切り替え）
+
+予約1件の参加表明（登録・編集ポップアップ）も、複数の予約へのまとめての参加表明も同じ規則で判定する。
+定員チェックとステータスの切り替えは、選んだ予約すべてについて配列でまとめて計算し、
+参加表明ログへの追記とステータスの書き換えはそれぞれ1回の書き込みで行う。
+"""
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import change_feed
+from data_access import load_reservations, reservations_generation, append_participations, add_member
+from member_stats import record_participation
+from participation_log import REMOVED, WAITLISTED, ROSTER_COLUMNS, reservation_ids
+
+# 参加表明の区分 → 追加するリスト（削除はどのリストにも追加しない）
+PART_TYPES = {"参加": "participants", "保留": "consider", REMOVED: None}
+OPEN_STATUS = "募集中"
+FULL_STATUS = "締切"
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else []
+
+def capacity_transitions(counts, capacity, status):
+    """
+    参加者数と定員から「募集中」⇔「締切」を切り替えたステータス
+
+    定員に達した「募集中」は「締切」に、定員を下回った「締切」は「募集中」にする（定員なしはそのまま）。
+
+    Args:
+        counts: 参加者数（配列）
+        capacity: 定員（float の配列。定員なしは NaN）
+        status: ステータス（object の配列）
+
+    Returns:
+        numpy.ndarray: 切り替え後のステータス
+    """
+    limited = ~np.isnan(capacity)
+    return np.select(
+        [limited & (counts >= capacity) & (status == OPEN_STATUS),
+         limited & (counts < capacity) & (status == FULL_STATUS)],
+        [FULL_STATUS, OPEN_STATUS],
+        default=status,
+    )
+
+def participant_counts(df):
+    """予約ごとの参加者数（配列）"""
+    return np.fromiter((len(_as_list(names)) for names in df["participants"]), dtype=np.int64, count=len(df))
+
+def capacity_values(df):
+    """予約ごとの定員（float の配列。定員なしは NaN）"""
+    return pd.to_numeric(df["capacity"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+def _fill_seats(lists, capacity):
+    """
+    空いている席をキャンセル待ちの先頭から順に埋める（lists はその場で更新する）
+
+    Returns:
+        list: 繰り上げた (行の位置, 名前)
+    """
+    counts = np.fromiter(map(len, lists["participants"]), dtype=np.int64, count=len(capacity))
+    waiting = np.fromiter(map(len, lists["waitlist"]), dtype=np.int64, count=len(capacity))
+    # 定員なしはキャンセル待ち全員が入れる
+    free = np.minimum(np.where(np.isnan(capacity), waiting, np.clip(capacity - counts, 0, None)), waiting).astype(np.int64)
+    promoted = []
+    for i in np.flatnonzero(free):
+        moving = lists["waitlist"][i][:free[i]]
+        lists["waitlist"][i] = lists["waitlist"][i][free[i]:]
+        lists["participants"][i].extend(moving)
+        promoted += [(i, name) for name in moving]
+    return promoted
+
+def plan_participation(df, rows, nick, part_type):
+    """
+    参加表明を予約に当てはめた結果を求める（df は変更しない）
+
+    名前はいったん参加・保留・欠席・キャンセル待ちのすべてのリストから外し、区分のリストの末尾に加える。
+    参加はまずキャンセル待ちの末尾に並び、空いている席があれば申し込んだ順に繰り上げる
+    （定員に達している予約ではキャンセル待ちのまま。すでに並んでいれば順番はそのまま）。
+    参加から保留・削除に変えて空いた席も、同じくキャンセル待ちの先頭から繰り上げる。
+    参加者数が定員に達したら「募集中」→「締切」、下回ったら「締切」→「募集中」にする。
+
+    Args:
+        df: 予約データ
+        rows: 参加表明する予約の行ラベル
+        nick: 名前（None なら参加表明はせず、空いている席の繰り上げだけを行う）
+        part_type: 参加 / 保留 / 削除
+
+    Returns:
+        tuple: (変更後の行（DataFrame。ログに追記する表明が無い予約は含まない）,
+                ログに追記する (行ラベル, 名前, status) のリスト（この順に追記する）)
+    """
+    target = df.loc[list(rows)]
+    lists = {col: [list(_as_list(names)) for names in target[col]] for col in ROSTER_COLUMNS}
+    entries = []
+    if nick is not None:
+        add_to = PART_TYPES[part_type]
+        for i, label in enumerate(target.index):
+            waiting = nick in lists["waitlist"][i]
+            seated = nick in lists["participants"][i]
+            if add_to == "participants" and waiting:
+                continue
+            for col in ROSTER_COLUMNS:
+                lists[col][i] = [n for n in lists[col][i] if n != nick]
+            if add_to == "participants" and not seated:
+                lists["waitlist"][i].append(nick)
+                entries.append((label, nick, WAITLISTED))
+            else:
+                if add_to is not None:
+                    lists[add_to][i].append(nick)
+                entries.append((label, nick, part_type))
+
+    capacity = capacity_values(target)
+    for i, name in _fill_seats(lists, capacity):
+        label = target.index[i]
+        if name == nick:
+            # 申し込みがそのまま繰り上がったときは、キャンセル待ちの行を追記せずに参加の1行にする
+            entries = [e for e in entries if e != (label, nick, WAITLISTED)]
+        entries.append((label, name, "参加"))
+
+    counts = np.fromiter(map(len, lists["participants"]), dtype=np.int64, count=len(target))
+    new_status = capacity_transitions(counts, capacity, target["status"].to_numpy(dtype=object))
+
+    new_rows = target.copy(deep=False)
+    for col, values in lists.items():
+        new_rows[col] = pd.Series(values, index=target.index, dtype=object)
+    new_rows["status"] = new_status
+    touched = list(dict.fromkeys(label for label, _, _ in entries))
+    return new_rows.loc[touched], entries
+
+@st.cache_resource(show_spinner=False)
+def _submit_lock():
+    """参加表明の判定から追記までを1件ずつ行うためのロック（プロセスで共有）"""
+    return threading.Lock()
+
+def submit_participation(rows, nick, part_type, new_member=False):
+    """
+    参加表明を保存する（最新の予約データに当てはめて、ログに追記する）
+
+    予約の行は書き換えず、参加表明と、空いた席へのキャンセル待ちの繰り上げを参加表明ログにまとめて1回で追記する。
+    定員によるステータス変更があれば、その予約の status セルだけをまとめて書き換える。
+    同じサーバーのセッションどうしは、予約データの読み込みから追記までをロックで1件ずつ行う
+    （先に追記した分を読み込んでから判定するので、同じ席を2人が取ることはない）。
+    別のサーバーと同時に最後の席へ参加表明した場合は、ログを適用するときに後から追記された方がキャンセル待ちになる
+    （participation_log.merge_roster。ログには判定に使った定員を記録し、後から定員を変えても判定し直さない）。
+
+    Args:
+        rows: 参加表明する予約の行ラベル
+        nick: 名前（None なら繰り上げだけを行う）
+        part_type: 参加 / 保留 / 削除
+        new_member: 新規入力した名前なら True（メンバー名簿に追加する）
+
+    Returns:
+        tuple: (反映した予約の行ラベルのリスト, そのうちキャンセル待ちになっている予約の行ラベルのリスト,
+                繰り上がった (行ラベル, 名前) のリスト)
+    """
+    return _submit(lambda df: [r for r in rows if r in df.index], nick, part_type, new_member)
+
+def _submit(select_rows, nick, part_type, new_member=False):
+    """submit_participation() の本体（select_rows: 最新の予約データ → 対象の行ラベル）"""
+    with _submit_lock():
+        # 追記済みの件数は世代に含まれるので、先に追記したセッションの分を反映した予約データになる
+        current_df = load_reservations()
+        generation, feed_revision = reservations_generation(), change_feed.current_revision()
+        rows = select_rows(current_df)
+        new_rows, entries = plan_participation(current_df, rows, nick, part_type)
+        if entries:
+            old_rows = current_df.loc[new_rows.index]
+            ids = dict(zip(new_rows.index, reservation_ids(new_rows)))
+            capacities = dict(zip(new_rows.index, new_rows["capacity"]))
+            changed = new_rows["status"].to_numpy() != old_rows["status"].to_numpy()
+            # 判定に使った定員も記録する（ログを適用するとき、この定員で別サーバーとの同時の参加表明を判定する）
+            append_participations(
+                [(ids[label], name, status, capacities[label]) for label, name, status in entries],
+                status_updates={ids[label]: status for label, status in zip(new_rows.index[changed], new_rows["status"][changed])},
+            )
+    waitlisted = [
+        r for r in rows
+        if nick in _as_list((new_rows if r in new_rows.index else current_df).at[r, "waitlist"])
+    ]
+    promoted = [(label, name) for label, name, _ in entries if name != nick]
+    if entries:
+        # メンバー別の集計表は変更した予約の分だけ更新する
+        record_participation(old_rows, new_rows, nick, generation, feed_revision)
+    if new_member:
+        add_member(nick)
+    return rows, waitlisted, promoted
+
+def promote_waitlist(rids):
+    """
+    定員の変更などで空いた席に、キャンセル待ちを申し込んだ順に繰り上げる
+
+    Args:
+        rids: 予約の予約ID（保存した後に他のセッションが行を追加・削除していても、同じ予約を繰り上げる）
+
+    Returns:
+        list: 繰り上がった (行ラベル, 名前)（行ラベルは最新の予約データのもの）
+    """
+    targets = set(rids)
+    return _submit(lambda df: list(df.index[reservation_ids(df).isin(targets).to_numpy(dtype=bool)]), None, None)[2]
@@ -0,0 +1,120 @@
+"""施設・日付ごとの時間帯インデックス（重複予約の検出・空き時間の提案）"""
+import bisect
+import pandas as pd
+
+# 空き時間を提案する時間帯（0時からの分）
+SLOT_DAY_START_MIN = 7 * 60
+SLOT_DAY_END_MIN = 22 * 60
+# 空き時間を提案する刻み（分）
+SLOT_STEP_MIN = 30
+
+
+def reservation_minutes(df):
+    """
+    開始・終了時刻を0時からの分にする（空欄はカレンダー表示と同じく 9:00 / 11:00 とみなす）
+
+    Returns:
+        tuple[Series, Series]: 開始分, 終了分
+    """
+    def minutes(hour_col, minute_col, default_hour):
+        hours = pd.to_numeric(df[hour_col], errors="coerce").fillna(default_hour)
+        mins = pd.to_numeric(df[minute_col], errors="coerce").fillna(0)
+        return (hours * 60 + mins).astype(int)
+    return minutes("start_hour", "start_minute", 9), minutes("end_hour", "end_minute", 11)
+
+def build_slot_index(df):
+    """
+    予約を施設・日付ごとに開始時刻順でまとめる（中止は除く）
+
+    Returns:
+        dict: {(施設名, 日付): {"starts": [開始分...], "max_ends": [...], "slots": [(開始分, 終了分, 行番号), ...]}}
+              max_ends[i] は slots[0..i] の終了分の最大値（重なりの有無を二分探索1回で判定するため）
+    """
+    active = df[df["status"] != "中止"]
+    starts, ends = reservation_minutes(active)
+    ordered = pd.DataFrame({
+        "facility": active["facility"], "date": active["date"], "start": starts, "end": ends,
+    }).sort_values("start", kind="stable")  # 開始順に追加すれば各グループ内も開始順になる
+
+    index = {}
+    for facility, day, start, end, row_idx in zip(
+        ordered["facility"], ordered["date"], ordered["start"], ordered["end"], ordered.index
+    ):
+        group = index.get((facility, day))
+        if group is None:
+            group = index[(facility, day)] = {"starts": [], "max_ends": [], "slots": []}
+        group["starts"].append(start)
+        group["max_ends"].append(max(end, group["max_ends"][-1]) if group["max_ends"] else end)
+        group["slots"].append((start, end, row_idx))
+    return index
+
+def find_overlaps(slot_index, facility, day, start_min, end_min, exclude=None):
+    """
+    同じ施設・同じ日で時間帯が重なる予約の行番号
+
+    重なりが無い場合（ほとんどの場合）は二分探索1回で判定する。
+
+    Args:
+        exclude: 除外する行番号（編集中の予約自身）
+
+    Returns:
+        list: 行番号のリスト
+    """
+    group = slot_index.get((facility, day))
+    if not group:
+        return []
+    # 開始が end_min より前の予約だけが候補
+    k = bisect.bisect_left(group["starts"], end_min)
+    if k == 0 or group["max_ends"][k - 1] <= start_min:
+        return []
+    return [i for s, e, i in group["slots"][:k] if e > start_min and i != exclude]
+
+def find_conflicts(slot_index, facility, dates, start_min, end_min):
+    """
+    複数の日付について、重なる予約を探す
+
+    Returns:
+        dict: {日付: [重なる予約の行番号, ...]}（重なりが無い日は含まない）
+    """
+    conflicts = {}
+    for d in dates:
+        rows = find_overlaps(slot_index, facility, d, start_min, end_min)
+        if rows:
+            conflicts[d] = rows
+    return conflicts
+
+def suggest_free_slots(slot_index, facility, day, duration_min, preferred_start=None, limit=3):
+    """
+    同じ施設・同じ日の空いている時間帯を提案する
+
+    Args:
+        duration_min: 予約したい長さ（分）
+        preferred_start: 希望の開始分（近い順に並べる）
+        limit: 提案する件数
+
+    Returns:
+        list[tuple[int, int]]: (開始分, 終了分) のリスト
+    """
+    group = slot_index.get((facility, day), {"slots": []})
+    # 予約済みの時間帯をつなげて、その間の空きを求める
+    gaps = []
+    cursor = SLOT_DAY_START_MIN
+    for start, end, _ in group["slots"]:
+        if start > cursor:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    gaps.append((cursor, SLOT_DAY_END_MIN))
+
+    candidates = []
+    for gap_start, gap_end in gaps:
+        # 刻みに合わせて切り上げ
+        start = -(-gap_start // SLOT_STEP_MIN) * SLOT_STEP_MIN
+        while start + duration_min <= gap_end:
+            candidates.append((start, start + duration_min))
+            start += SLOT_STEP_MIN
+    if preferred_start is not None:
+        candidates.sort(key=lambda c: abs(c[0] - preferred_start))
+    return candidates[:limit]
+
+def format_minutes(m):
+    return f"{m // 60:02}:{m % 60:02}"
@@ -0,0 +1 @@
+"""画面（予定 / 一覧 / 実績 / ポップアップ）ごとの描画モジュール"""
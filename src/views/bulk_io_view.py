@@ -0,0 +1,52 @@
+"""管理者向け: 予約の一括インポート・エクスポート"""
+import streamlit as st
+
+from data_access import load_reservations
+from bulk_io import import_reservations, export_csv, export_parquet
+
+
+def render_bulk_io_panel():
+    """予約データをCSV/Parquetで取り込み・書き出しするパネル"""
+    with st.expander("📦 予約の一括インポート・エクスポート", expanded=False):
+        df_res = load_reservations()
+
+        # --- エクスポート（ファイルはボタンを押したときに生成する） ---
+        st.caption(f"エクスポート（{len(df_res)}件）")
+        col_csv, col_parquet = st.columns(2)
+        with col_csv:
+            st.download_button(
+                "CSV",
+                data=lambda: export_csv(df_res),
+                file_name="reservations.csv",
+                mime="text/csv",
+                on_click="ignore",
+                use_container_width=True,
+            )
+        with col_parquet:
+            st.download_button(
+                "Parquet",
+                data=lambda: export_parquet(df_res),
+                file_name="reservations.parquet",
+                mime="application/vnd.apache.parquet",
+                on_click="ignore",
+                use_container_width=True,
+            )
+
+        # --- インポート ---
+        st.caption("インポート（日付・施設名・開始時刻が同じ予約は取り込みません）")
+        uploaded = st.file_uploader("CSV / Parquet ファイル", type=["csv", "parquet"], key="bulk_import_file")
+        if uploaded is not None and st.button("取り込む", type="primary", key="bulk_import_run"):
+            file_type = "parquet" if uploaded.name.lower().endswith(".parquet") else "csv"
+            progress = st.empty()
+            try:
+                result = import_reservations(
+                    uploaded, file_type,
+                    on_progress=lambda n: progress.caption(f"{n}行を読み込みました"),
+                )
+            except Exception as e:
+                st.error(f"取り込みに失敗しました: {e}")
+                return
+            progress.empty()
+            st.success(f"{result['imported']}件を取り込みました（重複 {result['duplicates']}件、エラー {len(result['errors'])}件）")
+            if not result["errors"].empty:
+                st.dataframe(result["errors"], hide_index=True, use_container_width=True)
@@ -0,0 +1,62 @@
+"""まとめて参加表明（一覧・予定で選んだ複数の予約に、同じ名前・区分で参加表明する）"""
+import streamlit as st
+import pandas as pd
+
+import perf
+from app_common import safe_int
+from signup import submit_participation
+from views.name_picker import render_name_picker
+
+WEEKDAYS = ["月", "火", "水", "木", "金", "土", "日"]
+
+
+def reservation_label(df_res, idx):
+    """予約の短い表示（例: 12/06(土) 09:00 砧公園）"""
+    r = df_res.loc[idx]
+    day = pd.Timestamp(r["date"])
+    return f"{day:%m/%d}({WEEKDAYS[day.weekday()]}) {safe_int(r['start_hour']):02}:{safe_int(r['start_minute']):02} {r['facility']}"
+
+def render_bulk_signup(df_res, rows, key_prefix):
+    """
+    選んだ予約にまとめて参加表明するパネル
+
+    定員チェックと「締切」⇔「募集中」の切り替えは選んだ予約すべてについてまとめて判定し、
+    ログへの追記は1回で行う（signup.submit_participation）。定員に達している予約はキャンセル待ちにする。
+
+    Args:
+        df_res: 予約データ
+        rows: 選んだ予約の行ラベル
+        key_prefix: ウィジェットのキーの接頭辞（一覧と予定で別にする）
+    """
+    result = st.session_state.pop(f"{key_prefix}_result", None)
+    if result:
+        saved, waitlisted = result
+        if saved:
+            st.success(f"{saved}件に反映しました")
+        if waitlisted:
+            st.info("定員に達しているためキャンセル待ちにした予約（空きが出たら申し込んだ順に参加になります）: " + "、".join(waitlisted))
+
+    rows = [idx for idx in rows if idx in df_res.index]
+    if not rows:
+        st.caption("参加表明する予約を選んでください")
+        return
+    st.caption(f"{len(rows)}件を選択中: " + "、".join(reservation_label(df_res, idx) for idx in rows))
+
+    col_nick, col_type = st.columns([1, 1])
+    with col_nick:
+        nick, is_new_name = render_name_picker(key_prefix)
+    with col_type:
+        part_type = st.radio("区分", ["参加", "保留", "削除"], horizontal=True, key=f"{key_prefix}_type")
+
+    if st.button(f"選んだ{len(rows)}件に反映する", type="primary", key=f"{key_prefix}_submit"):
+        if not nick:
+            st.warning("名前を選択してください")
+            return
+        with perf.span("signup.bulk"):
+            saved, waitlisted, _ = submit_participation(rows, nick, part_type, new_member=is_new_name)
+        st.session_state[f"{key_prefix}_result"] = (
+            len(saved) - len(waitlisted), [reservation_label(df_res, idx) for idx in waitlisted]
+        )
+        # 選択を解除して、反映後の予約データで描画し直す
+        st.session_state['list_reset_counter'] += 1
+        st.rerun()
@@ -0,0 +1,103 @@
+"""管理者向け: 予約の一括変更（条件に合う予約のステータス・定員・コート種類をまとめて書き換える）"""
+import streamlit as st
+import pandas as pd
+
+import perf
+from app_common import COURT_TYPES, STATUS_COLOR
+from bulk_update import select_reservations, plan_bulk_update, submit_bulk_update
+from data_access import load_reservations
+from views.bulk_signup_view import reservation_label
+
+KEEP = "(変更しない)"
+CAPACITY_CHOICES = [KEEP, "指定なし", "人数を指定"]
+# 確認用に表示する件数の上限
+PREVIEW_LIMIT = 200
+
+
+def _change_inputs():
+    """変更内容の入力欄（plan_bulk_update() の changes を返す）"""
+    changes = {}
+    col_status, col_capacity, col_court = st.columns(3)
+    with col_status:
+        status = st.selectbox("ステータス", [KEEP] + list(STATUS_COLOR), key="bulk_update_status")
+        if status != KEEP:
+            changes["status"] = status
+    with col_capacity:
+        capacity_choice = st.selectbox("定員", CAPACITY_CHOICES, key="bulk_update_capacity_choice")
+        if capacity_choice == "指定なし":
+            changes["capacity"] = None
+        elif capacity_choice == "人数を指定":
+            changes["capacity"] = int(st.number_input("人数", min_value=1, value=4, step=1, key="bulk_update_capacity"))
+    with col_court:
+        court_type = st.selectbox("コート種類", [KEEP] + COURT_TYPES, key="bulk_update_court_type")
+        if court_type != KEEP:
+            changes["court_type"] = court_type
+    return changes
+
+def _preview_table(df_res, new_df, rows, columns):
+    """変更する予約の変更前 → 変更後"""
+    labels = {"status": "ステータス", "capacity": "定員", "court_type": "コート種類"}
+
+    def show(value):
+        return "指定なし" if pd.isna(value) else str(value)
+    table = {"予約": [reservation_label(df_res, idx) for idx in rows]}
+    for col in columns:
+        table[labels[col]] = [
+            f"{show(df_res.at[idx, col])} → {show(new_df.at[idx, col])}" for idx in rows
+        ]
+    return pd.DataFrame(table)
+
+def render_bulk_update_panel():
+    """条件で選んだ予約をまとめて変更するパネル（保存前に対象の件数と内容を確認できる）"""
+    with st.expander("🗂 予約の一括変更", expanded=False):
+        result = st.session_state.pop("bulk_update_result", None)
+        if result is not None:
+            st.success(f"{result}件を変更しました")
+
+        df_res = load_reservations()
+        st.caption("対象の条件（指定しない項目では絞り込みません）")
+        col_status, col_facility = st.columns(2)
+        with col_status:
+            statuses = st.multiselect("ステータス", list(STATUS_COLOR), key="bulk_update_filter_status")
+        with col_facility:
+            facility_options = sorted(df_res["facility"].dropna().astype(str).unique()) if not df_res.empty else []
+            facilities = st.multiselect("施設", facility_options, key="bulk_update_filter_facility")
+        col_from, col_to = st.columns(2)
+        with col_from:
+            date_from = st.date_input("開始日", value=None, key="bulk_update_filter_from")
+        with col_to:
+            date_to = st.date_input("終了日", value=None, key="bulk_update_filter_to")
+        filters = {"statuses": statuses, "facilities": facilities, "date_from": date_from, "date_to": date_to}
+
+        st.caption("変更内容")
+        changes = _change_inputs()
+
+        # --- 確認（保存せずに、対象と変更後の値を表示する） ---
+        with perf.span("bulk_update.plan"):
+            mask = select_reservations(df_res, **filters)
+            new_df, changed, columns, skipped = plan_bulk_update(df_res, mask, changes)
+        n_target, n_changed = int(mask.sum()), int(changed.sum())
+        st.caption(f"対象 {n_target}件（うち変更 {n_changed}件）")
+        if skipped.any():
+            # 定員は参加者数より少なくできない（登録・編集ポップアップと同じ）
+            rows = list(df_res.index[skipped][:PREVIEW_LIMIT])
+            st.warning(f"定員が参加者数より少なくなるため、{int(skipped.sum())}件は変更しません")
+            st.dataframe(pd.DataFrame({
+                "予約": [reservation_label(df_res, idx) for idx in rows],
+                "参加者数": [len(df_res.at[idx, "participants"] or []) for idx in rows],
+            }), hide_index=True, use_container_width=True)
+        if n_changed:
+            rows = list(df_res.index[changed][:PREVIEW_LIMIT])
+            st.dataframe(_preview_table(df_res, new_df, rows, columns), hide_index=True, use_container_width=True)
+            if n_changed > PREVIEW_LIMIT:
+                st.caption(f"先頭の{PREVIEW_LIMIT}件を表示しています")
+
+        if st.button(f"{n_changed}件を変更する", type="primary", disabled=n_changed == 0, key="bulk_update_run"):
+            with perf.span("bulk_update.save"):
+                try:
+                    saved = submit_bulk_update(filters, changes)
+                except Exception as e:
+                    st.error(f"変更に失敗しました: {e}")
+                    return
+            st.session_state["bulk_update_result"] = saved
+            st.rerun()
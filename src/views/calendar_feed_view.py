@@ -0,0 +1,28 @@
+"""予約をカレンダーアプリに一括登録（.ics のダウンロード・購読URL）"""
+import streamlit as st
+
+from data_access import load_reservations
+from calendar_feed import ALL_MEMBERS, build_member_ics, member_event_index, feed_url
+
+
+def render_calendar_feed_panel():
+    """全員分または参加者ごとの予約を .ics で書き出すパネル"""
+    with st.expander("📅 カレンダーに一括登録", expanded=False):
+        df_res = load_reservations()
+        members = sorted(member_event_index(df_res))
+        choice = st.selectbox("対象", [ALL_MEMBERS] + members, key="calendar_feed_member")
+        member = None if choice == ALL_MEMBERS else choice
+
+        # ファイルはボタンを押したときに生成する
+        st.download_button(
+            ".ics をダウンロード",
+            data=lambda: build_member_ics(df_res, member),
+            file_name="tennis.ics" if member is None else f"tennis_{member}.ics",
+            mime="text/calendar",
+            on_click="ignore",
+            use_container_width=True,
+        )
+        url = feed_url(member)
+        if url:
+            st.caption("カレンダーアプリで次のURLを購読すると、予約の変更が自動で反映されます")
+            st.code(url, language=None)
@@ -0,0 +1,187 @@
+"""予定（カレンダー）画面"""
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from datetime import time as dt_time
+
+import perf
+from app_common import safe_int, jst_today, STATUS_COLOR, LONG_PRESS_DELAY_MS
+from data_access import load_reservations_for_view
+from views.bulk_signup_view import render_bulk_signup, reservation_label
+
+
+def build_calendar_events(df_res):
+    """
+    予約データからカレンダー表示用のイベントリストを生成する
+
+    Args:
+        df_res: 予約データ
+
+    Returns:
+        list: streamlit_calendar に渡すイベント辞書のリスト
+    """
+    events = []
+    for idx, r in df_res.iterrows():
+        raw_date = r.get("date")
+        if pd.isna(raw_date) or raw_date == "": continue
+        if isinstance(raw_date, str):
+            try: curr_date = datetime.fromisoformat(str(raw_date)[:10]).date()
+            except: continue
+        else: curr_date = raw_date
+
+        s_hour = safe_int(r.get("start_hour"), 9)
+        s_min  = safe_int(r.get("start_minute"), 0)
+        e_hour = safe_int(r.get("end_hour"), 11)
+        e_min  = safe_int(r.get("end_minute"), 0)
+
+        try:
+            start_dt = datetime.combine(curr_date, dt_time(s_hour, s_min))
+            end_dt   = datetime.combine(curr_date, dt_time(e_hour, e_min))
+        except Exception: continue
+
+        color = STATUS_COLOR.get(r["status"], {"bg":"#FFFFFF","text":"black"})
+        # タイトルにコート種類も含める
+        ct_val = r.get('court_type')
+        if ct_val and ct_val != "不明":
+            title_str = f"{r['status']} {r['facility']} ({ct_val})"
+        else:
+            title_str = f"{r['status']} {r['facility']}"
+
+        events.append({
+            "id": idx,
+            "title": title_str,
+            "start": start_dt.isoformat(),
+            "end": end_dt.isoformat(),
+            "backgroundColor": color["bg"],
+            "borderColor": color["bg"],
+            "textColor": color["text"]
+        })
+    return events
+
+
+@st.fragment
+def render_calendar_view():
+    """カレンダー表示（カレンダー操作はこのフラグメント内だけで再実行される）"""
+    df_res = load_reservations_for_view()
+    with perf.span("calendar.build_events"):
+        events = build_calendar_events(df_res)
+
+    initial_date = datetime.now().strftime("%Y-%m-%d")
+    if "clicked_date" in st.session_state and st.session_state["clicked_date"]:
+        initial_date = st.session_state["clicked_date"]
+
+    cal_key = str(initial_date)[:7]
+
+    from streamlit_calendar import calendar as st_calendar
+    with perf.span("calendar.render"):
+        cal_state = st_calendar(
+            events=events,
+            options={
+                "initialView": "dayGridMonth",
+                "initialDate": initial_date,
+                "selectable": True,
+                "headerToolbar": {"left": "prev,next today", "center": "title", "right": ""},
+                "eventDisplay": "block",
+                "displayEventTime": False,
+                "height": "auto",
+                "contentHeight": "auto",
+                "aspectRatio": 1.2,
+                "titleFormat": {"year": "numeric", "month": "2-digit"},
+                "longPressDelay": LONG_PRESS_DELAY_MS  # ミリ秒（例: 1200 = 1.2秒）
+            },
+            key=f"calendar_{cal_key}"
+        )
+
+    handle_calendar_event(cal_state, df_res)
+    render_calendar_bulk_signup(df_res, initial_date)
+
+def render_calendar_bulk_signup(df_res, initial_date):
+    """表示中の月のこれからの予約から選んで、まとめて参加表明する"""
+    with st.expander("まとめて参加表明"):
+        # 月移動後はカレンダーの表示開始日（月の1日）、まだ操作していなければ初期表示の月
+        month = pd.Timestamp(str(st.session_state.get('last_view_start') or initial_date)[:10]).to_period("M")
+        dates = pd.to_datetime(df_res["date"], errors="coerce")
+        upcoming = df_res[
+            (dates.dt.to_period("M") == month) & (df_res["date"] >= jst_today())
+            & ~df_res["status"].isin(["中止", "完了"])
+        ]
+        upcoming = upcoming.sort_values(["date", "start_hour", "start_minute"])
+        st.caption(f"{month.year}年{month.month}月のこれからの予約")
+        if upcoming.empty:
+            st.caption("選べる予約がありません")
+            return
+        counter = st.session_state['list_reset_counter']
+        if st.checkbox("すべて選ぶ", key=f"calendar_bulk_all_{counter}"):
+            rows = list(upcoming.index)
+        else:
+            rows = st.multiselect(
+                "予約", options=list(upcoming.index),
+                format_func=lambda idx: reservation_label(df_res, idx), key=f"calendar_bulk_rows_{counter}",
+            )
+        render_bulk_signup(df_res, rows, key_prefix="calendar_bulk")
+
+
+def handle_calendar_event(cal_state, df_res):
+    """カレンダーのクリック・月移動を判定し、ポップアップの開閉状態を更新する"""
+    if not cal_state:
+        return
+
+    # 状態が変わった時だけ処理
+    if cal_state != st.session_state['prev_cal_state']:
+        st.session_state['prev_cal_state'] = cal_state
+        
+        # ★最優先: リスト操作直後の「カレンダーの更新（エコー）」なら無視して通す
+        if st.session_state['skip_calendar_event']:
+            st.session_state['skip_calendar_event'] = False
+            # 念のため現在のビュー開始日を更新しておく（次回の誤動作防止）
+            current_view = cal_state.get("view", {})
+            st.session_state['last_view_start'] = current_view.get("currentStart")
+            # 何もせず終了（ポップアップは維持される）
+        
+        else:
+            # 通常の判定処理へ
+            current_view = cal_state.get("view", {})
+            current_start = current_view.get("currentStart")
+            
+            if 'last_view_start' not in st.session_state:
+                st.session_state['last_view_start'] = current_start
+            
+            # 1. ナビゲーション（月移動）チェック
+            if current_start != st.session_state['last_view_start']:
+                # 月が変わったら強制リセット
+                st.session_state['last_view_start'] = current_start
+                st.session_state['is_popup_open'] = False
+                st.session_state['active_event_idx'] = None
+                st.session_state['list_reset_counter'] += 1
+            
+            else:
+                # 2. クリックチェック
+                callback = cal_state.get("callback")
+                current_signature = None
+                if callback == "dateClick":
+                    current_signature = f"date_{cal_state['dateClick']['date']}"
+                elif callback == "eventClick":
+                    current_signature = f"event_{cal_state['eventClick']['event']['id']}"
+                
+                # 新しいクリックなら開く
+                if current_signature and current_signature != st.session_state['last_click_signature']:
+                    st.session_state['last_click_signature'] = current_signature
+                    st.session_state['is_popup_open'] = True
+                    
+                    if callback == "dateClick":
+                        st.session_state['clicked_date'] = cal_state["dateClick"]["date"]
+                        st.session_state['active_event_idx'] = None
+                        st.session_state['popup_mode'] = "new"
+                        st.session_state['list_reset_counter'] += 1
+                    
+                    elif callback == "eventClick":
+                        idx = int(cal_state["eventClick"]["event"]["id"])
+                        st.session_state['active_event_idx'] = idx
+                        if idx in df_res.index:
+                            target_date = df_res.loc[idx]["date"]
+                            st.session_state['clicked_date'] = str(target_date)
+                        st.session_state['popup_mode'] = "edit"
+                        st.session_state['list_reset_counter'] += 1
+                    
+                    # ポップアップはアプリ全体の再実行で開く
+                    st.rerun()
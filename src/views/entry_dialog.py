@@ -0,0 +1,346 @@
+"""予約の登録・編集ポップアップ"""
+import streamlit as st
+import pandas as pd
+from datetime import timedelta
+from datetime import time as dt_time
+from urllib.parse import quote
+
+from app_common import COURT_TYPES, safe_int, to_jst_date, generate_google_calendar_url
+from data_access import load_reservations, load_slot_index, save_reservations, append_reservations, load_facilities_data, add_facility_if_not_exists
+from participation_log import reservation_ids
+from recurrence import RECURRENCE_OPTIONS, MAX_OCCURRENCES, expand_recurrence
+from signup import submit_participation, promote_waitlist
+from slot_index import find_overlaps, find_conflicts, suggest_free_slots, format_minutes, reservation_minutes
+from views.name_picker import render_name_picker
+
+
+def rerun_dialog():
+    """ダイアログだけを再実行する（フラグメント再実行中でない場合はアプリ全体を再実行）"""
+    try:
+        st.rerun(scope="fragment")
+    except st.errors.StreamlitAPIException:
+        st.rerun()
+
+
+@st.dialog("予約内容の登録・編集")
+def entry_form_dialog(mode, idx=None, date_str=None):
+    """
+    予約の登録・編集ポップアップ
+
+    ダイアログ内の操作はダイアログだけが再実行され、背後のカレンダー・一覧は再描画しない。
+    登録・削除・閉じる操作のみアプリ全体を再実行してポップアップを閉じる。
+    """
+    df_res = load_reservations()
+
+    # --- A. 新規登録モード ---
+    if mode == "new":
+        display_date = to_jst_date(date_str)
+        st.write(f"📅 **日付:** {display_date}")
+        
+        past_facilities = []
+        if 'facility' in df_res.columns:
+            past_facilities = df_res['facility'].dropna().unique().tolist()
+
+        # 時刻入力は施設名より前に表示
+        col1, col2 = st.columns(2)
+        with col1: start_time = st.time_input("開始時間", value=dt_time(9, 0), step=timedelta(minutes=30))
+        with col2: end_time = st.time_input("終了時間", value=dt_time(11, 0), step=timedelta(minutes=30))
+
+        facility_select = st.selectbox("施設名", options=["(施設名を選択)"] + past_facilities + ["新規登録"], index=0)
+        facility = st.text_input("施設名を入力") if facility_select == "新規登録" else (facility_select if facility_select != "(施設名を選択)" else "")
+
+        # コート種類（固定リスト）
+        court_type = st.selectbox("コート種類", options=COURT_TYPES, index=0)
+
+        # 定員入力
+        capacity_options = ["指定なし"] + [str(i) for i in range(1, 31)]
+        capacity_selected = st.selectbox("定員", options=capacity_options, index=0)
+        capacity = None if capacity_selected == "指定なし" else int(capacity_selected)
+
+        # ステータスは定員のあとに
+        status = st.selectbox("ステータス", ["募集中", "抽選中"], index=0)
+
+        message = st.text_area("メモ", placeholder="例：集合時間や持ち物など")
+
+        # 繰り返し登録（毎週同じ施設・時間帯を取る場合など）
+        repeat_rule = st.selectbox("繰り返し", RECURRENCE_OPTIONS, index=0)
+        occurrence_dates = [display_date]
+        if repeat_rule != "なし":
+            repeat_until = st.date_input("繰り返しの終了日", value=display_date + timedelta(weeks=12), min_value=display_date)
+            candidates = expand_recurrence(display_date, repeat_until, repeat_rule)
+            skipped = st.multiselect("除外する日", options=candidates, format_func=lambda d: d.strftime("%Y/%m/%d"))
+            occurrence_dates = expand_recurrence(display_date, repeat_until, repeat_rule, exceptions=skipped)
+            st.caption(f"{len(occurrence_dates)}件を登録します（最大{MAX_OCCURRENCES}件）")
+
+        # 同じ施設・時間帯の既存予約を確認する
+        # 繰り返し登録では重なる日を除外し、1件だけの登録は警告と空き時間の提案にとどめる（別コートの場合があるため）
+        start_min = start_time.hour * 60 + start_time.minute
+        end_min = end_time.hour * 60 + end_time.minute
+        skip_dates = {}
+        if facility and end_min > start_min:
+            slot_index = load_slot_index()
+            conflicts = find_conflicts(slot_index, facility, occurrence_dates, start_min, end_min)
+            if conflicts and repeat_rule != "なし":
+                skip_dates = conflicts
+                st.warning("同じ施設・時間帯の予約があるため除外します: " + ", ".join(d.strftime("%m/%d") for d in conflicts))
+            elif conflicts:
+                st.warning("⚠️ 同じ施設・時間帯に予約があります")
+                free = suggest_free_slots(slot_index, facility, display_date, end_min - start_min, preferred_start=start_min)
+                if free:
+                    st.caption("空いている時間帯: " + ", ".join(f"{format_minutes(s)}-{format_minutes(e)}" for s, e in free))
+
+        st.markdown('<div style="margin-top: -20px;"></div>', unsafe_allow_html=True)
+        st.divider()
+
+        col_reg, col_close = st.columns([1, 1])
+        with col_reg:
+            if st.button("登録する", type="primary", use_container_width=True):
+                if facility == "":
+                    st.error("⚠️ 施設名を選択してください")
+                elif court_type == "":
+                    st.error("⚠️ コート種類を選択してください")
+                elif end_time <= start_time:
+                    st.error("⚠️ 終了時間は開始時間より後にしてください")
+                elif len(occurrence_dates) == len(skip_dates):
+                    st.error("⚠️ 登録できる日がありません")
+                else:
+                    # 施設名をfacilitiesシートに自動追加
+                    add_facility_if_not_exists(facility)
+                    
+                    new_rows = [
+                        {
+                            "date": d,
+                            "start_hour": start_time.hour,
+                            "start_minute": start_time.minute,
+                            "end_hour": end_time.hour,
+                            "end_minute": end_time.minute,
+                            "facility": facility,
+                            "court_type": court_type,
+                            "capacity": capacity,
+                            "status": status,
+                            "participants": [],
+                            "absent": [],
+                            "consider": [],
+                            "waitlist": [],
+                            "message": message.replace('\n', '<br>')
+                        }
+                        for d in occurrence_dates if d not in skip_dates
+                    ]
+                    # 既存の行は書き換えず、シート末尾にまとめて追記する
+                    append_reservations(new_rows)
+                    st.session_state['show_success_message'] = '登録しました' if len(new_rows) == 1 else f'{len(new_rows)}件登録しました'
+                    st.session_state['is_popup_open'] = False
+                    st.session_state['last_click_signature'] = None
+                    st.session_state['active_event_idx'] = None
+                    st.session_state['list_reset_counter'] += 1
+                    st.rerun()
+        with col_close:
+            if st.button("閉じる", use_container_width=True):
+                st.session_state['is_popup_open'] = False
+                # ▼この3つがあれば完璧です
+                st.session_state['last_click_signature'] = None  # カレンダーの同日再クリック用
+                st.session_state['active_event_idx'] = None      # リストの再クリック用
+                st.session_state['list_reset_counter'] += 1      # リストの見た目リセット用
+
+
+                st.rerun()
+
+    # --- B. 編集モード ---
+    elif mode == "edit" and idx is not None:
+        if idx not in df_res.index:
+            st.error("イベントが削除されました。")
+            if st.button("閉じる"):
+                st.session_state['is_popup_open'] = False
+                # ▼この3つがあれば完璧です
+                st.session_state['last_click_signature'] = None  # カレンダーの同日再クリック用
+                st.session_state['active_event_idx'] = None      # リストの再クリック用
+                st.session_state['list_reset_counter'] += 1      # リストの見た目リセット用
+
+                st.rerun()
+            return
+
+        r = df_res.loc[idx]
+        
+        # 施設情報を取得
+        facilities_data = load_facilities_data()
+        facility_info = facilities_data.get(r['facility'], {})
+        facility_url = facility_info.get('url', '')
+        facility_address = facility_info.get('address', '')
+        
+        def clean_join(lst):
+            if not isinstance(lst, list): return 'なし'
+            valid_names = [str(x) for x in lst if x and str(x).strip() != '']
+            return ', '.join(valid_names) if valid_names else 'なし'
+
+        # メモの<br>を改行に変換して表示
+        display_msg = r.get('message', '')
+        if pd.notna(display_msg) and display_msg:
+            display_msg = display_msg.replace('<br>', '\n')
+        else:
+            display_msg = '（なし）'
+        
+        # 日時（開始〜終了）
+        st.markdown(f"**日時:** {r['date']} {int(safe_int(r.get('start_hour'))):02}:{int(safe_int(r.get('start_minute'))):02} - {int(safe_int(r.get('end_hour'))):02}:{int(safe_int(r.get('end_minute'))):02}")
+        # 同じ施設・時間帯の別の予約があれば知らせる
+        if r.get('status') != '中止':
+            starts, ends = reservation_minutes(df_res.loc[[idx]])
+            if find_overlaps(load_slot_index(), r['facility'], r['date'], starts.iloc[0], ends.iloc[0], exclude=idx):
+                st.warning("⚠️ 同じ施設・時間帯に別の予約があります")
+        # Googleカレンダーリンク
+        calendar_url = generate_google_calendar_url(r)
+        st.markdown(f'<a href="{calendar_url}" target="_blank" style="font-size: 14px; color: #1f77b4;">カレンダーに追加</a>', unsafe_allow_html=True)
+
+        # 施設表示（リンク付きならリンク）
+        if facility_url:
+            st.markdown(f'**施設:** <a href="{facility_url}" target="_blank" style="color: #1f77b4;">{r["facility"]} </a>', unsafe_allow_html=True)
+        else:
+            st.markdown(f"**施設:** {r['facility']}")
+        # 住所表示
+        if facility_address:
+            map_url = f"https://www.google.com/maps/search/?api=1&query={quote(facility_address)}"
+            st.markdown(f'**住所:** <a href="{map_url}" target="_blank" style="color: #1f77b4;">{facility_address}</a>', unsafe_allow_html=True)
+        # コート種類表示
+        ct_val = r.get('court_type')
+        if ct_val:
+            st.markdown(f"**コート種類:** {ct_val}")
+        # 定員表示
+        capacity_display = safe_int(r.get('capacity'), default=None)
+        if capacity_display is None:
+            capacity_text = "指定なし"
+        else:
+            participants_count = len([p for p in r.get('participants', []) if p])
+            capacity_text = f"{capacity_display}名（参加者{participants_count}名）"
+        st.markdown(f"**定員:** {capacity_text}")
+        
+        # 参加者と保留を統合して表示
+        parts = []
+        participants = r.get('participants') if isinstance(r.get('participants'), list) else []
+        consider = r.get('consider') if isinstance(r.get('consider'), list) else []
+        if participants:
+            parts.append(", ".join([str(x) for x in participants if str(x).strip()]))
+        if consider:
+            parts.append(f"(保留 {', '.join([str(x) for x in consider if str(x).strip()])})")
+        participants_text = " ".join([p for p in parts if p]).strip()
+        st.markdown(f"**参加者:** {participants_text if participants_text else 'なし'}")
+        waitlist = r.get('waitlist') if isinstance(r.get('waitlist'), list) else []
+        if waitlist:
+            st.markdown(f"**キャンセル待ち:** {', '.join(f'{i}. {name}' for i, name in enumerate(waitlist, 1))}")
+
+        # ステータス
+        st.markdown(f"**ステータス:** {r['status']}")
+
+        # メモ
+        st.markdown(f"**メモ:**\n{display_msg}")
+        
+        st.markdown('<div style="margin-top: -20px;"></div>', unsafe_allow_html=True)
+        st.divider()
+
+        st.subheader("参加表明")
+        signup_result = st.session_state.pop('edit_signup_result', None)
+        if signup_result:
+            st.success(signup_result)
+        col_nick, col_type = st.columns([1, 1])
+        with col_nick:
+            nick, is_new_name = render_name_picker("edit")
+        with col_type:
+            part_type = st.radio("区分", ["参加", "保留", "削除"], horizontal=True, key="edit_type")
+
+        col_upd, col_close_main = st.columns([1, 1])
+        with col_upd:
+            if st.button("反映する", type="primary", use_container_width=True):
+                if not nick:
+                    st.warning("名前を選択してください")
+                else:
+                    # 定員チェック・キャンセル待ちの繰り上げ・「締切」⇔「募集中」の自動切り替えは最新の予約データで判定する
+                    saved, waitlisted, promoted = submit_participation([idx], nick, part_type, new_member=is_new_name)
+                    if waitlisted:
+                        st.session_state['edit_signup_result'] = "定員に達しているため、キャンセル待ちにしました（空きが出たら申し込んだ順に参加になります）"
+                    elif saved:
+                        st.session_state['edit_signup_result'] = "反映しました" + (
+                            "（キャンセル待ちの " + "、".join(name for _, name in promoted) + " さんが参加になりました）" if promoted else ""
+                        )
+                    if saved:
+                        rerun_dialog()
+        with col_close_main:
+            if st.button("閉じる", use_container_width=True):
+                st.session_state['is_popup_open'] = False
+                # ▼この3つがあれば完璧です
+                st.session_state['last_click_signature'] = None  # カレンダーの同日再クリック用
+                st.session_state['active_event_idx'] = None      # リストの再クリック用
+                st.session_state['list_reset_counter'] += 1      # リストの見た目リセット用
+
+                st.rerun()
+
+        with st.expander("イベント編集・削除"):
+            edit_tab, delete_tab = st.tabs(["編集", "削除"])
+            with edit_tab:
+                new_msg = st.text_area("メモの編集", value=r.get("message", "").replace('<br>', '\n'))
+                # コート種類編集
+                new_court = st.selectbox("コート種類", options=COURT_TYPES, index=COURT_TYPES.index(r.get('court_type')) if r.get('court_type') in COURT_TYPES else 0)
+                
+                # 現在の参加者数を取得（ステータス制御用）
+                current_participants = r.get('participants', [])
+                participants_count = len([p for p in current_participants if p])
+                current_capacity = safe_int(r.get('capacity'), default=None)
+                
+                # ステータス選択肢を制限
+                status_options = ["募集中", "締切", "抽選中", "中止", "完了"]
+                current_status = r['status']
+                
+                # 定員に達している場合、募集中は選べない
+                if current_capacity is not None and participants_count >= current_capacity:
+                    if "募集中" in status_options and current_status != "募集中":
+                        status_options.remove("募集中")
+                
+                current_status_index = status_options.index(current_status) if current_status in status_options else 0
+                new_status = st.selectbox("ステータスの変更", status_options, index=current_status_index)
+                
+                # 定員編集（参加人数より少ない値は設定不可）
+                capacity_options = ["指定なし"]
+                if participants_count > 0:
+                    capacity_options += [str(i) for i in range(participants_count, 31)]
+                else:
+                    capacity_options += [str(i) for i in range(1, 31)]
+                
+                current_capacity_index = 0
+                if current_capacity is not None:
+                    if str(current_capacity) in capacity_options:
+                        current_capacity_index = capacity_options.index(str(current_capacity))
+                    elif current_capacity < participants_count:
+                        # 現在の定員が参加人数より少ない場合は、参加人数を選択肢に追加
+                        capacity_options = ["指定なし"] + [str(i) for i in range(participants_count, 31)]
+                        current_capacity_index = capacity_options.index(str(current_capacity)) if str(current_capacity) in capacity_options else 0
+                
+                # 定員に関する補足情報（初期メッセージ削除。エラー時のみ表示）
+                
+                capacity_selected = st.selectbox("定員", options=capacity_options, index=current_capacity_index)
+                new_capacity = None if capacity_selected == "指定なし" else int(capacity_selected)
+                
+                if st.button("内容を更新", use_container_width=True):
+                    # 最終チェック
+                    if new_capacity is not None and participants_count > new_capacity:
+                        st.error(f"⚠️ 定員は現在の参加者数（{participants_count}名）以上に設定してください")
+                    else:
+                        current_df = load_reservations()
+                        current_df.at[idx, "message"] = new_msg.replace('\n', '<br>')
+                        current_df.at[idx, "status"] = new_status
+                        current_df.at[idx, "capacity"] = new_capacity
+                        current_df.at[idx, "court_type"] = new_court
+                        save_reservations(current_df)
+                        # 定員を増やして空いた席にキャンセル待ちを繰り上げる（予約IDで渡す）
+                        promote_waitlist([reservation_ids(current_df.loc[[idx]]).iloc[0]])
+                        st.success("更新しました")
+                        rerun_dialog()
+
+            with delete_tab:
+                st.warning("本当に削除しますか？")
+                if st.button("削除実行", type="primary", use_container_width=True):
+                    current_df = load_reservations()
+                    current_df = current_df.drop(idx).reset_index(drop=True)
+                    save_reservations(current_df)
+                    st.session_state['show_success_message'] = '削除しました'
+                    st.session_state['is_popup_open'] = False
+                    st.session_state['last_click_signature'] = None
+                    st.session_state['active_event_idx'] = None
+                    st.session_state['list_reset_counter'] += 1
+                    st.rerun()
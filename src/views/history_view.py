@@ -0,0 +1,82 @@
+"""管理者向け: 予約データの変更履歴（ある時点の内容の表示・1つの予約を過去の版に戻す）"""
+import streamlit as st
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+
+import history
+from data_access import restore_reservation
+
+JST = timezone(timedelta(hours=9))
+# 変更の一覧に表示する件数
+TIMELINE_ROWS = 50
+
+
+def _format_ts(ts):
+    return datetime.fromtimestamp(ts / 1000, JST).strftime("%Y-%m-%d %H:%M:%S")
+
+def _reservation_label(header, row, key):
+    """予約キー（予約ID）の表示名（日付・開始時刻・施設名。同じ日時・施設の予約と区別できるよう予約IDの先頭を添える）"""
+    values = dict(zip(header, row))
+    try:
+        label = f"{values.get('date', '')} {int(values.get('start_hour') or 0):02d}:{int(values.get('start_minute') or 0):02d} {values.get('facility', '')}"
+    except ValueError:
+        return key
+    return key if key.startswith(label) else f"{label}（{key[:8]}）"
+
+def render_history_panel():
+    """変更の一覧・ある時点の予約データ・予約ごとの版を表示するパネル"""
+    with st.expander("🕘 変更履歴", expanded=False):
+        entries = history.timeline()
+        if not entries:
+            st.caption("まだ変更履歴がありません（次に予約を保存したときから記録します）")
+            return
+
+        # --- 変更の一覧 ---
+        st.caption(f"変更の一覧（新しい順・最大{TIMELINE_ROWS}件）")
+        st.dataframe(
+            pd.DataFrame([{
+                "日時": _format_ts(e["ts"]),
+                "変更元": e["source"],
+                "変更行数": e["changed"],
+                "全件保存": "✓" if e["snapshot"] else "",
+            } for e in entries[:TIMELINE_ROWS]]),
+            hide_index=True, use_container_width=True,
+        )
+
+        # --- ある時点の内容 ---
+        st.caption("ある時点の予約データ")
+        now = datetime.now(JST)
+        col_date, col_time = st.columns(2)
+        with col_date:
+            day = st.date_input("日付", value=now.date(), key="history_day")
+        with col_time:
+            at = st.time_input("時刻", value=now.time().replace(second=0, microsecond=0), key="history_time", step=60)
+        point = datetime.combine(day, at, tzinfo=JST) + timedelta(seconds=59)
+        header, rows = history.state_at(int(point.timestamp() * 1000))
+        if rows is None:
+            st.info("この時点より前の履歴はありません")
+            return
+        st.dataframe(pd.DataFrame(list(rows.values()), columns=header), hide_index=True, use_container_width=True)
+
+        # --- 予約ごとの版 ---
+        names = {key: _reservation_label(header, row, key) for key, row in rows.items()}
+        key = st.selectbox("予約", sorted(rows, key=names.get), format_func=names.get, index=None, placeholder="予約を選ぶと変更の履歴を表示します", key="history_key")
+        if key is None:
+            return
+        versions = history.versions(key)
+        labels = [f"{i + 1}. {_format_ts(ts)}{'（削除）' if row is None else ''}" for i, (ts, _, row) in enumerate(versions)]
+        chosen = st.radio("版", range(len(versions)), index=len(versions) - 1, format_func=lambda i: labels[i], key="history_version")
+        _, version_header, version_row = versions[chosen]
+        if version_row is None:
+            st.caption("この時点では削除されています")
+        else:
+            st.dataframe(pd.DataFrame([version_row], columns=version_header), hide_index=True, use_container_width=True)
+
+        if st.button("この内容に戻す", type="primary", key="history_restore"):
+            try:
+                restore_reservation(key, version_header, version_row)
+            except Exception as e:
+                st.error(f"戻せませんでした: {e}")
+                return
+            st.session_state['show_success_message'] = f"{names[key]} を {labels[chosen]} の内容に戻しました"
+            st.rerun()
@@ -0,0 +1,156 @@
+"""一覧（予約リスト）画面"""
+import streamlit as st
+import pandas as pd
+
+import perf
+from app_common import safe_int, jst_today
+from data_access import load_reservations_for_view, search_reservations
+from views.bulk_signup_view import render_bulk_signup
+
+
+def format_reservation_list(df_res, show_past=False):
+    """
+    予約データを一覧表示用の表に整形する
+
+    Args:
+        df_res: 予約データ
+        show_past: Trueなら過去の予約も含める
+
+    Returns:
+        DataFrame: 表示用カラムのみの表（元のインデックスを保持、日時順）
+    """
+    # 列データは複製しない（追加・変更した列だけが Copy-on-Write で複製される）
+    df_list = df_res.copy(deep=False)
+    if not show_past:
+        today_jst = jst_today()
+        df_list = df_list[df_list['date'] >= today_jst]
+
+    def format_time_range(r):
+        sh = int(safe_int(r.get('start_hour')))
+        sm = int(safe_int(r.get('start_minute')))
+        eh = int(safe_int(r.get('end_hour')))
+        em = int(safe_int(r.get('end_minute')))
+        return f"{sh:02}:{sm:02} - {eh:02}:{em:02}"
+    
+    df_list['時間'] = df_list.apply(format_time_range, axis=1)
+    
+    # 参加者と保留を統合して表示
+    def format_participants_with_consider(row):
+        parts = []
+        participants = row['participants'] if isinstance(row['participants'], list) else []
+        consider = row['consider'] if isinstance(row['consider'], list) else []
+        waitlist = row.get('waitlist') if isinstance(row.get('waitlist'), list) else []
+        
+        if participants:
+            parts.append(", ".join(participants))
+        if consider:
+            parts.append(f"(保留 {', '.join(consider)})")
+        if waitlist:
+            parts.append(f"(キャンセル待ち {len(waitlist)}人)")
+        
+        return " ".join(parts) if parts else ""
+    
+    df_list['参加者'] = df_list.apply(format_participants_with_consider, axis=1)
+    
+    # メモ欄の<br>をスペースに変換
+    df_list['message'] = df_list['message'].apply(lambda x: str(x).replace('<br>', ' ') if pd.notna(x) else '')
+
+    # 日付 + 曜日（Arrow の date 列を1件ずつ Python の date に戻さず、列ごとに文字列化する）
+    weekdays = pd.Series(["(月)", "(火)", "(水)", "(木)", "(金)", "(土)", "(日)"])
+    dates = pd.to_datetime(df_list['date'], errors='coerce')
+    df_list['日付'] = (
+        dates.dt.strftime('%Y-%m-%d') + " " + dates.dt.weekday.map(weekdays)
+    ).fillna('')
+    df_list['日時'] = df_list['日付'] + " " + df_list['時間']
+    df_list['施設名'] = df_list['facility']
+    df_list['コート種類'] = df_list['court_type'].fillna('')
+    df_list['ステータス'] = df_list['status']
+    # 定員表示（リスト用簡易版）
+    def format_capacity_for_list(cap):
+        if cap is None or pd.isna(cap) or cap == "":
+            return "指定なし"
+        try:
+            return f"{int(cap)}名"
+        except Exception:
+            return "指定なし"
+    df_list['定員'] = df_list['capacity'].apply(format_capacity_for_list)
+    df_list['メモ'] = df_list['message']
+    
+    display_cols = ['日時', '施設名', 'コート種類', 'ステータス', '定員', '参加者', 'メモ']
+
+    df_display = df_list[display_cols]
+    if '日時' in df_display.columns:
+        df_display = df_display.sort_values('日時', ascending=True)
+    return df_display
+
+
+@st.fragment
+def render_list_view():
+    """予約リスト表示（チェックボックス操作はこのフラグメント内だけで再実行される）"""
+    df_res = load_reservations_for_view()
+    # 起動直後のスナップショット表示中は検索インデックスを作らない（最新データに差し替えた後で検索できる）
+    query = st.text_input(
+        "検索", key="list_search", placeholder="施設名・コート種類・メモ・参加者（過去の予約も含む）",
+        disabled=bool(st.session_state.get('rendered_from_snapshot')),
+    ).strip()
+    show_past = st.checkbox("過去の予約も表示する", value=False, key="filter_show_past", disabled=bool(query))
+    # まとめて参加表明: 行を複数選べるようにし、選んでもポップアップは開かない
+    bulk_mode = st.toggle("まとめて参加表明", key="list_bulk_mode")
+
+    if df_res.empty:
+        st.info("表示できる予約データがありません。")
+        return
+
+    if query:
+        with perf.span("list.search"):
+            hits = [i for i in search_reservations(query) if i in df_res.index]
+        if not hits:
+            st.info(f"「{query}」に一致する予約はありません。")
+            return
+        st.caption(f"{len(hits)}件（一致度の高い順）")
+        with perf.span("list.format"):
+            df_display = format_reservation_list(df_res.loc[hits], show_past=True).loc[hits]
+    else:
+        with perf.span("list.format"):
+            df_display = format_reservation_list(df_res, show_past)
+
+    table_key = f"reservation_list_table_{st.session_state['list_reset_counter']}{'_bulk' if bulk_mode else ''}"
+
+    with perf.span("list.render"):
+        event_selection = st.dataframe(
+            df_display,
+            use_container_width=True,
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="multi-row" if bulk_mode else "single-row",
+            key=table_key,
+            height="auto",
+            column_config={
+                "日時": st.column_config.TextColumn("日時", width="medium"),
+                "施設名": st.column_config.TextColumn("施設名", width="medium"),
+                "コート種類": st.column_config.TextColumn("コート種類", width="small"),
+                "ステータス": st.column_config.TextColumn("ステータス", width="small"),
+                "定員": st.column_config.TextColumn("定員", width="small"),
+                "参加者": st.column_config.TextColumn("参加者", width="large"),
+                "メモ": st.column_config.TextColumn("メモ", width="large"),
+            }
+        )
+    
+    if bulk_mode:
+        render_bulk_signup(df_res, [df_display.index[i] for i in event_selection.selection.rows], key_prefix="list_bulk")
+        return
+
+    if len(event_selection.selection.rows) > 0:
+        selected_row_idx = event_selection.selection.rows[0]
+        actual_idx = df_display.index[selected_row_idx]
+        
+        # リストで選択が変わった時
+        if st.session_state.get('active_event_idx') != actual_idx:
+            st.session_state['active_event_idx'] = actual_idx
+            target_date = df_res.loc[actual_idx]["date"]
+            st.session_state['clicked_date'] = str(target_date)
+            
+            # ポップアップON（アプリ全体の再実行で開く）
+            st.session_state['is_popup_open'] = True
+            st.session_state['popup_mode'] = "edit"
+            st.rerun()
@@ -0,0 +1,27 @@
+"""参加表明の名前選択（メンバー名簿からの絞り込み + 新規入力）"""
+import streamlit as st
+
+from data_access import load_member_index, MEMBER_OPTIONS_LIMIT
+
+
+def render_name_picker(key_prefix):
+    """
+    名前を選ぶ欄を表示する
+
+    候補はメンバー名簿の前方一致インデックスから引く（予約データは走査しない）。
+
+    Args:
+        key_prefix: ウィジェットのキーの接頭辞（<prefix>_nick_query / <prefix>_nick / <prefix>_nick_input）
+
+    Returns:
+        tuple: (名前（未選択は ""）, 新規入力かどうか)
+    """
+    member_index = load_member_index()
+    query = st.text_input("名前で絞り込み", key=f"{key_prefix}_nick_query", placeholder="先頭の文字（ひらがな・カタカナどちらでも）")
+    nick_options = member_index.lookup(query, limit=MEMBER_OPTIONS_LIMIT)
+    nick_choice = st.selectbox("名前", options=["(選択)"] + nick_options + ["新規入力"], key=f"{key_prefix}_nick")
+    if nick_choice != "新規入力":
+        return (nick_choice if nick_choice != "(選択)" else ""), False
+    nick = st.text_input("名前を入力", key=f"{key_prefix}_nick_input").strip()
+    # 名簿の名前・別名と表記ゆれの範囲で一致すれば、名簿の名前にそろえる
+    return (member_index.canonical(nick) or nick) if nick else "", True
@@ -0,0 +1,366 @@
+"""実績（練習回数・時間の集計）画面"""
+import calendar
+import streamlit as st
+import pandas as pd
+from datetime import datetime, date
+from datetime import time as dt_time
+
+import perf
+import change_feed
+from app_common import safe_int, jst_today
+from data_access import load_reservations_for_view, reservations_generation
+from member_stats import load_member_stats, member_leaderboard, member_monthly
+
+
+def prepare_stats_frame(df_res):
+    """集計用に練習時間（duration_hours）と年月（year_month）を付与する"""
+    # 列データは複製しない（追加した列だけを持つ）
+    df_stats = df_res.copy(deep=False)
+    
+    # 期間計算: 開始と終了をdatetimeに変換
+    def compute_duration_hours(row):
+        try:
+            sh = int(safe_int(row.get('start_hour')))
+            sm = int(safe_int(row.get('start_minute')))
+            eh = int(safe_int(row.get('end_hour')))
+            em = int(safe_int(row.get('end_minute')))
+            start = datetime.combine(row['date'], dt_time(sh, sm))
+            end = datetime.combine(row['date'], dt_time(eh, em))
+            diff = end - start
+            return diff.total_seconds() / 3600.0
+        except Exception:
+            return 0.0
+    
+    df_stats['duration_hours'] = df_stats.apply(compute_duration_hours, axis=1)
+    df_stats['year_month'] = df_stats['date'].apply(lambda d: d.strftime('%Y/%m'))
+    return df_stats
+
+
+def summarize_practice(df_stats, selected_person, start_date, end_date):
+    """
+    月別・コート種別の練習回数／練習時間を集計する
+
+    Args:
+        df_stats: prepare_stats_frame() 済みの予約データ
+        selected_person: "全体" または個人名
+        start_date: 集計開始日
+        end_date: 集計終了日
+
+    Returns:
+        DataFrame: year_month, court_type, events_count, total_hours
+            （該当データがない場合は空）
+    """
+    # 実績フィルタ: 完了ステータスのみをカウント（参加者として含まれている場合）
+    df_filtered = df_stats[df_stats['status'] == '完了']
+    
+    # 個人フィルタ
+    if selected_person != "全体":
+        df_filtered = df_filtered[
+            df_filtered['participants'].apply(
+                lambda x: selected_person in x if isinstance(x, list) else False
+            )
+        ]
+    
+    # 期間フィルタ
+    df_filtered = df_filtered[(df_filtered['date'] >= start_date) & (df_filtered['date'] <= end_date)]
+    if df_filtered.empty:
+        return pd.DataFrame(columns=['year_month', 'court_type', 'events_count', 'total_hours'])
+
+    # グループ化（月別・コート種別集計）
+    summary_by_court = df_filtered.groupby(['year_month', 'court_type']).agg(
+        events_count=('date', 'count'),
+        total_hours=('duration_hours', 'sum')
+    ).reset_index()
+    summary_by_court['total_hours'] = summary_by_court['total_hours'].round(2)
+    return fill_month_axis(summary_by_court, start_date, end_date)
+
+
+def fill_month_axis(summary_by_court, start_date, end_date):
+    """
+    start_date〜end_date のすべての月を軸にし、足りない月×コート種類をゼロで埋める
+
+    Args:
+        summary_by_court: year_month, court_type, events_count, total_hours
+
+    Returns:
+        DataFrame: 同じ列（該当データがない場合は空）
+    """
+    if summary_by_court.empty:
+        return pd.DataFrame(columns=['year_month', 'court_type', 'events_count', 'total_hours'])
+
+    # 全月を軸とする：start_dateからend_dateまでのすべての月を生成
+    all_year_months = pd.period_range(start_date, end_date, freq='M').strftime('%Y/%m').tolist()
+    all_court_types = sorted(summary_by_court['court_type'].dropna().unique())
+
+    # 全体と同じ軸を使用するため、足りない月×コート種類をゼロで埋める
+    all_combinations = pd.MultiIndex.from_product(
+        [all_year_months, all_court_types],
+        names=['year_month', 'court_type']
+    ).to_frame(index=False)
+    summary_by_court = all_combinations.merge(
+        summary_by_court,
+        on=['year_month', 'court_type'],
+        how='left'
+    )
+    summary_by_court['events_count'] = summary_by_court['events_count'].fillna(0).astype(int)
+    summary_by_court['total_hours'] = summary_by_court['total_hours'].fillna(0).round(2)
+    
+    return summary_by_court.sort_values('year_month')
+
+
+def stats_data_revision():
+    """
+    集計・グラフのキャッシュのキー（予約データの世代と変更通知のリビジョン）
+
+    スナップショットでの先行描画中は "snapshot"。
+    """
+    if st.session_state.get('rendered_from_snapshot'):
+        return "snapshot"
+    return (reservations_generation(), change_feed.current_revision())
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _stats_frame(data_revision, _df_res):
+    """prepare_stats_frame() の結果（データの世代ごとに1回だけ作り、全セッションで共有する）"""
+    return prepare_stats_frame(_df_res)
+
+
+@perf.cache_counter("stats_summary")
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_practice_summary(selected_person, start_date, end_date, data_revision, _df_res):
+    """
+    summarize_practice() の結果（表示対象・期間・データの世代ごとにキャッシュ）
+
+    Args:
+        data_revision: stats_data_revision()
+        _df_res: data_revision の時点の予約データ（キャッシュのキーには含めない）
+    """
+    perf.mark_cache_miss()
+    return summarize_practice(_stats_frame(data_revision, _df_res), selected_person, start_date, end_date)
+
+
+# 棒グラフ（値の列, タイトル, 縦軸ラベル）
+STATS_CHARTS = [
+    ('events_count', '月別練習回数', '練習回数（回）'),
+    ('total_hours', '月別練習時間', '練習時間（時間）'),
+]
+# コート種類ごとの色
+COURT_COLOR_MAP = {
+    '不明': '#808080',  # グレー
+    'ハード': '#0066FF',  # 青
+    'オムニ': '#00AA00',  # 緑
+    'クレー': '#FF8800'  # オレンジ
+}
+
+
+@perf.cache_counter("stats_figures")
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_stats_figures(selected_person, start_date, end_date, data_revision, _summary_by_court):
+    """
+    月別練習回数・時間の棒グラフ（コート種別で色分け・積み上げ）
+
+    _summary_by_court は 表示対象・期間・データの世代 から決まるため、キャッシュのキーには含めない。
+
+    Args:
+        data_revision: stats_data_revision()
+        _summary_by_court: summarize_practice() の結果
+
+    Returns:
+        list[dict]: Plotly の図（dict 形式）
+    """
+    import plotly.express as px
+    perf.mark_cache_miss()
+
+    figures = []
+    for value_col, title, y_label in STATS_CHARTS:
+        fig = px.bar(
+            _summary_by_court,
+            x='year_month',
+            y=value_col,
+            color='court_type',
+            title=f'{title} - {selected_person}',
+            labels={'year_month': '', value_col: y_label, 'court_type': 'コート種類'},
+            text=value_col,
+            barmode='stack',
+            color_discrete_map=COURT_COLOR_MAP
+        )
+        fig.update_traces(textposition='inside', texttemplate='%{text:.0f}', textangle=0, textfont=dict(color='white', size=14))
+        fig.update_layout(
+            yaxis_title=y_label,
+            xaxis_tickangle=90,
+            height=500,
+            margin=dict(b=120, l=80, r=80, t=100),
+            hovermode='x unified',
+            legend=dict(
+                orientation='h',
+                yanchor='bottom',
+                y=1.02,
+                xanchor='center',
+                x=0.5,
+                title_text=''
+            )
+        )
+        figures.append(fig.to_dict())
+    return figures
+
+
+def build_stats_vega_spec(value_col, title, y_label, court_types):
+    """
+    軽量表示用の棒グラフ（Vega-Lite。Plotly と同じ積み上げ・色分けで、操作はできない）
+
+    Args:
+        court_types: 表示するコート種類（色の割り当て用）
+
+    Returns:
+        dict: Vega-Lite の spec（データは st.vega_lite_chart に渡す）
+    """
+    courts = sorted(court_types)
+    return {
+        'title': title,
+        'height': 400,
+        'encoding': {
+            'x': {'field': 'year_month', 'type': 'ordinal', 'title': None, 'axis': {'labelAngle': -90}},
+            'y': {'field': value_col, 'type': 'quantitative', 'title': y_label, 'stack': 'zero'},
+        },
+        'layer': [
+            {
+                'mark': 'bar',
+                'encoding': {
+                    'color': {
+                        'field': 'court_type', 'type': 'nominal', 'title': None,
+                        'scale': {'domain': courts, 'range': [COURT_COLOR_MAP.get(c, '#9467BD') for c in courts]},
+                        'legend': {'orient': 'top'},
+                    },
+                },
+            },
+            {
+                # 0 のラベルは表示しない
+                'transform': [{'filter': f'datum.{value_col} > 0'}],
+                'mark': {'type': 'text', 'color': 'white', 'baseline': 'top', 'dy': 4},
+                'encoding': {
+                    'text': {'field': value_col, 'type': 'quantitative', 'format': '.0f'},
+                    'detail': {'field': 'court_type'},
+                },
+            },
+        ],
+        'config': {'view': {'stroke': None}},
+    }
+
+
+def render_leaderboard(board):
+    """参加回数のランキング"""
+    if board.empty:
+        return
+    st.markdown("#### 参加ランキング")
+    st.dataframe(
+        board[['member', 'attended', 'hours', 'conversion_rate', 'no_shows', 'current_streak', 'longest_streak']],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'member': '名前',
+            'attended': st.column_config.NumberColumn('参加回数', format='%d回'),
+            'hours': st.column_config.NumberColumn('練習時間', format='%.1f時間'),
+            'conversion_rate': st.column_config.NumberColumn('保留→参加', format='percent'),
+            'no_shows': st.column_config.NumberColumn('欠席', format='%d回'),
+            'current_streak': st.column_config.NumberColumn('連続参加', format='%dか月'),
+            'longest_streak': st.column_config.NumberColumn('最長連続', format='%dか月'),
+        },
+    )
+
+
+def render_member_summary(row):
+    """個人の参加回数・時間・保留→参加・欠席・連続参加"""
+    if row.empty:
+        return
+    r = row.iloc[0]
+    cols = st.columns(5)
+    cols[0].metric("参加回数", f"{int(r['attended'])}回")
+    cols[1].metric("練習時間", f"{r['hours']:.1f}時間")
+    cols[2].metric("保留→参加", f"{int(r['converted'])}回")
+    cols[3].metric("欠席", f"{int(r['no_shows'])}回")
+    cols[4].metric("連続参加", f"{int(r['current_streak'])}か月", help=f"最長 {int(r['longest_streak'])}か月")
+
+
+@st.fragment
+def render_stats_view():
+    """実績確認（表示対象・期間の変更はこのフラグメント内だけで再実行される）"""
+    df_res = load_reservations_for_view()
+    if df_res.empty:
+        st.info("予約データがありません")
+        return
+
+    # 期間選択（デフォルト: 全期間だが終了日は今月まで）
+    today = jst_today()  # 日本時刻
+    last_day_of_month = calendar.monthrange(today.year, today.month)[1]
+    default_end_date = date(today.year, today.month, last_day_of_month)
+
+    # メンバー別の集計表（スナップショットでの先行描画中は使わない）
+    member_table = None
+    if not st.session_state.get('rendered_from_snapshot'):
+        with perf.span("stats.member_table"):
+            member_table = load_member_stats()
+
+    # フィルタUI（個人選択のみ）
+    if member_table is not None:
+        all_participants = set(member_table.loc[member_table['signed_up'] + member_table['attended'] > 0, 'member'])
+    else:
+        all_participants = set()
+        for participants in df_res['participants']:
+            if isinstance(participants, list):
+                all_participants.update(participants)
+
+    participant_options = ["全体"] + sorted(list(all_participants))
+    selected_person = st.selectbox("表示対象", participant_options, key="stats_person_select")
+
+    min_date = df_res['date'].min()
+    use_date_range = st.checkbox("期間を指定する", value=False, key="stats_use_date_range")
+    if use_date_range:
+        col1, col2 = st.columns(2)
+        max_date = default_end_date  # 今月まで
+        with col1:
+            start_date = st.date_input("開始日", value=min_date, min_value=min_date, max_value=max_date, key="stats_start_date")
+        with col2:
+            end_date = st.date_input("終了日", value=max_date, min_value=min_date, max_value=max_date, key="stats_end_date")
+    else:
+        start_date = min_date
+        end_date = default_end_date  # 今月まで
+
+    data_revision = stats_data_revision()
+    with perf.span("stats.aggregate"):
+        if member_table is not None and selected_person != "全体" and not use_date_range:
+            # 個人の全期間は集計表から作る（予約データを走査しない）
+            summary_by_court = fill_month_axis(member_monthly(member_table, selected_person), start_date, end_date)
+        else:
+            # 生データから月単位の集計を行う（表示対象・期間・データの世代ごとにキャッシュ）
+            summary_by_court = load_practice_summary(selected_person, start_date, end_date, data_revision, df_res)
+
+    # ランキング（全体）／個人の実績
+    if member_table is not None:
+        board = member_leaderboard(member_table, today, start_date.strftime('%Y/%m'), end_date.strftime('%Y/%m'))
+        if selected_person == "全体":
+            render_leaderboard(board)
+        else:
+            render_member_summary(board[board['member'] == selected_person])
+
+    if summary_by_court.empty:
+        st.warning("選択条件に該当するデータがありません")
+        return
+
+    # 棒グラフ表示（図の内容は 表示対象・期間・データの世代 ごとにキャッシュ）
+    st.markdown("---")
+    light_charts = st.toggle("軽量グラフ", value=False, key="stats_light_charts",
+                             help="スマートフォンなどで表示が重い場合に。Plotly を読み込まずに表示します")
+
+    with perf.span("stats.render"):
+        if light_charts:
+            for value_col, title, y_label in STATS_CHARTS:
+                st.vega_lite_chart(
+                    summary_by_court,
+                    build_stats_vega_spec(value_col, f'{title} - {selected_person}', y_label, summary_by_court['court_type'].unique()),
+                    use_container_width=True,
+                )
+        else:
+            with perf.span("stats.figures"):
+                figures = build_stats_figures(selected_person, start_date, end_date, data_revision, summary_by_court)
+            for fig in figures:
+                st.plotly_chart(fig, use_container_width=True, config={'staticPlot': True})
@@ -0,0 +1,291 @@
+"""予約データ処理のベンチマーク（合成データ・メモリ上のシートで計測）
+
+使い方:
+    python tests/benchmark.py                       # 1k / 10k / 100k 行で計測
+    python tests/benchmark.py --sizes 1000 10000    # 行数を指定
+    python tests/benchmark.py --save-baseline tests/benchmark_baseline.json
+    python tests/benchmark.py --compare tests/benchmark_baseline.json
+
+Google Sheets には接続しない（src/memory_sheet.py の MemorySpreadsheet を使う）。
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import platform
+import statistics
+from datetime import date, timedelta
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import streamlit.logger
+
+# Streamlit を実行環境なし（bare mode）で使うため、警告ログを抑える
+streamlit.logger.set_log_level("error")
+
+from memory_sheet import MemorySpreadsheet
+import data_access
+from data_access import load_reservations, save_reservations, check_and_show_reminders
+from views.calendar_view import build_calendar_events
+from views.list_view import format_reservation_list
+from views.stats_view import prepare_stats_frame, summarize_practice
+from member_stats import reservation_contributions, member_leaderboard, member_monthly
+from participation_log import reservation_ids
+from signup import plan_participation, submit_participation
+from bulk_update import select_reservations, plan_bulk_update, submit_bulk_update
+from member_index import MemberIndex, names_from_history
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+# 回帰とみなす倍率（ベースライン比）
+REGRESSION_RATIO = 1.5
+
+FACILITIES = [
+    "大蔵第二運動場", "砧公園", "二子玉川緑地", "世田谷公園", "総合運動場",
+    "羽根木公園", "駒沢オリンピック公園", "有明テニスの森", "井の頭恩賜公園", "昭和記念公園",
+    "代々木公園", "芝公園", "城北中央公園", "舎人公園", "大井ふ頭中央海浜公園",
+]
+COURT_TYPES = ["オムニ", "クレー", "ハード", "インドア", "不明", ""]
+STATUSES = ["完了", "完了", "完了", "募集中", "締切", "抽選中", "中止"]
+NICKNAMES = [
+    "よしたに", "いちば", "のべ", "たなか", "すずき", "さとう", "たかはし", "わたなべ", "いとう", "やまもと",
+    "なかむら", "こばやし", "かとう", "よしだ", "やまだ", "ささき", "やまぐち", "まつもと", "いのうえ", "きむら",
+    "はやし", "しみず", "やまざき", "もり", "あべ", "いけだ", "はしもと", "やました", "いしかわ", "なかじま",
+    "まえだ", "ふじた", "おがわ", "ごとう", "おかだ", "はせがわ", "むらかみ", "こんどう", "いしい", "さいとう",
+    "さかもと", "えんどう", "あおき", "ふじい", "にしむら", "ふくだ", "おおた", "みうら", "ふじわら", "おかもと",
+    "Yossy", "Ken", "Mika", "Taro", "Hana", "Jun", "Aki", "Sho", "Rina", "Dai",
+]
+MESSAGES = ["", "", "", "集合は10分前", "ボール持参<br>雨天中止", "初心者歓迎", "ダブルス中心"]
+
+
+def make_reservations(n, seed=0):
+    """予約シート（ヘッダー付き2次元リスト）を n 行生成する（アプリで保存したシートと同じく id 列あり）"""
+    rng = random.Random(seed)
+    header = [
+        "date", "facility", "court_type", "status", "start_hour", "start_minute",
+        "end_hour", "end_minute", "capacity", "participants", "absent", "consider", "message", "id",
+    ]
+    rows = [header]
+    start = date(2020, 1, 1)
+    span_days = 365 * 7
+    for _ in range(n):
+        d = start + timedelta(days=rng.randrange(span_days))
+        sh = rng.randrange(7, 20)
+        sm = rng.choice([0, 30])
+        duration = rng.choice([60, 90, 120, 120, 180])
+        end_total = min(sh * 60 + sm + duration, 23 * 60 + 30)
+        capacity = rng.choice(["", "", 4, 6, 8, 12])
+        k = rng.randrange(0, 13)
+        if capacity:
+            k = min(k, capacity)
+        members = rng.sample(NICKNAMES, k + rng.randrange(0, 4))
+        participants, rest = members[:k], members[k:]
+        consider = rest[: len(rest) // 2]
+        absent = rest[len(rest) // 2:]
+        rows.append([
+            d.isoformat(), rng.choice(FACILITIES), rng.choice(COURT_TYPES), rng.choice(STATUSES),
+            str(sh), str(sm), str(end_total // 60), str(end_total % 60), str(capacity),
+            ";".join(participants), ";".join(absent), ";".join(consider), rng.choice(MESSAGES),
+            uuid.UUID(int=rng.getrandbits(128)).hex,
+        ])
+    return rows
+
+def make_facilities():
+    rows = [["name", "url", "address"]]
+    for i, name in enumerate(FACILITIES):
+        rows.append([name, f"https://example.com/facility/{i}" if i % 2 == 0 else "", f"東京都世田谷区{i + 1}-1" if i % 3 else ""])
+    return rows
+
+def make_lottery_periods():
+    return [
+        ["id", "title", "enabled", "frequency", "start_month", "start_day", "end_month", "end_day", "weekdays", "messages"],
+        ["1", "月初抽選", "true", "monthly", "", "1", "", "5", "", "抽選申し込み期間です"],
+        ["2", "月末確認", "true", "monthly", "", "25", "", "31", "", "抽選結果を確認してください"],
+        ["3", "週次", "true", "weekly", "", "", "", "", "Mon,Thu", "週次の予約確認"],
+        ["4", "年末", "true", "yearly", "12", "20", "1", "10", "", "年末年始の予約に注意"],
+        ["5", "夏季", "false", "yearly", "7", "1", "8", "31", "", "夏季スケジュール"],
+        ["6", "春季", "yes", "yearly", "3", "1", "4", "30", "", "春季大会エントリー"],
+    ]
+
+
+def timeit(func, repeat):
+    """func を repeat 回実行し、各回の所要時間（ミリ秒）を返す"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+def run_size(n, repeat):
+    spreadsheet = MemorySpreadsheet({
+        "reservations": make_reservations(n),
+        "facilities": make_facilities(),
+        "lottery_periods": make_lottery_periods(),
+    })
+    data_access.use_spreadsheet(spreadsheet)
+    load_reservations.clear()
+    df = load_reservations()
+    df_stats = prepare_stats_frame(df)
+    min_date, max_date = df_stats["date"].min(), df_stats["date"].max()
+
+    def bench_load():
+        load_reservations.clear()
+        load_reservations()
+
+    def bench_stats():
+        summarize_practice(prepare_stats_frame(df), "全体", min_date, max_date)
+        summarize_practice(df_stats, NICKNAMES[0], min_date, max_date)
+
+    def bench_member_stats():
+        table = reservation_contributions(df)
+        member_leaderboard(table, max_date)
+        member_monthly(table, NICKNAMES[0])
+
+    ids = reservation_ids(df)
+    signups = iter(range(len(ids) * 1000))
+
+    def bench_signup():
+        # 参加表明1件の追記と、ログの追記分だけを適用した再読み込み（予約シートは取り直さない）
+        i = next(signups)
+        data_access.append_participations([(ids.iloc[i * 7919 % len(ids)], NICKNAMES[i % len(NICKNAMES)], "参加")])
+        load_reservations()
+
+    member_index = MemberIndex((name, []) for name in names_from_history(df))
+
+    def bench_member_index_build():
+        MemberIndex((name, []) for name in names_from_history(df))
+
+    def bench_member_lookup():
+        # 名前選択の絞り込み（1〜2文字の入力）を名簿の全員分
+        for name in NICKNAMES:
+            member_index.lookup(name[:1], limit=data_access.MEMBER_OPTIONS_LIMIT)
+            member_index.lookup(name[:2], limit=data_access.MEMBER_OPTIONS_LIMIT)
+
+    def bench_search_build():
+        data_access._search_store.clear()
+        data_access.load_search_index()
+
+    def bench_search():
+        # 施設名・名前・メモ・複数語（インデックスは search_index_build で作ったもの）
+        for query in ["砧", "二子玉川", "よしたに", "yos", "雨天", "オムニ 初心者"]:
+            data_access.search_reservations(query)
+
+    def bench_search_after_signup():
+        # 参加表明1件の後の検索（インデックスは参加者が変わった行だけを反映する）
+        bench_signup()
+        data_access.search_reservations("たなか")
+
+    # まとめて参加表明: 1か月分の練習（20件）に1人が参加
+    bulk_rows = list(df.index[::max(1, len(df) // 20)][:20])
+    bulk_members = iter(range(len(ids) * 1000))
+
+    def bench_bulk_signup():
+        submit_participation(bulk_rows, f"bulk{next(bulk_members)}", "参加")
+
+    # 一括変更: 1施設の1年分の抽選中を募集中に（確認用の計算と、保存して読み直すまで）
+    bulk_filters = {"statuses": ["抽選中"], "facilities": [FACILITIES[1]],
+                    "date_from": date(2024, 1, 1), "date_to": date(2024, 12, 31)}
+    bulk_court_types = iter(range(len(ids) * 1000))
+
+    def bench_bulk_update_plan():
+        plan_bulk_update(df, select_reservations(df, **bulk_filters), {"status": "募集中"})
+
+    def bench_bulk_update():
+        # 毎回値が変わるよう、コート種類を入れ替える
+        submit_bulk_update(bulk_filters, {"court_type": COURT_TYPES[next(bulk_court_types) % 2]})
+        load_reservations()
+
+    def bench_reminders():
+        data_access.refresh_reference_data(["lottery_periods"])
+        check_and_show_reminders()
+
+    cases = {
+        "load_reservations": bench_load,
+        # キャッシュ済み（同じ世代）の読み込み。セッション間で共有するスナップショットを返すだけ
+        "load_reservations_cached": load_reservations,
+        "participation_signup": bench_signup,
+        "bulk_signup_plan": lambda: plan_participation(df, bulk_rows, NICKNAMES[0], "参加"),
+        "bulk_signup": bench_bulk_signup,
+        "bulk_update_plan": bench_bulk_update_plan,
+        "bulk_update": bench_bulk_update,
+        "save_reservations": lambda: save_reservations(df),
+        "build_calendar_events": lambda: build_calendar_events(df),
+        "stats_aggregation": bench_stats,
+        "member_stats": bench_member_stats,
+        "list_formatting": lambda: format_reservation_list(df, show_past=True),
+        "check_and_show_reminders": bench_reminders,
+        "member_index_build": bench_member_index_build,
+        "member_lookup": bench_member_lookup,
+        "search_index_build": bench_search_build,
+        "search_query": bench_search,
+        "search_after_signup": bench_search_after_signup,
+    }
+    # 計測の前に読み込んでおく（save_reservations などが予約データのキャッシュを破棄しているため）
+    prepare = {
+        "search_index_build": load_reservations,
+        "search_after_signup": data_access.load_search_index,
+    }
+    results = {}
+    for name, func in cases.items():
+        if name in prepare:
+            prepare[name]()
+        times = timeit(func, repeat)
+        results[name] = {"median_ms": round(statistics.median(times), 2), "min_ms": round(min(times), 2)}
+    data_access.use_spreadsheet(None)
+    return results
+
+def print_results(all_results, baseline=None):
+    print(f"{'case':<28}{'rows':>9}{'median ms':>12}{'min ms':>10}{'vs base':>10}")
+    for size, results in all_results.items():
+        for name, r in results.items():
+            ratio = ""
+            base = (baseline or {}).get(size, {}).get(name)
+            if base and base["median_ms"] > 0:
+                x = r["median_ms"] / base["median_ms"]
+                ratio = f"{x:.2f}x" + (" !" if x > REGRESSION_RATIO else "")
+            print(f"{name:<28}{size:>9}{r['median_ms']:>12.2f}{r['min_ms']:>10.2f}{ratio:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3, help="1ケースあたりの実行回数（10万行以上は1回）")
+    parser.add_argument("--save-baseline", metavar="PATH", help="結果をベースラインとしてJSON保存する")
+    parser.add_argument("--compare", metavar="PATH", help="ベースラインと比較し、回帰があれば終了コード1")
+    args = parser.parse_args()
+
+    all_results = {}
+    for n in args.sizes:
+        repeat = 1 if n >= 100_000 else args.repeat
+        all_results[str(n)] = run_size(n, repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_results(all_results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": all_results,
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+    if baseline:
+        regressions = [
+            (size, name) for size, results in all_results.items() for name, r in results.items()
+            if baseline.get(size, {}).get(name, {}).get("median_ms", 0) > 0
+            and r["median_ms"] / baseline[size][name]["median_ms"] > REGRESSION_RATIO
+        ]
+        if regressions:
+            print(f"regressions (> {REGRESSION_RATIO}x): {regressions}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""pytest の共通設定（src/ のモジュールを import できるようにする・予約データの組み立て）
+
+使い方:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import streamlit.logger
+
+# Streamlit を実行環境なし（bare mode）で使うため、警告ログを抑える
+streamlit.logger.set_log_level("error")
+
+# 予約シートのヘッダー
+RESERVATION_HEADER = [
+    "date", "facility", "court_type", "status", "start_hour", "start_minute", "end_hour", "end_minute",
+    "capacity", "participants", "absent", "consider", "message", "id", "waitlist",
+]
+
+
+def reservation_row(day="2025-04-01", facility="大蔵運動場", court_type="オムニ", status="募集中",
+                    start=(9, 0), end=(11, 0), capacity="", participants=(), absent=(), consider=(),
+                    message="", rid="", waitlist=()):
+    """予約シートの1行（参加者リストは ";" 区切りの文字列にする）"""
+    return [
+        day, facility, court_type, status, str(start[0]), str(start[1]), str(end[0]), str(end[1]),
+        str(capacity), ";".join(participants), ";".join(absent), ";".join(consider), message, rid, ";".join(waitlist),
+    ]
+
+
+@pytest.fixture
+def make_reservations():
+    """予約シートの行（reservation_row() のキーワード引数の dict）のリスト → 予約データ"""
+    from data_access import parse_reservation_values
+
+    def make(*rows):
+        return parse_reservation_values([RESERVATION_HEADER] + [reservation_row(**row) for row in rows])
+    return make
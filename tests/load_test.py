@@ -0,0 +1,396 @@
+"""同時アクセスの負荷試験（AppTest で複数セッションを並行実行・メモリ上のシート）
+
+抽選結果の発表直後のように、多数のメンバーが同時にアプリを開いて参加表明する状況を再現する。
+各セッションは src/tennis_app.py を AppTest で実行し、表示モードの切り替え・予約ポップアップを開く・
+参加表明（参加 / 保留 / 削除）・メモの編集をランダムに繰り返す。全セッションは1つのプロセスで動くため、
+キャッシュ・変更通知・バックグラウンドスレッドは本番の1サーバーと同じく共有される。
+
+使い方:
+    python tests/load_test.py                                  # 10セッション × 10操作、予約2000行
+    python tests/load_test.py --sessions 30 --actions 40 --rows 10000
+    python tests/load_test.py --think-ms 500 --json load_test.json
+
+結果:
+    再実行の待ち時間: 操作の種類ごとの p50 / p90 / p99 / 最大（AppTest.run() の所要時間）
+    シートAPI呼び出し: セッションごと（再実行の計測の sheets.* スパン）と、プロセス全体（バックグラウンド処理を含む）
+    更新の消失: 各セッションが最後に反映した参加表明・メモのうち、終了後にシートから読み直した内容に残っていない件数
+    メモリ: 実行前後の RSS
+
+アプリの例外・タイムアウトがあれば終了コード1。
+Google Sheets には接続しない（src/memory_sheet.py の MemorySpreadsheet を使う）。
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TESTS_DIR, "..", "src")
+APP_PATH = os.path.join(SRC_DIR, "tennis_app.py")
+sys.path.insert(0, SRC_DIR)
+
+import streamlit as st
+import streamlit.logger
+
+# Streamlit を実行環境なし（bare mode）で使うため、警告ログを抑える
+streamlit.logger.set_log_level("error")
+# 再実行ごとの目標超過の警告は、結果の待ち時間の表で見る
+logging.getLogger().setLevel(logging.ERROR)
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test as app_test_module
+from streamlit.testing.v1.util import patch_config_options
+
+import perf
+import calendar_feed
+import data_access
+from memory_sheet import MemorySpreadsheet
+from data_access import load_reservations
+from participation_log import STATUS_COLUMNS, reservation_ids
+from benchmark import make_reservations, make_facilities, make_lottery_periods
+
+DEFAULT_SESSIONS = 10
+DEFAULT_ACTIONS = 10
+DEFAULT_ROWS = 2_000
+# 全セッションが参加表明する予約の数（抽選に当たった数件に集中する想定）
+HOT_RESERVATIONS = 5
+# 操作の選ばれやすさ
+ACTION_WEIGHTS = {"view": 4, "signup": 4, "memo": 1}
+VIEW_MODES = ["予定", "一覧", "実績"]
+SIGNUP_TYPES = ["参加", "保留", "削除"]
+# 1回の再実行の上限（秒）。超えたらタイムアウトとして数える
+RUN_TIMEOUT_SEC = 60
+PERCENTILES = [50, 90, 99]
+# セッションのAPI呼び出しとして数えないスパン（認証待ち・リトライの待機）
+NON_API_SPANS = {"sheets.auth_wait", "sheets.backoff"}
+
+
+def _rss_mb():
+    """現在のプロセスの RSS（MB）。/proc が無い環境では最大 RSS"""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 1) for p in PERCENTILES}
+    result["max"] = round(ordered[-1], 1)
+    return result
+
+class _KeepFirstRuntime(type):
+    """AppTest が設定する Runtime._instance のうち最初のものだけを本物の Runtime に設定し、以後の差し替え・解除は無視する"""
+    def __setattr__(cls, name, value):
+        if name != "_instance":
+            super().__setattr__(name, value)
+        elif value is not None and Runtime._instance is None:
+            Runtime._instance = value
+
+class _SharedRuntime(Runtime, metaclass=_KeepFirstRuntime):
+    pass
+
+@contextmanager
+def concurrent_app_tests(sheet_id):
+    """
+    複数の AppTest を別々のスレッドで同時に実行できるようにする
+
+    AppTest は実行のたびに、プロセス全体で1つの値（Runtime のインスタンス・st.secrets・
+    global.appTest の設定）を差し替えて、終わると元に戻す。並行して実行すると他のセッションの
+    実行中に戻されてしまうため、この間はプロセス全体で1つの値に固定する（Secrets は AppTest に渡さない）。
+    """
+    saved_secrets = st.secrets
+    secrets = Secrets()
+    secrets._secrets = {"google": {"GSHEET_ID": sheet_id}}
+    st.secrets = secrets
+    app_test_module.Runtime = _SharedRuntime
+    try:
+        with patch_config_options({"global.appTest": True}):
+            yield
+    finally:
+        app_test_module.Runtime = Runtime
+        Runtime._instance = None
+        st.secrets = saved_secrets
+
+
+class LoadSession:
+    """
+    1人のメンバーのセッション（AppTest 1つ）
+
+    Args:
+        number: セッション番号（名前・乱数の種に使う）
+        hot_rows: 参加表明する予約（(行番号, 予約ID) のリスト）
+        memo_row: メモを編集する予約（このセッションだけが編集する）
+        actions: 操作の回数
+        think_ms: 操作の間隔の上限（ミリ秒。0なら待たない）
+    """
+    def __init__(self, number, hot_rows, memo_row, actions, think_ms):
+        self.number = number
+        self.nick = f"負荷{number:03d}"
+        self.hot_rows = hot_rows
+        self.memo_row = memo_row
+        self.actions = actions
+        self.think_ms = think_ms
+        self.rng = random.Random(number)
+        self.at = AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT_SEC)
+        self.key = None
+        self.latencies = defaultdict(list)
+        self.errors = []
+        # 予約ID → このセッションが最後に反映した区分 / (予約ID, メモ)
+        self.expected_signups = {}
+        self.expected_memo = None
+
+    # --- 実行 ---
+    def run(self, barrier):
+        barrier.wait()
+        self._run("cold_start")
+        self.key = self.at.session_state["session_key"] if "session_key" in self.at.session_state else None
+        kinds, weights = list(ACTION_WEIGHTS), list(ACTION_WEIGHTS.values())
+        for _ in range(self.actions):
+            if self.think_ms:
+                time.sleep(self.rng.uniform(0, self.think_ms) / 1000)
+            kind = self.rng.choices(kinds, weights)[0]
+            try:
+                if kind == "view":
+                    self.switch_view()
+                elif kind == "signup":
+                    self.signup(*self.rng.choice(self.hot_rows))
+                else:
+                    self.edit_memo(*self.memo_row)
+            except Exception as e:
+                # 想定した画面にならなかった（ウィジェットが見つからない等）
+                self.errors.append(f"{kind}: {type(e).__name__}: {e}")
+                self._close_dialog()
+
+    def _run(self, action):
+        started = time.perf_counter()
+        try:
+            self.at.run(timeout=RUN_TIMEOUT_SEC)
+        except RuntimeError as e:
+            self.errors.append(f"{action}: timeout ({e})")
+            return
+        self.latencies[action].append((time.perf_counter() - started) * 1000)
+        for exc in self.at.exception:
+            self.errors.append(f"{action}: {exc.message[:200]}")
+
+    def _click(self, label, action):
+        """ボタンを押して再実行する（例外・タイムアウト・エラー表示が無ければ True）"""
+        errors = len(self.errors)
+        next(b for b in self.at.button if b.label == label).click()
+        self._run(action)
+        return len(self.errors) == errors and not self.at.error
+
+    # --- 操作 ---
+    def switch_view(self):
+        radio = self.at.radio(key="view_mode_selector")
+        radio.set_value(self.rng.choice([m for m in VIEW_MODES if m != radio.value]))
+        self._run("view")
+
+    def _open_dialog(self, idx):
+        self.at.session_state["is_popup_open"] = True
+        self.at.session_state["popup_mode"] = "edit"
+        self.at.session_state["active_event_idx"] = idx
+        self._run("open_dialog")
+
+    def _close_dialog(self):
+        state = self.at.session_state
+        if "is_popup_open" not in state or not state["is_popup_open"]:
+            return
+        closes = [b for b in self.at.button if b.label == "閉じる"]
+        if closes:
+            closes[0].click()
+        else:
+            self.at.session_state["is_popup_open"] = False
+        self._run("close_dialog")
+
+    def signup(self, idx, rid):
+        self._open_dialog(idx)
+        self.at.selectbox(key="edit_nick").set_value("新規入力")
+        self._run("choose_name")
+        part_type = self.rng.choice(SIGNUP_TYPES)
+        self.at.text_input(key="edit_nick_input").input(self.nick)
+        self.at.radio(key="edit_type").set_value(part_type)
+        # 反映後はダイアログが再実行されて完了メッセージは残らないため、エラーが無ければ反映したとみなす
+        if self._click("反映する", "signup"):
+            self.expected_signups[rid] = part_type
+        self._close_dialog()
+
+    def edit_memo(self, idx, rid):
+        self._open_dialog(idx)
+        memo = f"{self.nick} {self.rng.randrange(10 ** 6):06d}"
+        next(t for t in self.at.text_area if t.label == "メモの編集").input(memo)
+        if self._click("内容を更新", "memo"):
+            self.expected_memo = (rid, memo)
+        self._close_dialog()
+
+
+def pick_targets(df, sessions):
+    """
+    参加表明する予約と、セッションごとにメモを編集する予約を選ぶ
+
+    予約IDが重複しない予約だけを使う。参加表明は定員なしの予約（定員超過で反映されない操作を除くため）。
+    """
+    ids = reservation_ids(df)
+    unique = ids[~ids.duplicated(keep=False) & (ids != "")]
+    no_capacity = df.loc[unique.index, "capacity"].isna()
+    hot = [(idx, rid) for idx, rid in unique[no_capacity].items()][:HOT_RESERVATIONS]
+    hot_idx = {idx for idx, _ in hot}
+    others = [(idx, rid) for idx, rid in unique.items() if idx not in hot_idx]
+    if len(others) < sessions:
+        raise SystemExit(f"予約が足りません（メモ用 {len(others)}件 < {sessions}セッション）。--rows を増やしてください")
+    return hot, others[:sessions]
+
+def count_lost_updates(sessions):
+    """
+    終了後にシートから読み直し、各セッションが最後に反映した内容が残っているかを確認する
+
+    Returns:
+        dict: signups / memos（残っていない件数）、checked（確認した件数）
+    """
+    load_reservations.clear()
+    df = load_reservations()
+    rows = dict(zip(reservation_ids(df), df.index))
+    lost = Counter()
+    for s in sessions:
+        for rid, part_type in s.expected_signups.items():
+            lost["checked"] += 1
+            row = df.loc[rows[rid]]
+            found = [col for col in STATUS_COLUMNS.values() if s.nick in (row[col] if isinstance(row[col], list) else [])]
+            if found != ([STATUS_COLUMNS[part_type]] if part_type in STATUS_COLUMNS else []):
+                lost["signups"] += 1
+        if s.expected_memo is not None:
+            lost["checked"] += 1
+            rid, memo = s.expected_memo
+            if df.at[rows[rid], "message"] != memo:
+                lost["memos"] += 1
+    return {"signups": lost["signups"], "memos": lost["memos"], "checked": lost["checked"]}
+
+def api_calls_per_session(records_by_session, sessions):
+    """セッションごとのシートAPI呼び出し回数（再実行の計測の sheets.* スパンの数）"""
+    counts = []
+    for s in sessions:
+        spans = [sp for r in records_by_session.get(s.key, []) for sp in r["spans"]]
+        counts.append(sum(sp["name"].startswith("sheets.") and sp["name"] not in NON_API_SPANS for sp in spans))
+    return counts
+
+def run_load_test(n_sessions, actions, rows, think_ms):
+    spreadsheet = MemorySpreadsheet({
+        "reservations": make_reservations(rows),
+        "facilities": make_facilities(),
+        "lottery_periods": make_lottery_periods(),
+    })
+    data_access.use_spreadsheet(spreadsheet)
+    # 計測ログ・カレンダーフィードは一時ディレクトリに書く（本番用のファイルを上書きしない）
+    workdir = tempfile.mkdtemp(prefix="tennis-load-")
+    perf.PERF_LOG_PATH = os.path.join(workdir, "perf_log.jsonl")
+    calendar_feed.FEED_DIR = os.path.join(workdir, "calendar")
+    calendar_feed.FEED_STATE_PATH = os.path.join(workdir, "calendar_events.json")
+
+    load_reservations.clear()
+    hot_rows, memo_rows = pick_targets(load_reservations(), n_sessions)
+    sessions = [LoadSession(i, hot_rows, memo_rows[i], actions, think_ms) for i in range(n_sessions)]
+
+    records_by_session = defaultdict(list)
+    records_lock = threading.Lock()
+
+    def collect(record):
+        with records_lock:
+            records_by_session[record.get("session")].append(record)
+
+    perf.add_listener(collect)
+    rss_before = _rss_mb()
+    calls_before = Counter(spreadsheet.calls)
+    barrier = threading.Barrier(n_sessions)
+    threads = [threading.Thread(target=s.run, args=(barrier,), name=f"load-{s.number}") for s in sessions]
+    started = time.perf_counter()
+    with concurrent_app_tests("load-test"):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - started
+    perf.remove_listener(collect)
+    rss_after = _rss_mb()
+    total_calls = Counter(spreadsheet.calls)
+    total_calls.subtract(calls_before)
+
+    latencies = defaultdict(list)
+    for s in sessions:
+        for action, values in s.latencies.items():
+            latencies[action].extend(values)
+    per_session_calls = api_calls_per_session(records_by_session, sessions)
+    result = {
+        "sessions": n_sessions,
+        "actions_per_session": actions,
+        "rows": rows,
+        "think_ms": think_ms,
+        "elapsed_sec": round(elapsed, 1),
+        "reruns": sum(len(v) for v in latencies.values()),
+        "latency_ms": {action: {"count": len(v), **_percentiles(v)} for action, v in sorted(latencies.items())},
+        "latency_ms_all": _percentiles([x for v in latencies.values() for x in v]),
+        "api_calls_per_session": {
+            "mean": round(statistics.mean(per_session_calls), 1),
+            "max": max(per_session_calls),
+        },
+        "api_calls_total": dict(sorted((k, v) for k, v in total_calls.items() if v)),
+        "lost_updates": count_lost_updates(sessions),
+        "rss_mb": {"before": round(rss_before, 1), "after": round(rss_after, 1), "growth": round(rss_after - rss_before, 1)},
+        "errors": [f"session {s.number}: {e}" for s in sessions for e in s.errors],
+    }
+    data_access.use_spreadsheet(None)
+    return result
+
+def print_result(result):
+    print(f"{result['sessions']} sessions x {result['actions_per_session']} actions, {result['rows']} rows, "
+          f"think {result['think_ms']}ms: {result['reruns']} reruns in {result['elapsed_sec']}s")
+    print(f"{'action':<16}{'count':>7}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES) + f"{'max':>9}")
+    for action, r in list(result["latency_ms"].items()) + [("(all)", {"count": result["reruns"], **result["latency_ms_all"]})]:
+        print(f"{action:<16}{r['count']:>7}" + "".join(f"{r.get(f'p{p}', 0):>9.1f}" for p in PERCENTILES) + f"{r.get('max', 0):>9.1f}")
+    calls = result["api_calls_per_session"]
+    print(f"sheet API calls per session: mean {calls['mean']}, max {calls['max']}")
+    print(f"sheet API calls total: {result['api_calls_total']}")
+    lost = result["lost_updates"]
+    print(f"lost updates: signups {lost['signups']}, memos {lost['memos']} (of {lost['checked']} checked)")
+    rss = result["rss_mb"]
+    print(f"RSS: {rss['before']}MB -> {rss['after']}MB (+{rss['growth']}MB)")
+    if result["errors"]:
+        print(f"errors ({len(result['errors'])}):")
+        for e in result["errors"][:20]:
+            print(f"  {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument("--actions", type=int, default=DEFAULT_ACTIONS, help="1セッションあたりの操作の回数")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="予約データの行数")
+    parser.add_argument("--think-ms", type=int, default=0, help="操作の間隔の上限（ミリ秒。ランダムに待つ）")
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで保存する")
+    args = parser.parse_args()
+
+    result = run_load_test(args.sessions, args.actions, args.rows, args.think_ms)
+    print_result(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    if result["errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""bulk_io（一括インポートの検証・エクスポート）のテスト"""
+import io
+
+import pandas as pd
+
+from bulk_io import export_csv, export_csv_chunks, export_parquet, read_import_chunks, validate_chunk
+from conftest import RESERVATION_HEADER, reservation_row
+
+
+def _csv_chunk(*rows):
+    """CSVから読み込んだままのチャンク（値はすべて文字列）"""
+    return pd.DataFrame([reservation_row(**row) for row in rows], columns=RESERVATION_HEADER, dtype=str)
+
+def test_validate_chunk_reasons():
+    chunk = _csv_chunk(
+        {},
+        {"day": "2025-02-30"},
+        {"facility": " "},
+        {"start": ("", "0")},
+        {"start": (25, 0), "end": (26, 0)},
+        {"start": (9, 75)},
+        {"start": (11, 0), "end": (11, 0)},
+        {"status": "未定"},
+        {"court_type": "芝"},
+    )
+    ok, errors = validate_chunk(chunk)
+    assert ok.index.tolist() == [0]
+    assert errors["行"].tolist() == [3, 4, 5, 6, 7, 8, 9, 10]
+    assert errors["理由"].tolist() == [
+        "日付が不正", "施設名が空", "時刻が不正", "時刻が範囲外", "時刻が範囲外",
+        "終了時刻が開始時刻以前", "ステータスが不正", "コート種類が不正",
+    ]
+
+def test_validate_chunk_keeps_file_row_numbers():
+    """2つ目以降のチャンクもファイル内の行番号で表示する"""
+    chunk = _csv_chunk({}, {"status": "未定"})
+    chunk.index = pd.RangeIndex(500, 502)
+    _, errors = validate_chunk(chunk)
+    assert errors["行"].tolist() == [503]
+
+def test_export_csv_round_trip(make_reservations):
+    df = make_reservations(
+        {"rid": "r1", "participants": ["山田", "佐藤"], "capacity": 4, "message": "雨天, 中止の場合あり"},
+        {"rid": "r2", "start": (13, 30), "end": (15, 0), "waitlist": ["鈴木"]},
+    )
+    out = export_csv(df)
+    data = out.read()
+    out.close()
+    assert data.startswith(b"\xef\xbb\xbf")
+
+    chunks = list(read_import_chunks(io.BytesIO(data), "csv", chunk_rows=1))
+    assert len(chunks) == 2
+    ok, errors = validate_chunk(pd.concat(chunks))
+    assert errors.empty
+    assert ok["id"].tolist() == ["r1", "r2"]
+    assert ok["participants"].tolist() == [["山田", "佐藤"], []]
+    assert ok["waitlist"].tolist() == [[], ["鈴木"]]
+    assert ok["message"].tolist() == ["雨天, 中止の場合あり", ""]
+    assert ok["start_minute"].tolist() == [0, 30]
+
+def test_export_csv_chunks_write_header_once(make_reservations):
+    df = make_reservations(*({"rid": f"r{i}"} for i in range(5)))
+    chunks = list(export_csv_chunks(df, chunk_rows=2))
+    assert len(chunks) == 3
+    lines = b"".join(chunks).decode("utf-8").splitlines()
+    assert len(lines) == 6
+    assert lines[0].startswith("date,")
+    assert sum(line.startswith("date,") for line in lines) == 1
+
+def test_export_parquet_round_trip(make_reservations):
+    df = make_reservations({"rid": "r1", "participants": ["山田"], "capacity": 4})
+    chunks = list(read_import_chunks(io.BytesIO(export_parquet(df)), "parquet"))
+    ok, errors = validate_chunk(chunks[0])
+    assert errors.empty
+    assert ok.at[0, "participants"] == ["山田"]
+    assert ok.at[0, "capacity"] == 4
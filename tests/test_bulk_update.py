@@ -0,0 +1,74 @@
+"""bulk_update（予約の一括変更）のテスト"""
+from datetime import date
+
+from bulk_update import plan_bulk_update, select_reservations
+from signup import FULL_STATUS, OPEN_STATUS
+
+
+def test_select_reservations(make_reservations):
+    df = make_reservations(
+        {"day": "2025-04-01", "status": "抽選中"},
+        {"day": "2025-04-10", "status": "抽選中", "facility": "砧公園"},
+        {"day": "2025-04-20", "status": "募集中"},
+        {"day": "2025-05-01", "status": "抽選中"},
+    )
+    mask = select_reservations(df, statuses=["抽選中"], date_from=date(2025, 4, 5), date_to=date(2025, 4, 30))
+    assert mask.tolist() == [False, True, False, False]
+    assert select_reservations(df, facilities=["大蔵運動場"]).tolist() == [True, False, True, True]
+    assert select_reservations(df).all()
+
+def test_status_change_closes_full_reservations(make_reservations):
+    """「募集中」にした予約も定員に達していれば「締切」にする"""
+    df = make_reservations(
+        {"status": "抽選中", "capacity": 2, "participants": ["A", "B"]},
+        {"status": "抽選中", "capacity": 2, "participants": ["A"]},
+    )
+    new_df, changed, columns, skipped = plan_bulk_update(df, select_reservations(df), {"status": OPEN_STATUS})
+    assert new_df["status"].tolist() == [FULL_STATUS, OPEN_STATUS]
+    assert changed.tolist() == [True, True]
+    assert columns == ["status"]
+    assert not skipped.any()
+    assert df["status"].tolist() == ["抽選中", "抽選中"]
+
+def test_capacity_change_switches_status(make_reservations):
+    df = make_reservations(
+        {"status": FULL_STATUS, "capacity": 2, "participants": ["A", "B"]},
+        {"status": OPEN_STATUS, "capacity": 4, "participants": ["A", "B", "C"]},
+        {"status": "中止", "capacity": 2, "participants": ["A"]},
+    )
+    new_df, changed, columns, skipped = plan_bulk_update(df, select_reservations(df), {"capacity": 3})
+    assert new_df["status"].tolist() == [OPEN_STATUS, FULL_STATUS, "中止"]
+    assert new_df["capacity"].tolist() == [3, 3, 3]
+    assert changed.tolist() == [True, True, True]
+    assert columns == ["status", "capacity"]
+    assert not skipped.any()
+
+def test_capacity_below_participants_is_skipped(make_reservations):
+    """定員が参加者数より少なくなる予約は、どの列も変更しない"""
+    df = make_reservations(
+        {"status": OPEN_STATUS, "capacity": 5, "participants": list("XYABC")},
+        {"status": OPEN_STATUS, "capacity": 5, "participants": ["A"]},
+    )
+    new_df, changed, _, skipped = plan_bulk_update(
+        df, select_reservations(df), {"capacity": 2, "court_type": "クレー"},
+    )
+    assert skipped.tolist() == [True, False]
+    assert changed.tolist() == [False, True]
+    assert new_df.at[0, "capacity"] == 5
+    assert new_df.at[0, "court_type"] == "オムニ"
+    assert new_df.at[1, "capacity"] == 2
+    assert new_df.at[1, "court_type"] == "クレー"
+
+def test_clear_capacity(make_reservations):
+    """定員は「指定なし」にできる（参加者数による制限は無く、ステータスはそのまま）"""
+    df = make_reservations({"status": OPEN_STATUS, "capacity": 2, "participants": ["A"]})
+    new_df, changed, _, skipped = plan_bulk_update(df, select_reservations(df), {"capacity": None})
+    assert new_df["capacity"].isna().all()
+    assert changed.tolist() == [True]
+    assert not skipped.any()
+
+def test_unchanged_rows_are_not_reported(make_reservations):
+    df = make_reservations({"court_type": "クレー"}, {"court_type": "オムニ"})
+    _, changed, columns, _ = plan_bulk_update(df, select_reservations(df), {"court_type": "クレー", "message": "x"})
+    assert changed.tolist() == [False, True]
+    assert columns == ["court_type"]
@@ -0,0 +1,83 @@
+"""calendar_feed（iCalendar フィード）のテスト"""
+from datetime import date
+
+import pytest
+
+import calendar_feed
+from calendar_feed import _feed_calendar_name, _fold, build_ics, build_member_ics, event_uid, feed_events
+
+TODAY = date(2025, 4, 1)
+
+
+@pytest.fixture(autouse=True)
+def feed_state(tmp_path, monkeypatch):
+    """予定の版はテストごとに空の状態から始める"""
+    monkeypatch.setattr(calendar_feed, "FEED_STATE_PATH", str(tmp_path / "events.json"))
+    calendar_feed._version_store.clear()
+    yield
+    calendar_feed._version_store.clear()
+
+
+def _field(event, name):
+    unfolded = event.replace("\r\n ", "")
+    return [line.split(":", 1)[1] for line in unfolded.split("\r\n") if line.startswith(name + ":")][0]
+
+def test_fold_keeps_utf8_characters():
+    line = "DESCRIPTION:" + "参加者" * 40
+    folded = _fold(line)
+    assert all(len(part.encode("utf-8")) <= 75 for part in folded.split("\r\n"))
+    assert folded.replace("\r\n ", "") == line
+
+def test_same_slot_gets_distinct_uids(make_reservations):
+    """同じ日時・施設の予約が2件あっても別の予定になる"""
+    df = make_reservations({"rid": "r1"}, {"rid": "r2"})
+    events = feed_events(df, TODAY)
+    uids = [_field(e, "UID") for e in events]
+    assert uids == [event_uid("r1"), event_uid("r2")]
+    assert uids[0] != uids[1]
+
+def test_sequence_bumps_only_on_change(make_reservations):
+    df = make_reservations({"rid": "r1", "participants": ["山田"]})
+    first = feed_events(df, TODAY).iloc[0]
+    assert _field(first, "SEQUENCE") == "0"
+    # 内容が同じなら SEQUENCE・DTSTAMP も同じ（フィードが変わらない）
+    assert feed_events(df, TODAY).iloc[0] == first
+
+    df.at[0, "participants"] = ["山田", "佐藤"]
+    second = feed_events(df, TODAY).iloc[0]
+    assert _field(second, "SEQUENCE") == "1"
+    assert "佐藤" in _field(second, "DESCRIPTION")
+
+    # 版はファイルにも残る（再起動後も SEQUENCE は戻らない）
+    calendar_feed._version_store.clear()
+    assert feed_events(df, TODAY).iloc[0] == second
+
+def test_old_events_are_excluded_and_cancelled_marked(make_reservations):
+    df = make_reservations(
+        {"rid": "old", "day": "2025-01-01"},
+        {"rid": "r1", "day": "2025-04-10", "status": "中止"},
+        {"rid": "r2", "day": "2025-04-05", "start": (13, 0), "end": (15, 0)},
+    )
+    events = feed_events(df, TODAY)
+    assert events.index.tolist() == [2, 1]
+    assert _field(events.loc[1], "STATUS") == "CANCELLED"
+    # JST 13:00 → UTC 04:00
+    assert _field(events.loc[2], "DTSTART") == "20250405T040000Z"
+
+def test_member_feed(make_reservations):
+    df = make_reservations(
+        {"rid": "r1", "participants": ["山田"]},
+        {"rid": "r2", "consider": ["山田"]},
+        {"rid": "r3", "participants": ["佐藤"]},
+    )
+    ics = build_member_ics(df, "山田", TODAY).decode("utf-8")
+    assert ics.count("BEGIN:VEVENT") == 2
+    assert event_uid("r3") not in ics
+    assert "X-WR-CALNAME:テニス予約（山田）" in ics
+
+def test_feed_calendar_name_round_trip(tmp_path):
+    name = "テニス予約（山田, 佐藤; " + "長い名前" * 10 + "）"
+    path = tmp_path / "feed.ics"
+    path.write_bytes(build_ics([], name))
+    assert _feed_calendar_name(str(path)) == name
+    assert _feed_calendar_name(str(tmp_path / "missing.ics")) is None
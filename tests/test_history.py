@@ -0,0 +1,64 @@
+"""history（予約データの変更履歴）のテスト"""
+import pytest
+
+import history
+
+HEADER = ["date", "facility", "id"]
+
+
+@pytest.fixture(autouse=True)
+def history_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_DIR", str(tmp_path / "history"))
+    monkeypatch.setattr(history, "_state", None)
+    return tmp_path / "history"
+
+
+def _restart(monkeypatch):
+    """プロセスを起動し直したときと同じく、ファイルから読み直させる"""
+    monkeypatch.setattr(history, "_state", None)
+
+def test_state_at_replays_deltas():
+    history.record_state(HEADER, {"r1": ["2025-04-01", "大蔵", "r1"], "r2": ["2025-04-02", "砧", "r2"]}, "保存")
+    t1 = history._state["last_ts"]
+    history.record_state(HEADER, {"r1": ["2025-04-01", "大蔵", "r1"], "r3": ["2025-04-03", "砧", "r3"]}, "保存")
+    t2 = history._state["last_ts"]
+
+    assert history.state_at(t1 - 1) == (None, None)
+    assert history.state_at(t1)[1] == {"r1": ["2025-04-01", "大蔵", "r1"], "r2": ["2025-04-02", "砧", "r2"]}
+    header, rows = history.state_at(t2)
+    assert header == HEADER
+    assert rows == {"r1": ["2025-04-01", "大蔵", "r1"], "r3": ["2025-04-03", "砧", "r3"]}
+
+def test_record_rows_only_upserts():
+    """record_rows() は渡した行だけを変更として記録する（他の行は消さない）"""
+    assert history.record_rows(HEADER, {"r1": ["x", "x", "r1"]}) == 0  # 全件を記録する前は記録しない
+    history.record_state(HEADER, {"r1": ["2025-04-01", "大蔵", "r1"], "r2": ["2025-04-02", "砧", "r2"]})
+    assert history.record_rows(HEADER, {"r1": ["2025-04-01", "大蔵", "r1"]}) == 0
+    assert history.record_rows(HEADER, {"r2": ["2025-04-09", "砧", "r2"]}, "一括変更") == 1
+    _, rows = history.state_at(history._state["last_ts"])
+    assert rows == {"r1": ["2025-04-01", "大蔵", "r1"], "r2": ["2025-04-09", "砧", "r2"]}
+
+    entries = history.timeline()
+    assert [e["source"] for e in entries] == ["一括変更", ""]
+    assert entries[-1]["snapshot"] and entries[-1]["changed"] == 2
+
+def test_versions_of_one_reservation(monkeypatch):
+    history.record_state(HEADER, {"r1": ["2025-04-01", "大蔵", "r1"]})
+    history.record_state(HEADER, {"r1": ["2025-04-01", "大蔵", "r1"], "r2": ["2025-04-02", "砧", "r2"]})
+    history.record_state(HEADER, {"r1": ["2025-04-01", "大蔵", "r1"], "r2": ["2025-04-05", "砧", "r2"]})
+    history.record_state(HEADER, {"r1": ["2025-04-01", "大蔵", "r1"]})
+    _restart(monkeypatch)
+    assert [row for _, _, row in history.versions("r2")] == [
+        ["2025-04-02", "砧", "r2"], ["2025-04-05", "砧", "r2"], None,
+    ]
+    assert [row for _, _, row in history.versions("r1")] == [["2025-04-01", "大蔵", "r1"]]
+    assert history.versions("missing") == []
+
+def test_new_snapshot_after_many_deltas(monkeypatch):
+    monkeypatch.setattr(history, "SNAPSHOT_EVERY", 2)
+    for i in range(5):
+        history.record_state(HEADER, {"r1": ["2025-04-01", "大蔵", f"v{i}"]})
+    assert len(history._snapshot_times()) == 2
+    _restart(monkeypatch)
+    assert [row[2] for _, _, row in history.versions("r1")] == [f"v{i}" for i in range(5)]
+    assert history.state_at(history._load_state()["last_ts"])[1] == {"r1": ["2025-04-01", "大蔵", "v4"]}
@@ -0,0 +1,47 @@
+"""journal（シートへの書き込みのジャーナル）のテスト"""
+import os
+
+import pytest
+
+import journal
+
+
+@pytest.fixture(autouse=True)
+def journal_path(tmp_path, monkeypatch):
+    path = tmp_path / "journal" / "journal.jsonl"
+    monkeypatch.setattr(journal, "JOURNAL_PATH", str(path))
+    monkeypatch.setattr(journal, "_pending", None)
+    return path
+
+
+def test_record_and_ack(journal_path):
+    first = journal.record("replace", "reservations", {"values": [["a"]]})
+    second = journal.record("replace", "facilities", {"values": [["b"]]})
+    assert [e["id"] for e in journal.pending()] == [first, second]
+    assert journal.pending()[0]["payload"] == {"values": [["a"]]}
+
+    journal.ack(first)
+    assert [e["id"] for e in journal.pending()] == [second]
+    # 完了していないエントリが無くなったらファイルを消す
+    journal.ack(second)
+    assert journal.pending() == []
+    assert not os.path.exists(journal_path)
+
+def test_pending_survives_restart(monkeypatch):
+    """プロセスを起動し直しても（ファイルから読み直しても）完了していないエントリが残る"""
+    first = journal.record("replace", "reservations", {})
+    second = journal.record("replace", "reservations", {})
+    journal.ack(first, "merged")
+    monkeypatch.setattr(journal, "_pending", None)
+    assert [e["id"] for e in journal.pending()] == [second]
+
+def test_torn_last_line_is_ignored(journal_path, monkeypatch):
+    entry_id = journal.record("replace", "reservations", {})
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "record", "id": "broken"')
+    monkeypatch.setattr(journal, "_pending", None)
+    assert [e["id"] for e in journal.pending()] == [entry_id]
+
+def test_unknown_ack_is_ignored():
+    journal.ack("missing")
+    assert journal.pending() == []
@@ -0,0 +1,44 @@
+"""member_index（メンバー名簿と名前の前方一致インデックス）のテスト"""
+from member_index import MemberIndex, names_from_history, normalize_name, parse_member_rows
+
+
+def test_normalize_name():
+    assert normalize_name(" ＹＯＳＨＩ ") == "yoshi"
+    assert normalize_name("ヨシタニ") == normalize_name("よしたに")
+    assert normalize_name("ｶﾅ") == "かな"
+
+def test_parse_member_rows():
+    rows = [["山田", "やまだ; yamada ;"], ["", "x"], ["佐藤"], []]
+    assert parse_member_rows(rows) == [("山田", ["やまだ", "yamada"]), ("佐藤", [])]
+
+def test_names_from_history(make_reservations):
+    df = make_reservations(
+        {"participants": ["山田", "佐藤"], "consider": ["鈴木"]},
+        {"participants": ["佐藤"], "absent": ["山田"]},
+        {"participants": ["佐藤"]},
+    )
+    assert names_from_history(df) == ["佐藤", "山田", "鈴木"]
+
+def test_lookup_by_name_and_alias():
+    index = MemberIndex([("山田", ["やまだ", "yamada"]), ("山本", []), ("ヨシタニ", [])])
+    assert index.lookup("山") == ["山本", "山田"]  # 表記を揃えた名前の順
+    assert index.lookup("YAMA") == ["山田"]
+    assert index.lookup("よし") == ["ヨシタニ"]
+    assert index.lookup("田") == []
+    assert len(index.lookup("")) == 3
+    assert len(index.lookup("", limit=2)) == 2
+
+def test_canonical():
+    index = MemberIndex([("山田", ["yamada"])])
+    assert index.canonical("ＹＡＭＡＤＡ") == "山田"
+    assert index.canonical("山田 ") == "山田"
+    assert index.canonical("佐藤") is None
+
+def test_add():
+    index = MemberIndex([("山田", [])])
+    assert index.add("佐藤") is True
+    assert index.add("山田", ["やまだ"]) is False
+    assert index.lookup("やま") == ["山田"]
+    assert index.members() == [("山田", ["やまだ"]), ("佐藤", [])]
+    assert len(index) == 2
+    assert index == MemberIndex([("山田", ["やまだ"]), ("佐藤", [])])
@@ -0,0 +1,72 @@
+"""member_stats（メンバーごとの参加実績テーブル）の集計のテスト"""
+from datetime import date
+
+from member_stats import (
+    aggregate_stats, apply_reservation_change, live_cutoff, month_checksums, reservation_contributions,
+)
+
+
+def _row(table, member, year_month, court_type="オムニ"):
+    match = table[(table["member"] == member) & (table["year_month"] == year_month) & (table["court_type"] == court_type)]
+    assert len(match) == 1
+    return match.iloc[0]
+
+def test_reservation_contributions(make_reservations):
+    df = make_reservations(
+        {"day": "2025-04-01", "status": "完了", "start": (9, 0), "end": (11, 30),
+         "participants": ["山田", "佐藤"], "absent": ["鈴木"]},
+        {"day": "2025-04-08", "status": "募集中", "participants": ["山田"], "consider": ["佐藤"]},
+        {"day": "2025-05-01", "status": "中止", "participants": ["山田"], "consider": ["佐藤"]},
+    )
+    table = reservation_contributions(df)
+
+    yamada = _row(table, "山田", "2025/04")
+    assert (yamada["attended"], yamada["hours"], yamada["signed_up"], yamada["considered"]) == (1, 2.5, 2, 0)
+    sato = _row(table, "佐藤", "2025/04")
+    assert (sato["attended"], sato["signed_up"], sato["considered"]) == (1, 1, 1)
+    assert _row(table, "鈴木", "2025/04")["no_shows"] == 1
+    # 中止の予約は何も数えない
+    assert not (table["year_month"] == "2025/05").any()
+
+def test_apply_reservation_change_matches_recompute(make_reservations):
+    """変更分だけ差し替えた集計表は、全件から作り直したものと同じ"""
+    df = make_reservations(
+        {"day": "2025-04-01", "status": "完了", "participants": ["山田", "佐藤"]},
+        {"day": "2025-04-08", "status": "募集中", "participants": ["山田"]},
+    )
+    table = reservation_contributions(df)
+    new_df = df.copy()
+    new_df.at[1, "participants"] = ["佐藤"]
+    new_df.at[1, "consider"] = ["山田"]
+
+    updated = apply_reservation_change(table, df.loc[[1]], new_df.loc[[1]])
+    expected = reservation_contributions(new_df)
+    key = ["member", "year_month", "court_type"]
+    assert updated.sort_values(key).reset_index(drop=True).equals(expected.sort_values(key).reset_index(drop=True))
+
+def test_aggregate_stats_drops_zero_rows(make_reservations):
+    table = reservation_contributions(make_reservations({"participants": ["山田"]}))
+    removed = table.copy()
+    removed[["signed_up"]] = -removed[["signed_up"]]
+    assert aggregate_stats([table, removed, None]).empty
+
+def test_month_checksums(make_reservations):
+    rows = [
+        {"day": "2025-04-01", "participants": ["山田"]},
+        {"day": "2025-04-08", "participants": ["佐藤"]},
+        {"day": "2025-05-01"},
+    ]
+    checksums = month_checksums(make_reservations(*rows))
+    assert set(checksums) == {"2025/04", "2025/05"}
+    # 行の並びには依存しない
+    assert month_checksums(make_reservations(*rows[::-1])) == checksums
+    # 集計に使う列が変わった月だけ変わる
+    changed = month_checksums(make_reservations(rows[0], {"day": "2025-04-08", "participants": ["鈴木"]}, rows[2]))
+    assert changed["2025/04"] != checksums["2025/04"]
+    assert changed["2025/05"] == checksums["2025/05"]
+    # 集計に使わない列（メモ）は変わらない
+    assert month_checksums(make_reservations(rows[0], rows[1], {"day": "2025-05-01", "message": "x"})) == checksums
+
+def test_live_cutoff():
+    assert live_cutoff(date(2025, 4, 15)) == date(2025, 3, 1)
+    assert live_cutoff(date(2025, 1, 1)) == date(2024, 12, 1)
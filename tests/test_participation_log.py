@@ -0,0 +1,133 @@
+"""participation_log（参加表明ログの解釈・参加者リストの組み立て）のテスト"""
+from participation_log import (
+    REMOVED, WAITLISTED, apply_entries, apply_rosters, encode_capacity, fill_reservation_ids,
+    merge_roster, parse_log_rows, reservation_ids,
+)
+
+
+def _empty():
+    return {"participants": [], "consider": [], "absent": [], "waitlist": []}
+
+
+# ==========================================
+# 1. 予約ID
+# ==========================================
+def test_fill_reservation_ids_uses_slot_and_numbers_duplicates(make_reservations):
+    """id が空欄の行は日付・開始時刻・施設名から作り、同じIDの2件目から "#2" を付ける"""
+    df = make_reservations(
+        {"rid": ""}, {"rid": ""}, {"rid": "abc"}, {"rid": "", "start": (13, 30)},
+    )
+    df["id"] = ["", "", "abc", ""]
+    assert fill_reservation_ids(df).tolist() == [
+        "2025-04-01 09:00 大蔵運動場", "2025-04-01 09:00 大蔵運動場#2", "abc", "2025-04-01 13:30 大蔵運動場",
+    ]
+
+def test_parse_reservation_values_fills_ids(make_reservations):
+    """読み込んだ予約データの id 列は埋めてある"""
+    df = make_reservations({"rid": "abc"}, {"rid": ""})
+    assert reservation_ids(df).tolist() == ["abc", "2025-04-01 09:00 大蔵運動場"]
+
+
+# ==========================================
+# 2. ログの解釈
+# ==========================================
+def test_parse_log_rows_reads_capacity_and_skips_invalid_rows():
+    rows = [
+        ["r1", " 山田 ", "参加", "t1", "4"],
+        ["r1", "佐藤", "保留", "t2"],            # capacity 列が無かったころの行
+        ["r1", "鈴木", "参加", "t3", ""],
+        ["r1", "田中", "不明な区分", "t4", "4"],
+        ["r1", "", "参加", "t5", "4"],
+        ["r1", "伊藤"],
+    ]
+    assert parse_log_rows(rows) == [
+        ("r1", "山田", "参加", "t1", 4),
+        ("r1", "佐藤", "保留", "t2", None),
+        ("r1", "鈴木", "参加", "t3", None),
+    ]
+
+def test_encode_capacity():
+    assert encode_capacity(4) == "4"
+    assert encode_capacity(None) == ""
+    assert encode_capacity(float("nan")) == ""
+
+
+# ==========================================
+# 3. 参加者リストの組み立て
+# ==========================================
+def test_merge_roster_moves_names_in_log_order():
+    """ログに出てくる名前は最後の表明の列の末尾に入る（シートの値は残す）"""
+    base = {"participants": ["A", "B"], "consider": ["C"], "absent": [], "waitlist": []}
+    roster = [("B", "保留", None), ("C", "参加", None), ("D", "欠席", None)]
+    assert merge_roster(base, roster) == {
+        "participants": ["A", "C"], "consider": ["B"], "absent": ["D"], "waitlist": [],
+    }
+
+def test_merge_roster_removed_drops_name():
+    base = {"participants": ["A", "B"], "consider": [], "absent": [], "waitlist": []}
+    assert merge_roster(base, [("A", REMOVED, 2)])["participants"] == ["B"]
+
+def test_merge_roster_is_idempotent():
+    """ログ適用済みの値に同じログを適用しても変わらない"""
+    roster = [("A", "参加", 2), ("B", "参加", 2), ("C", "参加", 2), ("A", REMOVED, 2)]
+    once = merge_roster(_empty(), roster)
+    assert merge_roster(once, roster) == once
+
+def test_merge_roster_waitlists_concurrent_signup_over_capacity():
+    """別々のサーバーで最後の席へ同時に参加表明したら、後から追記された方がキャンセル待ちになる"""
+    base = {"participants": ["A"], "consider": [], "absent": [], "waitlist": []}
+    roster = [("B", "参加", 2), ("C", "参加", 2)]
+    lists = merge_roster(base, roster)
+    assert lists["participants"] == ["A", "B"]
+    assert lists["waitlist"] == ["C"]
+
+def test_merge_roster_keeps_seats_after_capacity_cut():
+    """後から定員を減らしても、それより前の参加表明はキャンセル待ちにしない"""
+    roster = [(name, "参加", 5) for name in "XYABC"]
+    lists = merge_roster(_empty(), roster)
+    assert lists["participants"] == list("XYABC")
+    assert lists["waitlist"] == []
+
+def test_merge_roster_new_signup_uses_its_own_capacity():
+    """定員を減らした後の参加表明は、追記したときの定員で判定する"""
+    roster = [("A", "参加", 3), ("B", "参加", 3), ("C", "参加", 3), ("D", "参加", 2)]
+    lists = merge_roster(_empty(), roster)
+    assert lists["participants"] == ["A", "B", "C"]
+    assert lists["waitlist"] == ["D"]
+
+def test_merge_roster_without_recorded_capacity_is_unlimited():
+    """定員を記録していない（capacity 列が無かったころの）行は制限しない"""
+    roster = [(name, "参加", None) for name in "ABC"]
+    assert merge_roster(_empty(), roster)["participants"] == ["A", "B", "C"]
+
+def test_merge_roster_promotion_after_freed_seat():
+    """席を空けた表明の後に追記した繰り上げは席に入る"""
+    roster = [("A", "参加", 1), ("B", WAITLISTED, 1), ("A", REMOVED, 1), ("B", "参加", 1)]
+    lists = merge_roster(_empty(), roster)
+    assert lists["participants"] == ["B"]
+    assert lists["waitlist"] == []
+
+def test_apply_rosters_replaces_only_logged_rows(make_reservations):
+    df = make_reservations(
+        {"rid": "r1", "participants": ["A"], "capacity": 2},
+        {"rid": "r2", "participants": ["B"], "capacity": 2},
+    )
+    rosters = {}
+    touched = apply_entries(rosters, [("r1", "C", "参加", "t1", 2), ("r1", "D", "参加", "t2", 2)])
+    assert touched == {"r1"}
+
+    applied = apply_rosters(df, reservation_ids(df), rosters)
+    assert applied["participants"].tolist() == [["A", "C"], ["B"]]
+    assert applied["waitlist"].tolist() == [["D"], []]
+    # 元の予約データ・ログの無い行のリストはそのまま
+    assert df["participants"].tolist() == [["A"], ["B"]]
+    assert applied["participants"].iat[1] is df["participants"].iat[1]
+
+def test_apply_rosters_ignores_current_capacity(make_reservations):
+    """予約データの定員を後から減らしても、ログの適用で参加者をキャンセル待ちに戻さない"""
+    df = make_reservations({"rid": "r1", "capacity": 2})
+    rosters = {}
+    apply_entries(rosters, [("r1", name, "参加", "", 5) for name in "XYABC"])
+    applied = apply_rosters(df, reservation_ids(df), rosters)
+    assert applied.at[0, "participants"] == list("XYABC")
+    assert applied.at[0, "waitlist"] == []
@@ -0,0 +1,55 @@
+"""recurrence（繰り返し予約の日付展開）のテスト"""
+from datetime import date
+
+import pytest
+
+from recurrence import MAX_OCCURRENCES, expand_recurrence
+
+
+def test_no_recurrence():
+    assert expand_recurrence(date(2025, 4, 1), date(2025, 6, 1), "なし") == [date(2025, 4, 1)]
+
+def test_until_before_first_date():
+    assert expand_recurrence(date(2025, 4, 1), date(2025, 3, 1), "毎週") == [date(2025, 4, 1)]
+
+def test_weekly_includes_until():
+    assert expand_recurrence(date(2025, 4, 1), date(2025, 4, 22), "毎週") == [
+        date(2025, 4, 1), date(2025, 4, 8), date(2025, 4, 15), date(2025, 4, 22),
+    ]
+
+def test_biweekly():
+    assert expand_recurrence(date(2025, 4, 1), date(2025, 5, 1), "隔週") == [
+        date(2025, 4, 1), date(2025, 4, 15), date(2025, 4, 29),
+    ]
+
+def test_monthly_same_day_skips_short_months():
+    """31日のような、その月に無い日はスキップする"""
+    assert expand_recurrence(date(2025, 1, 31), date(2025, 5, 31), "毎月（同じ日）") == [
+        date(2025, 1, 31), date(2025, 3, 31), date(2025, 5, 31),
+    ]
+
+def test_monthly_same_weekday():
+    """第2火曜日 → 毎月の第2火曜日"""
+    assert expand_recurrence(date(2025, 4, 8), date(2025, 7, 31), "毎月（同じ曜日）") == [
+        date(2025, 4, 8), date(2025, 5, 13), date(2025, 6, 10), date(2025, 7, 8),
+    ]
+
+def test_monthly_fifth_weekday_skips_months_without_it():
+    """第5土曜日が無い月はスキップする"""
+    assert expand_recurrence(date(2025, 3, 29), date(2025, 6, 30), "毎月（同じ曜日）") == [
+        date(2025, 3, 29), date(2025, 5, 31),
+    ]
+
+def test_exceptions_are_removed():
+    dates = expand_recurrence(date(2025, 4, 1), date(2025, 4, 22), "毎週", exceptions=[date(2025, 4, 8)])
+    assert date(2025, 4, 8) not in dates
+    assert len(dates) == 3
+
+def test_occurrences_are_capped():
+    dates = expand_recurrence(date(2025, 1, 1), date(2035, 1, 1), "毎週")
+    assert len(dates) == MAX_OCCURRENCES
+    assert dates[0] == date(2025, 1, 1)
+
+def test_unknown_rule():
+    with pytest.raises(ValueError):
+        expand_recurrence(date(2025, 4, 1), date(2025, 5, 1), "毎日")
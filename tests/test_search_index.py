@@ -0,0 +1,44 @@
+"""search_index（予約の全文検索）のテスト"""
+from participation_log import apply_entries, apply_rosters, reservation_ids
+from search_index import ReservationSearchIndex, changed_name_rows, query_tokens, tokenize
+
+
+def _reservations(make_reservations):
+    return make_reservations(
+        {"day": "2025-04-01", "rid": "r1", "facility": "二子玉川緑地", "participants": ["よしたに"], "message": "雨天中止"},
+        {"day": "2025-04-08", "rid": "r2", "facility": "砧公園", "court_type": "クレー", "consider": ["ヨシタニ"]},
+        {"day": "2025-04-15", "rid": "r3", "facility": "二子玉川緑地", "message": "初心者歓迎"},
+    )
+
+def test_tokenize():
+    assert tokenize("砧公園") == {"砧", "公", "園", "砧公", "公園"}
+    assert query_tokens("砧") == {"砧"}
+    assert query_tokens("二子 玉川") == {"二子", "玉川"}
+
+def test_search_by_facility_name_and_message(make_reservations):
+    index = ReservationSearchIndex(_reservations(make_reservations))
+    assert len(index) == 3
+    # 一致度が同じなら新しい予約が先
+    assert index.search("二子玉川") == [2, 0]
+    assert index.search("二子玉川", limit=1) == [2]
+    # カタカナ・ひらがなを区別しない。参加・保留どちらの名前も検索する
+    assert sorted(index.search("よしたに")) == [0, 1]
+    assert index.search("雨天") == [0]
+    # 複数語はすべてを含む予約
+    assert index.search("二子玉川 初心者") == [2]
+    assert index.search("存在しない") == []
+    assert index.search("") == []
+
+def test_update_after_signup(make_reservations):
+    """参加表明で変わった行だけを反映する"""
+    old = _reservations(make_reservations)
+    index = ReservationSearchIndex(old)
+    rosters = {}
+    apply_entries(rosters, [("r3", "さとう", "参加", "", None), ("r1", "よしたに", "削除", "", None)])
+    new = apply_rosters(old, reservation_ids(old), rosters)
+
+    rows = changed_name_rows(old, new)
+    assert rows == [0, 2]
+    index.update(old, new, rows)
+    assert index.search("さとう") == [2]
+    assert index.search("よしたに") == [1]
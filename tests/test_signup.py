@@ -0,0 +1,71 @@
+"""signup（参加表明の判定・キャンセル待ちの繰り上げ・「締切」⇔「募集中」）のテスト"""
+import numpy as np
+
+from signup import FULL_STATUS, OPEN_STATUS, capacity_transitions, plan_participation
+from participation_log import REMOVED, WAITLISTED
+
+
+def test_capacity_transitions():
+    counts = np.array([2, 1, 2, 5, 0])
+    capacity = np.array([2, 2, 3, np.nan, 2], dtype=float)
+    status = np.array([OPEN_STATUS, FULL_STATUS, FULL_STATUS, OPEN_STATUS, "中止"], dtype=object)
+    assert capacity_transitions(counts, capacity, status).tolist() == [
+        FULL_STATUS, OPEN_STATUS, OPEN_STATUS, OPEN_STATUS, "中止",
+    ]
+
+def test_signup_takes_free_seat_and_closes_when_full(make_reservations):
+    df = make_reservations({"rid": "r1", "capacity": 2, "participants": ["A"]})
+    new_rows, entries = plan_participation(df, [0], "B", "参加")
+    assert new_rows.at[0, "participants"] == ["A", "B"]
+    assert new_rows.at[0, "waitlist"] == []
+    assert new_rows.at[0, "status"] == FULL_STATUS
+    assert entries == [(0, "B", "参加")]
+
+def test_signup_waitlists_when_full(make_reservations):
+    df = make_reservations({"rid": "r1", "capacity": 1, "participants": ["A"], "status": FULL_STATUS})
+    new_rows, entries = plan_participation(df, [0], "B", "参加")
+    assert new_rows.at[0, "participants"] == ["A"]
+    assert new_rows.at[0, "waitlist"] == ["B"]
+    assert entries == [(0, "B", WAITLISTED)]
+
+def test_signup_again_keeps_waitlist_position(make_reservations):
+    """すでにキャンセル待ちなら、もう一度参加表明しても順番は変えない"""
+    df = make_reservations({"capacity": 1, "participants": ["A"], "waitlist": ["B", "C"], "status": FULL_STATUS})
+    new_rows, entries = plan_participation(df, [0], "B", "参加")
+    assert entries == []
+    assert new_rows.empty
+
+def test_removal_promotes_waitlist_and_reopens(make_reservations):
+    """参加を削除して空いた席はキャンセル待ちの先頭から繰り上げる"""
+    df = make_reservations({"capacity": 2, "participants": ["A", "B"], "waitlist": ["C", "D"], "status": FULL_STATUS})
+    new_rows, entries = plan_participation(df, [0], "A", REMOVED)
+    assert new_rows.at[0, "participants"] == ["B", "C"]
+    assert new_rows.at[0, "waitlist"] == ["D"]
+    assert new_rows.at[0, "status"] == FULL_STATUS
+    assert entries == [(0, "A", REMOVED), (0, "C", "参加")]
+
+def test_switch_to_consider_reopens(make_reservations):
+    df = make_reservations({"capacity": 2, "participants": ["A", "B"], "status": FULL_STATUS})
+    new_rows, entries = plan_participation(df, [0], "A", "保留")
+    assert new_rows.at[0, "participants"] == ["B"]
+    assert new_rows.at[0, "consider"] == ["A"]
+    assert new_rows.at[0, "status"] == OPEN_STATUS
+    assert entries == [(0, "A", "保留")]
+
+def test_promotion_only_fills_raised_capacity(make_reservations):
+    """nick=None は繰り上げだけを行う（定員を増やした後など）"""
+    df = make_reservations(
+        {"capacity": 3, "participants": ["A"], "waitlist": ["B", "C", "D"], "status": FULL_STATUS},
+        {"capacity": "", "participants": ["E"], "waitlist": ["F"]},
+    )
+    new_rows, entries = plan_participation(df, [0, 1], None, None)
+    assert new_rows["participants"].tolist() == [["A", "B", "C"], ["E", "F"]]
+    assert new_rows["waitlist"].tolist() == [["D"], []]
+    assert new_rows.at[0, "status"] == FULL_STATUS
+    assert entries == [(0, "B", "参加"), (0, "C", "参加"), (1, "F", "参加")]
+
+def test_plan_does_not_modify_input(make_reservations):
+    df = make_reservations({"capacity": 2, "participants": ["A"]})
+    plan_participation(df, [0], "B", "参加")
+    assert df.at[0, "participants"] == ["A"]
+    assert df.at[0, "status"] == OPEN_STATUS
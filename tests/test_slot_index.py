@@ -0,0 +1,43 @@
+"""slot_index（施設・日付ごとの時間帯インデックス）のテスト"""
+from datetime import date
+
+from slot_index import build_slot_index, find_conflicts, find_overlaps, suggest_free_slots
+
+DAY = date(2025, 4, 1)
+
+
+def _index(make_reservations):
+    df = make_reservations(
+        {"start": (9, 0), "end": (11, 0)},
+        {"start": (13, 0), "end": (15, 0)},
+        {"start": (8, 0), "end": (18, 0), "status": "中止"},
+        {"start": (10, 0), "end": (12, 0), "facility": "砧公園"},
+        {"start": (11, 0), "end": (12, 0)},
+    )
+    return build_slot_index(df)
+
+def test_find_overlaps(make_reservations):
+    index = _index(make_reservations)
+    assert find_overlaps(index, "大蔵運動場", DAY, 10 * 60, 14 * 60) == [0, 4, 1]
+    # 終了時刻ちょうどに始まる予約は重ならない
+    assert find_overlaps(index, "大蔵運動場", DAY, 15 * 60, 16 * 60) == []
+    assert find_overlaps(index, "大蔵運動場", DAY, 7 * 60, 9 * 60) == []
+
+def test_cancelled_reservations_are_ignored(make_reservations):
+    index = _index(make_reservations)
+    assert find_overlaps(index, "大蔵運動場", DAY, 16 * 60, 17 * 60) == []
+
+def test_exclude_and_other_groups(make_reservations):
+    index = _index(make_reservations)
+    assert find_overlaps(index, "大蔵運動場", DAY, 9 * 60, 10 * 60, exclude=0) == []
+    assert find_overlaps(index, "砧公園", DAY, 9 * 60, 10 * 60 + 1) == [3]
+    assert find_overlaps(index, "大蔵運動場", date(2025, 4, 2), 9 * 60, 10 * 60) == []
+
+def test_find_conflicts(make_reservations):
+    index = _index(make_reservations)
+    assert find_conflicts(index, "大蔵運動場", [DAY, date(2025, 4, 2)], 9 * 60, 10 * 60) == {DAY: [0]}
+
+def test_suggest_free_slots(make_reservations):
+    index = _index(make_reservations)
+    assert suggest_free_slots(index, "大蔵運動場", DAY, 120, limit=2) == [(7 * 60, 9 * 60), (15 * 60, 17 * 60)]
+    assert suggest_free_slots(index, "大蔵運動場", DAY, 60, preferred_start=12 * 60, limit=1) == [(12 * 60, 13 * 60)]